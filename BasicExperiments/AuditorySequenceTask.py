@@ -5,6 +5,7 @@ Play audio sequences for the experimenter to know what tactile stimulus sequence
 # AuditorySequenceTask.py
 #
 # Created 4/18/17 by DJ based on SingingTask_click.py.
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging #, visual # visual causes a bug in the guis, so I moved it down.
 from psychopy.tools.filetools import fromFile, toFile
@@ -12,6 +13,7 @@ import random
 import time, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import tNextFlip, SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlipDeadline # for flipping on the refresh nearest each onset
 
 
 # ====================== #
@@ -128,13 +130,11 @@ if params['fullScreen'] and params['screenToShow']>0:
 else:
     screenRes = [800,600]
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create window and stimuli
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 #fixation = visual.GratingStim(win, color='black', tex=None, mask='circle',size=0.2)
 fCS = params['fixCrossSize'] # rename for brevity
 fcX = params['fixCrossPos'][0] # rename for brevity
@@ -177,11 +177,6 @@ for i in range(0,len(params['sequenceSounds'])):
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
 def RunTrial(beatTime,trialTime,delayTime,respTime,ITI,sequence1,sequence2):
     
     # adjust pre-trial time
@@ -198,7 +193,7 @@ def RunTrial(beatTime,trialTime,delayTime,respTime,ITI,sequence1,sequence2):
     fixation.draw()
     win.logOnFlip(level=logging.EXP, msg='Display Fixation')
     # wait until it's time
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         core.wait(0.0001)
 #        pass
     # flip display
@@ -214,7 +209,7 @@ def RunTrial(beatTime,trialTime,delayTime,respTime,ITI,sequence1,sequence2):
             thisSound = goSound
         else:
             thisSound = sequenceSound[sequence1[iBeat-1]-1]
-        # wait until it's time
+        # wait until it's time (sounds don't wait for a screen refresh, so no need to round to one)
         while (globalClock.getTime()<tNextFlip[0]):
             core.wait(0.0001)
 #            pass
@@ -236,8 +231,8 @@ def RunTrial(beatTime,trialTime,delayTime,respTime,ITI,sequence1,sequence2):
     for iBeat in range(0, nTrialBeats):
         # prepare next sound
         thisSound = sequenceSound[sequence1[iBeat]-1]
-        # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        # wait until it's time (on the first beat, until the display flips on the refresh nearest it)
+        while (globalClock.getTime()<(GetFlipDeadline() if iBeat==0 else tNextFlip[0])):
             core.wait(0.0001)
 #            pass
         # On first beat, flip display
@@ -260,7 +255,7 @@ def RunTrial(beatTime,trialTime,delayTime,respTime,ITI,sequence1,sequence2):
     fixBlue.draw()
     win.logOnFlip(level=logging.EXP, msg='Display fixBlue')
     # wait until it's time
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         core.wait(0.0001)
 #        pass
     # flip display
@@ -276,7 +271,7 @@ def RunTrial(beatTime,trialTime,delayTime,respTime,ITI,sequence1,sequence2):
             thisSound = goSound
         else:
             thisSound = sequenceSound[sequence2[iBeat-1]-1]
-        # wait until it's time
+        # wait until it's time (sounds don't wait for a screen refresh, so no need to round to one)
         while (globalClock.getTime()<tNextFlip[0]):
             core.wait(0.0001)
 #            pass
@@ -298,8 +293,8 @@ def RunTrial(beatTime,trialTime,delayTime,respTime,ITI,sequence1,sequence2):
     for iBeat in range(0, nTrialBeats):
         # prepare next sound
         thisSound = sequenceSound[sequence2[iBeat]-1]
-        # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        # wait until it's time (on the first beat, until the display flips on the refresh nearest it)
+        while (globalClock.getTime()<(GetFlipDeadline() if iBeat==0 else tNextFlip[0])):
             core.wait(0.0001)
 #            pass
         # On first beat, flip display
@@ -320,7 +315,7 @@ def RunTrial(beatTime,trialTime,delayTime,respTime,ITI,sequence1,sequence2):
     fixYellow.draw()
     win.logOnFlip(level=logging.EXP, msg='Display fixYellow')
     # wait until it's time
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         core.wait(0.0001)
 #        pass
     # flip display
@@ -345,7 +340,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
@@ -399,7 +395,7 @@ win.logOnFlip(level=logging.EXP, msg='Display TheEnd')
 message1.draw()
 message2.draw()
 # wait until it's time
-while (globalClock.getTime()<tNextFlip[0]):
+while (globalClock.getTime()<GetFlipDeadline()):
     core.wait(0.0001)
 #        pass
 # change the screen
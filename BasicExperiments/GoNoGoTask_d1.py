@@ -10,6 +10,7 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import time as ts, numpy as np # for timing and array operations
 import AppKit, os, glob # for monitor size detection, files
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random, math # for randomization of trials, math
 
 # ====================== #
@@ -142,13 +143,11 @@ print("screenRes = [%d,%d]"%screenRes)
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -172,14 +171,6 @@ print('%d prompts loaded from %s'%(len(topPrompts),params['promptFile']))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def RunTrial(iTrial):
     
     # Decide Trial Params
@@ -192,7 +183,7 @@ def RunTrial(iTrial):
     # Draw cue
     stims[params['cueStim']].draw()
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.logOnFlip(level=logging.EXP, msg='Display cue (%s)'%params['cueStim'])
@@ -209,7 +200,7 @@ def RunTrial(iTrial):
         stims[params['noGoStim']].draw()
         win.logOnFlip(level=logging.EXP, msg='Display no-go stim (%s)'%params['noGoStim'])
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -221,7 +212,7 @@ def RunTrial(iTrial):
     event.clearEvents()
     # Wait for relevant key press or 'stimDur' seconds
     respKey = None
-    while (globalClock.getTime()<tNextFlip[0]): # until it's time for the next frame
+    while (globalClock.getTime()<GetFlipDeadline()): # until it's time for the next frame
         # get new keys
         newKeys = event.getKeys(keyList=params['respKeys']+['q','escape'],timeStamped=globalClock)
         # check each keypress for escape or response keys
@@ -276,7 +267,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
@@ -306,7 +298,7 @@ for iTrial in range(0,params['nTrials']):
 # wait before 'the end' text
 fixation.draw()
 win.flip()
-while (globalClock.getTime()<tNextFlip[0]):
+while (globalClock.getTime()<GetFlipDeadline()):
         pass
 
 # Log end of experiment
@@ -12,6 +12,7 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import time as ts, numpy as np # for timing and array operations
 import AppKit, os, glob # for monitor size detection, files
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random, string # for randomization of trials, letters
 
 # ====================== #
@@ -150,13 +151,11 @@ print "screenRes = [%d,%d]"%screenRes
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -176,14 +175,6 @@ print('%d prompts loaded from %s'%(len(topPrompts),params['promptFile']))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def RunTrial(iTrial):
     # Flush the key buffer and mouse movements
     event.clearEvents()
@@ -221,7 +212,7 @@ def RunTrial(iTrial):
     mainText.draw()
     win.logOnFlip(level=logging.EXP, msg='Display string (%s)'%startString)
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -233,7 +224,7 @@ def RunTrial(iTrial):
     fixation.draw()
     win.logOnFlip(level=logging.EXP, msg='Display fixation (pause)')
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -249,7 +240,7 @@ def RunTrial(iTrial):
         win.logOnFlip(level=logging.EXP, msg='Display cue (%s)'%params['cues'][1])
     mainText.draw()
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -261,7 +252,7 @@ def RunTrial(iTrial):
     fixation.draw()
     win.logOnFlip(level=logging.EXP, msg='Display fixation (delay)')
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -273,7 +264,7 @@ def RunTrial(iTrial):
     mainText.draw()
     win.logOnFlip(level=logging.EXP, msg='Display test stim (%s)'%testString)
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -282,7 +273,7 @@ def RunTrial(iTrial):
     
     # Wait for relevant key press or 'stimDur' seconds
     respKey = None
-    while (globalClock.getTime()<tNextFlip[0]): # until it's time for the next frame
+    while (globalClock.getTime()<GetFlipDeadline()): # until it's time for the next frame
         # get new keys
         newKeys = event.getKeys(keyList=params['respKeys']+['q','escape'],timeStamped=globalClock)
         # check each keypress for escape or response keys
@@ -335,7 +326,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
@@ -362,7 +354,7 @@ for iTrial in range(0,params['nTrials']):
 # wait before 'the end' text
 fixation.draw()
 win.flip()
-while (globalClock.getTime()<tNextFlip[0]):
+while (globalClock.getTime()<GetFlipDeadline()):
         pass
 
 # Log end of experiment
@@ -14,6 +14,7 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import time as ts, numpy as np # for timing and array operations
 import AppKit, os, glob # for monitor size detection, files
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import tNextFlip, SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random, string # for randomization of trials, letters
 
 # ====================== #
@@ -152,13 +153,11 @@ print "screenRes = [%d,%d]"%screenRes
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -178,14 +177,6 @@ print('%d prompts loaded from %s'%(len(topPrompts),params['promptFile']))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def RunTrial(iTrial):
     # Flush the key buffer and mouse movements
     event.clearEvents()
@@ -217,7 +208,7 @@ def RunTrial(iTrial):
     mainText.draw()
     win.logOnFlip(level=logging.EXP, msg='Display string (%s)'%startString)
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -229,7 +220,7 @@ def RunTrial(iTrial):
     fixation.draw()
     win.logOnFlip(level=logging.EXP, msg='Display fixation (pause)')
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -245,7 +236,7 @@ def RunTrial(iTrial):
         win.logOnFlip(level=logging.EXP, msg='Display cue (%s)'%params['cues'][1])
     mainText.draw()
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -257,7 +248,7 @@ def RunTrial(iTrial):
     fixation.draw()
     win.logOnFlip(level=logging.EXP, msg='Display fixation (delay)')
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -269,7 +260,7 @@ def RunTrial(iTrial):
     mainText.draw()
     win.logOnFlip(level=logging.EXP, msg='Display test stim (%s)'%testString)
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # log & flip window to display image
     win.flip()
@@ -282,7 +273,7 @@ def RunTrial(iTrial):
     
     # Wait for 'testDur' seconds while recording relevant key presses 
     respKey = None
-    while (globalClock.getTime()<tNextFlip[0]): # until it's time for the next frame
+    while (globalClock.getTime()<GetFlipDeadline()): # until it's time for the next frame
         # get new keys
         newKeys = event.getKeys(keyList=params['respKeys']+[params['triggerKey'],'q','escape'],timeStamped=globalClock)
         # check each keypress for escape or response keys
@@ -348,7 +339,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
@@ -381,7 +373,7 @@ while (globalClock.getTime() < tLastTrial):
 tNextFlip[0] = tStartSession + params['sessionDur']
 
 # wait before 'the end' text
-while (globalClock.getTime()<tNextFlip[0]):
+while (globalClock.getTime()<GetFlipDeadline()):
     # check for escape keys
     newKeys = event.getKeys(keyList=['q','escape'],timeStamped=globalClock)
     # check each keypress for escape or response keys
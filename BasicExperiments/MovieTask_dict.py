@@ -3,6 +3,7 @@
 Then ask the subject comprehension questions at the end."""
 # MovieTask_dict.py
 # Created 5/7/18 by DJ based on VidLecTask_dict.py
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging, visual # visual causes a bug in the guis, so I moved it down.
 from psychopy.constants import (NOT_STARTED, STARTED, PLAYING, PAUSED,
@@ -12,6 +13,7 @@ import time
 import numpy as np
 import AppKit, os, sys # for monitor size detection, files
 import PromptTools
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlipDeadline # for flipping on the refresh nearest each onset
 
 # Ensure that relative paths start from the same directory as this script
 _thisDir = os.path.dirname(os.path.abspath(__file__)).decode(sys.getfilesystemencoding())
@@ -116,9 +118,6 @@ logging.log(level=logging.INFO, msg='---END PARAMETERS---')
 # ========================== #
 #from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 # kluge for secondary monitor
 if params['fullScreen'] and params['screenToShow']>0: 
     screens = AppKit.NSScreen.screens()
@@ -132,6 +131,7 @@ else:
 #create window and stimuli
 globalClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',useFBO=True)
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 print(win) 
 #fixation = visual.GratingStim(win, color='black', tex=None, mask='circle',size=0.2)
 fCS = params['fixCrossSize'] # for brevity
@@ -155,21 +155,13 @@ print(mov)
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def PlayMovie(startTime,stopTime):
     # set up
     startTime = min(startTime, mov.duration)
     stopTime = min(stopTime, mov.duration)
     win.logOnFlip(level=logging.EXP, msg='Display Movie')
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
     # update clocks
     AddToFlipTime(stopTime-startTime) # advance the clock
@@ -268,7 +260,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
@@ -299,7 +292,7 @@ for iBlock in range(0,nBlocks): # for each block of trials
     fixation.draw()
     win.logOnFlip(level=logging.EXP, msg='Display Fixation')
     # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         # check for escape character
         for key in event.getKeys():
             if key in ['escape', 'q']:
@@ -320,7 +313,7 @@ win.logOnFlip(level=logging.EXP, msg='Display TheEnd')
 message1.draw()
 message2.draw()
 # Wait until it's time to display
-while (globalClock.getTime()<tNextFlip[0]):
+while (globalClock.getTime()<GetFlipDeadline()):
     # check for escape character
     for key in event.getKeys():
         if key in ['escape', 'q']:
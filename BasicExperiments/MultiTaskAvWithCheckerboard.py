@@ -5,6 +5,7 @@ Also present a large, task-irrelevant checkerboard stimulus at random times."""
 # MultiTaskAvWithCheckerboard.py
 #
 # Created 4/18/17 by DJ based on AuditorySequenceTask.py.
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging #, visual # visual causes a bug in the guis, so I moved it down.
 from psychopy.tools.filetools import fromFile, toFile
@@ -12,6 +13,7 @@ import random
 import time, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import numpy, scipy.signal
 from numpy import pi
 import matplotlib.pyplot as plt
@@ -144,12 +146,10 @@ if params['fullScreen'] and params['screenToShow']>0:
 else:
     screenRes = [800,600]
 
-# Initialize deadline for displaying next frame
-#tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create window and stimuli
 globalClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 #fixation = visual.GratingStim(win, color='black', tex=None, mask='circle',size=0.2)
 fCS = params['fixCrossSize'] # rename for brevity
 fcX = params['fixCrossPos'][0] # rename for brevity
@@ -244,10 +244,6 @@ if params['randomizeCues']:
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-#def AddToFlipTime(tIncrement=1.0):
-#    tNextFlip[0] += tIncrement
-
 def RunBlock(params):
     
     # Get constants
@@ -410,7 +406,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-tNextFlip = tStartSession + params['tStartup']
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # set up other stuff
 logging.log(level=logging.EXP, msg='---START EXPERIMENT---')
@@ -435,7 +432,7 @@ nBlocks = len(params['cues'])
 # Run trials
 for iBlock in range(0,nBlocks-1): # for each block of pages
     
-    while (globalClock.getTime()<tNextFlip):
+    while (globalClock.getTime()<GetFlipDeadline()):
         core.wait(0.0001)
     
     # log new block
@@ -446,8 +443,9 @@ for iBlock in range(0,nBlocks-1): # for each block of pages
     text.draw()
     win.logOnFlip(level=logging.EXP, msg='Display Cue %s'%(params['cues'][iBlock]))
     win.flip()
-    tNextFlip = globalClock.getTime() + params['cueDur']
-    while (globalClock.getTime()<tNextFlip):
+    SetFlipTimeToNow()
+    AddToFlipTime(params['cueDur'])
+    while (globalClock.getTime()<GetFlipDeadline()):
         core.wait(0.0001)
     win.flip()
     
@@ -465,9 +463,11 @@ for iBlock in range(0,nBlocks-1): # for each block of pages
     win.logOnFlip(level=logging.EXP, msg='Display IBI')
     win.flip()
     if iBlock<(nBlocks-1):
-        tNextFlip = globalClock.getTime() + params['IBI']
+        SetFlipTimeToNow()
+        AddToFlipTime(params['IBI'])
     else:
-        tNextFlip = globalClock.getTime() + params['tCoolDown']
+        SetFlipTimeToNow()
+        AddToFlipTime(params['tCoolDown'])
         message1.setText("That's the end of this run!")
         message2.setText("Please stay still until the scanner noise stops.")
         win.logOnFlip(level=logging.EXP, msg='Display TheEnd')
@@ -476,7 +476,7 @@ for iBlock in range(0,nBlocks-1): # for each block of pages
 
 # handle end of run
 # wait until it's time
-while (globalClock.getTime()<tNextFlip):
+while (globalClock.getTime()<GetFlipDeadline()):
     core.wait(0.0001)
 #        pass
 # change the screen
@@ -5,12 +5,14 @@ Then ask the subject comprehension questions at the end."""
 #
 # Created 3/16/15 by DJ based on VidLecTask.py - named ReadingTask_dict_d2.py
 # Updated 1/24/17 by DJ - renamed and debugged
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging #, visual # visual causes a bug in the guis, so I moved it down.
 from psychopy.tools.filetools import fromFile, toFile
 import time, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import ParseReading
 
 # ====================== #
@@ -126,13 +128,11 @@ if params['fullScreen'] and params['screenToShow']>0:
 else:
     screenRes = [800,600]
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create window and stimuli
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 #fixation = visual.GratingStim(win, color='black', tex=None, mask='circle',size=0.2)
 fCS = params['fixCrossSize'] # rename for brevity
 fcX = params['fixCrossPos'][0] # rename for brevity
@@ -175,11 +175,6 @@ print('%d prompts loaded from %s'%(len(topPrompts),'PromptTools.py'))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
 def SendPortEvent(number):
     print('Page %d'%number)
 #    serialPort.writelines(number)
@@ -188,7 +183,7 @@ def ShowPage(lines, maxPageTime=float('Inf'), iPage=0):
     # Display text
     win.logOnFlip(level=logging.EXP, msg='Display Page%d'%iPage)
 #    win.callOnFlip(SendPortEvent,mod(page,256))
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
 #        win.flip(clearBuffer=False)
     # draw & flip
@@ -220,7 +215,7 @@ def ShowPage(lines, maxPageTime=float('Inf'), iPage=0):
             fixation.draw()
         win.flip()
     # either way, allow the screen to update immediately
-    tNextFlip[0]=globalClock.getTime()
+    SetFlipTimeToNow()
 
 # =========================== #
 # ======= RUN PROMPTS ======= #
@@ -239,7 +234,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
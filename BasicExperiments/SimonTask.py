@@ -4,11 +4,13 @@ described in Morrison 2014 (doi: 10.3389/fnhum.2013.00897)"""
 # SimonTask.py
 # Created 12/16/14 by DJ based on ThresholdToneDetection.py
 # Updated 1/5/15 by DJ - added logging, key options, cleaned up
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, visual, gui, data, event, sound, logging
 from psychopy.tools.filetools import fromFile, toFile
 import time, numpy as np
 import AppKit # for monitor size detection
+from FlipScheduler import tNextFlip, SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlippingLoopDeadline # for flipping on the refresh nearest each onset
 
 # ====================== #
 # ===== PARAMETERS ===== #
@@ -143,13 +145,11 @@ if fullScreen and screenToShow>0:
 else:
     screenRes = [800,600]
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create window and stimuli
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=fullScreen, allowGUI=False, monitor='testMonitor', screen=screenToShow, units='deg', name='win')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 #fixation = visual.GratingStim(win, color='black', tex=None, mask='circle',size=0.2)
 fixation = visual.ShapeStim(win,lineColor='#000000',lineWidth=3.0,vertices=((-fixCrossSize/2,0),(fixCrossSize/2,0),(0,0),(0,fixCrossSize/2),(0,-fixCrossSize/2)),units='pix',closeShape=False);
 message1 = visual.TextStim(win, pos=[0,+3], color='#000000', alignHoriz='center', name='topMsg', text="aaa")
@@ -184,19 +184,13 @@ bottomPrompts = ["Press any key to continue.",
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    #tLastFlip = tNextFlip
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
 def DisplayButtons(iOn,tIncrement=1.0,isFixOn=False):
     if isFixOn:
         msgText = 'Display Fix+Stim%s'%str(iOn)
     else:
         msgText = 'Display Stim%s'%str(iOn)
-    # wait for the right time before drawing new frame!
-    while (globalClock.getTime()<tNextFlip[0]):
+    # wait for the right time before drawing new frame! (this loop flips, so it stops a frame early)
+    while (globalClock.getTime()<GetFlippingLoopDeadline()):
         win.flip(clearBuffer=False)
     # draw fix cross
     win.clearBuffer()
@@ -352,7 +346,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=triggerKey)
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+tStartup)
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(tStartup)
 
 # do brief wait before first stimulus
 win.clearBuffer() # just in case
@@ -4,6 +4,7 @@ Then ask the subject comprehension questions at the end."""
 # SingingTask_audio.py
 #
 # Created 4/12/17 by DJ based on SingingTask.py.
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging #, visual # visual causes a bug in the guis, so I moved it down.
 from psychopy.tools.filetools import fromFile, toFile
@@ -11,6 +12,7 @@ from random import shuffle
 import time, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlipDeadline # for flipping on the refresh nearest each onset
 
 
 # ====================== #
@@ -127,13 +129,11 @@ if params['fullScreen'] and params['screenToShow']>0:
 else:
     screenRes = [800,600]
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create window and stimuli
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 #fixation = visual.GratingStim(win, color='black', tex=None, mask='circle',size=0.2)
 fCS = params['fixCrossSize'] # rename for brevity
 fcX = params['fixCrossPos'][0] # rename for brevity
@@ -158,11 +158,6 @@ mySound = sound.Sound(value=params['soundFile'], volume=params['soundVolume'], s
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
 def RunTrial(preTrialTime, trialTime, restTime, condition,playSound):
     # adjust pre-trial time
     timePerBeat = 60.0/params['tempo_bpm'];
@@ -177,7 +172,7 @@ def RunTrial(preTrialTime, trialTime, restTime, condition,playSound):
         win.logOnFlip(level=logging.EXP, msg='Display %sIn%d'%(condition,nPreTrialBeats-iBeat))
         win.callOnFlip(AddToFlipTime,timePerBeat)
         # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             pass
         # flash photodiode
         if params['usePhotodiode']:
@@ -200,7 +195,7 @@ def RunTrial(preTrialTime, trialTime, restTime, condition,playSound):
         win.callOnFlip(AddToFlipTime,params['tSoundStop']-params['tSoundStart'])
         win.flip()
         mySound.play()
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             # check for escape characters
             thisKey = event.getKeys()
             if thisKey!=None and len(thisKey)>0 and thisKey[0] in ['q','escape']:
@@ -215,7 +210,7 @@ def RunTrial(preTrialTime, trialTime, restTime, condition,playSound):
             win.callOnFlip(AddToFlipTime,timePerBeat)
 #            logging.log(level=logging.EXP, msg='here')
             # wait until it's time
-            while (globalClock.getTime()<tNextFlip[0]):
+            while (globalClock.getTime()<GetFlipDeadline()):
                 pass
             # flash photodiode
             if params['usePhotodiode']:
@@ -246,7 +241,7 @@ def RunTrial(preTrialTime, trialTime, restTime, condition,playSound):
         win.logOnFlip(level=logging.EXP, msg='Display Fixation')
         win.callOnFlip(AddToFlipTime,restTime)
         # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             pass
             # flash photodiode
         if params['usePhotodiode']:
@@ -275,7 +270,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
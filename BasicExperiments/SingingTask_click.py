@@ -4,6 +4,7 @@ Then ask the subject comprehension questions at the end."""
 # SingingTask.py
 #
 # Created 3/17/17 by DJ based on ReadingTask.py.
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging #, visual # visual causes a bug in the guis, so I moved it down.
 from psychopy.tools.filetools import fromFile, toFile
@@ -11,6 +12,7 @@ from random import shuffle
 import time, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlipDeadline # for flipping on the refresh nearest each onset
 
 
 # ====================== #
@@ -132,13 +134,11 @@ if params['fullScreen'] and params['screenToShow']>0:
 else:
     screenRes = [800,600]
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create window and stimuli
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 #fixation = visual.GratingStim(win, color='black', tex=None, mask='circle',size=0.2)
 fCS = params['fixCrossSize'] # rename for brevity
 fcX = params['fixCrossPos'][0] # rename for brevity
@@ -179,11 +179,6 @@ click.play()
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
 def RunTrial(preTrialTime, trialTime, restTime, condition, playPitch):
     # adjust pre-trial time
     timePerBeat = 60.0/params['tempo_bpm'];
@@ -198,7 +193,7 @@ def RunTrial(preTrialTime, trialTime, restTime, condition, playPitch):
         win.logOnFlip(level=logging.EXP, msg='Display %sIn%d'%(condition,nPreTrialBeats-iBeat))
         win.callOnFlip(AddToFlipTime,timePerBeat)
         # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             core.wait(0.001)
             # pass
         # FLIP DISPLAY!
@@ -219,7 +214,7 @@ def RunTrial(preTrialTime, trialTime, restTime, condition, playPitch):
         win.logOnFlip(level=logging.EXP, msg='Display %s'%(condition))
         win.callOnFlip(AddToFlipTime,timePerBeat)
         # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             pass
         # FLIP DISPLAY!
         win.flip()
@@ -245,7 +240,7 @@ def RunTrial(preTrialTime, trialTime, restTime, condition, playPitch):
         win.logOnFlip(level=logging.EXP, msg='Display Fixation')
         win.callOnFlip(AddToFlipTime,restTime)
         # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             pass
             # flash photodiode
         if params['usePhotodiode']:
@@ -274,7 +269,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
@@ -323,7 +319,7 @@ for iBlock in range(0,params['nBlocks']): # for each block of pages
         message1.draw()
         message2.draw()
         # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             pass
         # change the screen
         win.flip()
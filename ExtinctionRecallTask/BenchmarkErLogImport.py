@@ -0,0 +1,112 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+BenchmarkErLogImport.py
+
+Time the steps of ImportExtinctionRecallTaskLog.py on synthetic logs of several sizes (written by MakeSyntheticErLog.py),
+reporting seconds, log lines per second, and peak memory for each step. Save the results as a baseline CSV, then
+compare later runs to it to catch regressions.
+
+Usage (from the ExtinctionRecallTask folder):
+  python BenchmarkErLogImport.py --runs 3 30 --saveBaseline ER3-ImportBenchmarkBaseline.csv
+  python BenchmarkErLogImport.py --runs 3 30 --baseline ER3-ImportBenchmarkBaseline.csv
+"""
+
+# Import packages
+import time           # for timing steps
+import tracemalloc    # for measuring peak memory
+import contextlib     # for hiding the import functions' progress messages
+import io             # for hiding the import functions' progress messages
+import tempfile       # for writing logs and outputs somewhere disposable
+import shutil         # for cleaning up
+import argparse       # for command-line arguments
+import os             # for handling paths
+import pandas as pd   # for results tables
+import MakeSyntheticErLog as mse
+import ImportExtinctionRecallTaskLog as ier
+
+# Run function func(*args), returning its output, the time it took (in seconds), and its peak memory use (in MB).
+# The function is run twice: once for timing and once with memory tracing on (which slows it down).
+def MeasureStep(func,*args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        t = time.time()
+        out = func(*args)
+        tElapsed = time.time()-t
+        tracemalloc.start()
+        func(*args)
+        _,peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return out, tElapsed, peak/1e6
+
+# Time each import step on a synthetic log with nRuns runs. Returns a list of result dicts, one per step.
+def BenchmarkLog(logFile,outFolder,nRuns,keyRate=2.0,timeoutFraction=0.1,seed=0):
+
+    # write the log
+    nLines = mse.MakeSyntheticErLog(logFile,nRuns=nRuns,keyRate=keyRate,timeoutFraction=timeoutFraction,seed=seed)
+
+    # time each step
+    results = []
+    def AddResult(step,tElapsed,peakMb):
+        results.append({'runs':nRuns,'lines':nLines,'step':step,'seconds':tElapsed,
+                        'linesPerSec':nLines/tElapsed if tElapsed>0 else float('inf'),'peakMb':peakMb})
+
+    log,tElapsed,peakMb = MeasureStep(ier.ReadErLog,logFile)
+    AddResult('ReadErLog',tElapsed,peakMb)
+    _,tElapsed,peakMb = MeasureStep(ier.ReadErLog,logFile,['params','vas'])
+    AddResult('ReadErLog_VasOnly',tElapsed,peakMb)
+    _,tElapsed,peakMb = MeasureStep(ier.GetSingleVasLine,log['params'],log['dfMoodVas'])
+    AddResult('GetSingleVasLine',tElapsed,peakMb)
+    _,tElapsed,peakMb = MeasureStep(ier.WriteBidsEventsFiles,log['dfDisp'],log['dfKey'],log['dfImageVas'],log['dfBlock'],
+                                    log['params']['subject'],outFolder)
+    AddResult('WriteBidsEventsFiles',tElapsed,peakMb)
+
+    return results
+
+# Print a table of results, with the change from a baseline table if one is given.
+def PrintResults(dfResults,dfBaseline=None):
+    if dfBaseline is not None:
+        dfResults = dfResults.merge(dfBaseline[['runs','step','seconds','peakMb']],on=['runs','step'],how='left',suffixes=('','_baseline'))
+        dfResults['speedup'] = dfResults['seconds_baseline']/dfResults['seconds']
+        dfResults['memRatio'] = dfResults['peakMb']/dfResults['peakMb_baseline']
+    with pd.option_context('display.width',200,'display.max_columns',20,'display.float_format','{:.3f}'.format):
+        print(dfResults.to_string(index=False))
+
+
+# %% === Set up argument parser ===
+
+parser = argparse.ArgumentParser(description='Benchmark ExtinctionRecall3 log import on synthetic logs.')
+
+parser.add_argument('--runs', type=int, nargs='*', default=[3,30], help='numbers of scanner runs in the synthetic logs to benchmark')
+parser.add_argument('--keyRate', type=float, default=2.0, help='mean button presses per second during rating scales')
+parser.add_argument('--timeoutFraction', type=float, default=0.1, help='fraction of image rating scales that time out')
+parser.add_argument('--seed', type=int, default=0, help='random seed')
+parser.add_argument('--saveBaseline', default='', help='CSV file to save the results to as a baseline')
+parser.add_argument('--baseline', default='', help='CSV file of baseline results to compare to')
+
+
+# ==== Declare main command-line function ==== #
+
+if __name__ == '__main__':
+
+    # parse inputs
+    args = parser.parse_args();
+
+    # timing & question files are referenced relative to this folder
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    tmpFolder = tempfile.mkdtemp()
+    try:
+        allResults = []
+        for nRuns in args.runs:
+            print('Benchmarking %d-run log...'%nRuns)
+            logFile = os.path.join(tmpFolder,'ER3_1-1_01-01-2019_%druns.log'%nRuns)
+            allResults += BenchmarkLog(logFile,tmpFolder,nRuns,args.keyRate,args.timeoutFraction,args.seed)
+    finally:
+        shutil.rmtree(tmpFolder)
+    dfResults = pd.DataFrame(allResults)
+
+    # report & save
+    dfBaseline = pd.read_csv(args.baseline) if args.baseline else None
+    PrintResults(dfResults,dfBaseline)
+    if args.saveBaseline:
+        dfResults.to_csv(args.saveBaseline,index=False)
+        print('Saved baseline to %s.'%args.saveBaseline)
@@ -30,6 +30,7 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import time as ts, numpy as np # for timing and array operations
 import os, glob # for file manipulation
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random # for randomization of trials
 import RatingScales # for VAS sliding scale
 
@@ -208,13 +209,11 @@ else:
 # ===== SET UP STIMULI ===== #
 # ========================== #
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(params['screenRes'], fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -274,6 +273,14 @@ print('%d questions loaded from %s'%(len(questions_vas4),params['moodQuestionFil
 [questions_postsoundcheck,options_postsoundcheck,answers_postsoundcheck] = BasicPromptTools.ParseQuestionFile(params['PostSoundCheckFile'])
 print('%d questions loaded from %s'%(len(questions_postsoundcheck),params['PostSoundCheckFile']))
 
+# build the text stimuli for each page of the prompts now, before the task starts, so showing a page (or paging
+# back to one) is just a draw and a flip
+promptPages = BasicPromptTools.PreparePromptPages(topPrompts,bottomPrompts,win,message1,message2)
+promptPages_sound = BasicPromptTools.PreparePromptPages(topPrompts_sound,bottomPrompts_sound,win,message1,message2)
+preVasPages = BasicPromptTools.PreparePromptPages([params['PreVasMsg']],["Press any button to continue."],win,message1,message2)
+reminderPages = BasicPromptTools.PreparePromptPages([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2)
+preFinalVasPages = BasicPromptTools.PreparePromptPages([params['PreFinalVasMsg']],["Press any button to continue."],win,message1,message2)
+
 # declare order of blocks for later randomization
 blockOrder = list(range(params['nBlocksPerGroup']))
 
@@ -281,16 +288,8 @@ blockOrder = list(range(params['nBlocksPerGroup']))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def WaitForFlipTime():
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         keyList = event.getKeys()
         # Check for escape characters
         for key in keyList:
@@ -389,6 +388,15 @@ def RunVas(questions,options,pos=(0.,-0.25),scaleTextPos=[0.,0.25],questionDur=p
         AddToFlipTime(questionDur*len(questions)) # add question duration * # of questions
 
 
+# Make the rating scales for a set of VAS questions ahead of time, with the same settings RunVas will use
+def PrepareVas(questions,options,pos=(0.,-0.25),scaleTextPos=[0.,0.25]):
+    RatingScales.PrepareRatingScales(questions,options, win, \
+        upKey=params['questionUpKey'], downKey=params['questionDownKey'], selectKey=params['questionSelectKey'],\
+        textColor=params['vasTextColor'], pos=pos,\
+        scaleTextPos=scaleTextPos, labelYPos=pos[1]-params['vasLabelYDist'], markerSize=params['vasMarkerSize'],\
+        tickHeight=1,tickLabelWidth = 0.9)
+
+
 def RunMoodVas(questions,options,name='MoodVas'):
     
     # Wait until it's time
@@ -399,7 +407,7 @@ def RunMoodVas(questions,options,name='MoodVas'):
     
     # display pre-VAS prompt
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts([params['PreVasMsg']],["Press any button to continue."],win,message1,message2)
+        BasicPromptTools.RunPrompts([params['PreVasMsg']],["Press any button to continue."],win,message1,message2,pages=preVasPages)
     
     # Display this VAS
     win.callOnFlip(SetPortData,data=params['codeVas'])
@@ -542,6 +550,16 @@ def CoolDown():
     core.quit()
 
 
+# === MAKE RATING SCALES === #
+# make the VAS rating scales now, so the first VAS with each set of options doesn't make its scale while it's timed
+PrepareVas(questions,options)
+PrepareVas(questions_vas1,options_vas1)
+PrepareVas(questions_vas2,options_vas2)
+PrepareVas(questions_vas3,options_vas3)
+PrepareVas(questions_vas4,options_vas4)
+PrepareVas(questions_postsoundcheck,options_postsoundcheck)
+
+
 # === SET UP GLOBAL ESCAPE KEY === #
 event.globalKeys.clear()
 event.globalKeys.add(key='q', modifiers=['ctrl'], func=CoolDown)
@@ -559,12 +577,12 @@ if int(expInfo['startAtRun'])==1:
     # ---Instructions
     # display prompts
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts(topPrompts,bottomPrompts,win,message1,message2)
+        BasicPromptTools.RunPrompts(topPrompts,bottomPrompts,win,message1,message2,pages=promptPages)
 
     # ---Sound Check
     # show instructions
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2)
+        BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2,pages=promptPages_sound)
 
     # show blank screen
     win.logOnFlip(level=logging.EXP, msg='Display Blank')
@@ -582,7 +600,7 @@ if int(expInfo['startAtRun'])==1:
     
     #---reminder prompt
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2)
+        BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2,pages=reminderPages)
 
     # ---Run 1
     DoRun(allImages,allCodes,allNames)
@@ -608,7 +626,7 @@ if int(expInfo['startAtRun'])<=2:
     # ---Sound Check
     # show instructions
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2)
+        BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2,pages=promptPages_sound)
 
     # show blank screen
     win.logOnFlip(level=logging.EXP, msg='Display Blank')
@@ -626,7 +644,7 @@ if int(expInfo['startAtRun'])<=2:
 
     #---reminder prompt 
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2)
+        BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2,pages=reminderPages)
 
     # ---Run 2
     DoRun(allImages,allCodes,allNames)
@@ -651,7 +669,7 @@ if int(expInfo['startAtRun'])<=2:
 # ---Sound Check
 # show instructions
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2)
+    BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2,pages=promptPages_sound)
 
 # show blank screen
 win.logOnFlip(level=logging.EXP, msg='Display Blank')
@@ -669,7 +687,7 @@ RunSoundVas(questions_postsoundcheck,options_postsoundcheck,name='SoundCheck3-')
 
 #---reminder prompt 
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2)
+    BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2,pages=reminderPages)
 
 # ---Run 3
 DoRun(allImages,allCodes,allNames)
@@ -678,7 +696,7 @@ DoRun(allImages,allCodes,allNames)
 WaitForFlipTime()
 # display done prompt
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts([params['PreFinalVasMsg']],["Press any button to continue."],win,message1,message2)
+    BasicPromptTools.RunPrompts([params['PreFinalVasMsg']],["Press any button to continue."],win,message1,message2,pages=preFinalVasPages)
 
 # ---VAS
 RunMoodVas(questions_vas4,options_vas4,name='PostRun3-')
@@ -34,7 +34,9 @@ import pandas as pd # for timing file importing/manipulation
 import io # for reading files with specified newlines
 import os # for file manipulation
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import RatingScales # for VAS sliding scale
+import EventSidecar # for binary sidecar of task events
 
 # ====================== #
 # ===== PARAMETERS ===== #
@@ -172,6 +174,8 @@ toFile('%s-lastExpInfo.psydat'%scriptName, expInfo) #save params to file for nex
 dateStr = ts.strftime("%m-%d-%Y", ts.localtime()) # add the current time
 logFilename = 'Logs/ER3_%s-%d_%s.log'%(expInfo['subject'], expInfo['session'], dateStr) # log filename
 logging.LogFile((logFilename), level=logging.INFO)#, mode='w') # w=overwrite
+EventSidecar.OpenEventSidecar(logFilename + '.events.bin') # typed copy of events for fast loading
+EventSidecar.OpenTrajectoryFile(logFilename + '.vas.bin') # VAS marker position on every frame
 logging.log(level=logging.INFO, msg='---START PARAMETERS---')
 logging.log(level=logging.INFO, msg='filename: %s'%logFilename)
 logging.log(level=logging.INFO, msg='subject: %s'%expInfo['subject'])
@@ -202,13 +206,12 @@ else:
 # ===== SET UP STIMULI ===== #
 # ========================== #
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock() #to keep track of time
 trialClock = core.Clock() #to keep track of time
 win = visual.Window(params['screenRes'], fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+EventSidecar.LogKeysFromWindow(win) # record keypresses in event sidecar
+SetUpFlipScheduler(win,globalClock,params['speedUp']) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -265,6 +268,14 @@ print('%d questions loaded from %s'%(len(questions_vas4),params['moodQuestionFil
 [questions_postsoundcheck,options_postsoundcheck,answers_postsoundcheck] = BasicPromptTools.ParseQuestionFile(params['PostSoundCheckFile'])
 print('%d questions loaded from %s'%(len(questions_postsoundcheck),params['PostSoundCheckFile']))
 
+# build the text stimuli for each page of the prompts now, before the task starts, so showing a page (or paging
+# back to one) is just a draw and a flip
+promptPages = BasicPromptTools.PreparePromptPages(topPrompts,bottomPrompts,win,message1,message2)
+promptPages_sound = BasicPromptTools.PreparePromptPages(topPrompts_sound,bottomPrompts_sound,win,message1,message2)
+preVasPages = BasicPromptTools.PreparePromptPages([params['PreVasMsg']],["Press any button to continue."],win,message1,message2)
+reminderPages = BasicPromptTools.PreparePromptPages([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2)
+preFinalVasPages = BasicPromptTools.PreparePromptPages([params['PreFinalVasMsg']],["Press any button to continue."],win,message1,message2)
+
 # ========================== #
 # ===== SET UP TIMING ===== #
 # ========================== #
@@ -329,16 +340,8 @@ for i in range(3):
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement/params['speedUp']
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def WaitForFlipTime():
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         keyList = event.getKeys()
         # Check for escape characters
         for key in keyList:
@@ -349,6 +352,7 @@ def WaitForFlipTime():
 def SetPortData(data):
     if params['sendPortEvents']:
         logging.log(level=logging.EXP,msg='set port %s to %d'%(format(params['portAddress'],'#04x'),data))
+        EventSidecar.LogEvent('port',code=data)
         port.setData(data)
     else:
         print('Port event: %d'%data)
@@ -361,7 +365,7 @@ def WaitForScanner():
     message2.setText("(Press '%c' when it is.)"%params['preppedKey'].upper())
     message1.draw()
     message2.draw()
-    win.logOnFlip(level=logging.EXP, msg='Display WaitingForPrep')
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display WaitingForPrep')
     win.flip()
     keyList = event.waitKeys(keyList=[params['preppedKey'],'q','escape'])
     # Check for escape characters
@@ -374,7 +378,7 @@ def WaitForScanner():
     message2.setText("(Press '%c' to override.)"%params['triggerKey'].upper())
     message1.draw()
     message2.draw()
-    win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display WaitingForScanner')
     win.flip()
     keyList = event.waitKeys(keyList=[params['triggerKey'],'q','escape'])
     SetFlipTimeToNow()
@@ -391,7 +395,7 @@ def ShowPreBlockPrompt(question,iPrompt):
     message1.draw()
     message2.draw()
     # set up logging
-    win.logOnFlip(level=logging.EXP, msg='Display PreBlockPrompt%d'%iPrompt)
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display PreBlockPrompt%d'%iPrompt)
 
 # Display an image
 def ShowImage(imageFile, imageName='image'):
@@ -401,7 +405,7 @@ def ShowImage(imageFile, imageName='image'):
     stimImage.setImage(imageFile)
     stimImage.draw()
     # log image
-    win.logOnFlip(level=logging.EXP, msg='Display %s %s'%(imageFile,imageName))
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display %s %s'%(imageFile,imageName))
     
 
 # Run a set of visual analog scale (VAS) questions
@@ -424,6 +428,15 @@ def RunVas(questions,options,pos=(0.,-0.25),scaleTextPos=[0.,0.25],questionDur=f
         AddToFlipTime(questionDur*len(questions)) # add question duration * # of questions
 
 
+# Make the rating scales for a set of VAS questions ahead of time, with the same settings RunVas will use
+def PrepareVas(questions,options,pos=(0.,-0.25),scaleTextPos=[0.,0.25]):
+    RatingScales.PrepareRatingScales(questions,options, win, \
+        upKey=params['questionUpKey'], downKey=params['questionDownKey'], selectKey=params['questionSelectKey'],\
+        textColor=params['vasTextColor'], pos=pos,\
+        scaleTextPos=scaleTextPos, labelYPos=pos[1]-params['vasLabelYDist'], markerSize=params['vasMarkerSize'],\
+        tickHeight=1,tickLabelWidth = 0.9)
+
+
 def RunMoodVas(questions,options,name='MoodVas'):
     
     # Wait until it's time
@@ -434,7 +447,7 @@ def RunMoodVas(questions,options,name='MoodVas'):
     
     # display pre-VAS prompt
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts([params['PreVasMsg']],["Press any button to continue."],win,message1,message2)
+        BasicPromptTools.RunPrompts([params['PreVasMsg']],["Press any button to continue."],win,message1,message2,pages=preVasPages)
     
     # Display this VAS
     win.callOnFlip(SetPortData,data=params['codeVas'])
@@ -459,6 +472,7 @@ def DoRun(allImages,allCodes,allNames,dfRunTiming):
     WaitForScanner() # includes SetFlipTimeToNow
     # Log state of experiment
     logging.log(level=logging.EXP,msg='===== START RUN =====')
+    EventSidecar.LogEvent('marker',stim='START RUN')
     iBlock = 0; # reset block number
     
     for iStim in range(dfRunTiming.shape[0]):
@@ -470,31 +484,33 @@ def DoRun(allImages,allCodes,allNames,dfRunTiming):
             # Display get ready message
             message1.text = params['GetReadyMsg']
             message1.draw()
-            win.logOnFlip(level=logging.EXP, msg='Display GetReady')
+            EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display GetReady')
         elif eventType=='RestInstructionsMsg':
             # Display instructions before rest
             message1.text = params['RestInstructionsMsg']
             message1.draw()
-            win.logOnFlip(level=logging.EXP, msg='Display RestInstructions')
+            EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display RestInstructions')
         elif eventType=='Baseline':
             # display fixation before first stimulus
             fixation.draw()
             win.callOnFlip(SetPortData,data=params['codeBaseline'])
-            win.logOnFlip(level=logging.EXP, msg='Display Fixation')
+            EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display Fixation')
         elif eventType=='fixation':
             # display fixation and reset port
             fixation.draw()
             win.callOnFlip(SetPortData,data=0)
-            win.logOnFlip(level=logging.EXP, msg='Display Fixation')
+            EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display Fixation')
         elif eventType.startswith('prompt'):
             # Log state of experiment
             if iBlock>0:
                 logging.log(level=logging.EXP,msg='=== END BLOCK %d, TYPE %d ==='%(iBlock,iBlockType))
+                EventSidecar.LogEvent('marker',stim='END BLOCK',code=iBlock)
             # update block index
             iBlock = iBlock + 1;
             iBlockType = int(eventType[-1]);
             # Log state of experiment
             logging.log(level=logging.EXP,msg='=== START BLOCK %d, TYPE %d ==='%(iBlock,iBlockType))
+            EventSidecar.LogEvent('marker',stim='START BLOCK',code=iBlock)
             # Display pre-block prompt
             ShowPreBlockPrompt(questions[iBlockType].upper(), iBlockType)
         elif eventType.startswith('face'):
@@ -515,10 +531,11 @@ def DoRun(allImages,allCodes,allNames,dfRunTiming):
         elif eventType=='coolDown':
             # Log state of experiment
             logging.log(level=logging.EXP,msg='=== END BLOCK %d TYPE %d ==='%(iBlock,iBlockType))
+            EventSidecar.LogEvent('marker',stim='END BLOCK',code=iBlock)
             # display fixation and reset port
             fixation.draw()
             win.callOnFlip(SetPortData,data=0)
-            win.logOnFlip(level=logging.EXP, msg='Display Fixation')
+            EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display Fixation')
         # wait until it's time to show screen
         WaitForFlipTime()
         # show screen and update next flip time 
@@ -529,6 +546,7 @@ def DoRun(allImages,allCodes,allNames,dfRunTiming):
     WaitForFlipTime()
     # Log state of experiment
     logging.log(level=logging.EXP,msg='===== END RUN =====')
+    EventSidecar.LogEvent('marker',stim='END RUN')
 
 
 # Handle end of a session
@@ -541,16 +559,28 @@ def CoolDown():
     # display cool-down message
     message1.setText("That's the end! We will take you out of the scanner now. ")
     message2.setText("Press 'q' or 'escape' to end the session.")
-    win.logOnFlip(level=logging.EXP, msg='Display TheEnd')
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display TheEnd')
     message1.draw()
     message2.draw()
     win.flip()
     thisKey = event.waitKeys(keyList=['q','escape'])
     
     # exit
+    EventSidecar.CloseEventSidecar()
+    EventSidecar.CloseTrajectoryFile()
     core.quit()
 
 
+# === MAKE RATING SCALES === #
+# make the VAS rating scales now, so the first VAS with each set of options doesn't make its scale while it's timed
+PrepareVas(questions,options)
+PrepareVas(questions_vas1,options_vas1)
+PrepareVas(questions_vas2,options_vas2)
+PrepareVas(questions_vas3,options_vas3)
+PrepareVas(questions_vas4,options_vas4)
+PrepareVas(questions_postsoundcheck,options_postsoundcheck)
+
+
 # === SET UP GLOBAL ESCAPE KEY === #
 event.globalKeys.clear()
 event.globalKeys.add(key='q', modifiers=['ctrl'], func=CoolDown)
@@ -568,15 +598,15 @@ if int(expInfo['startAtRun'])==1:
     # ---Instructions
     # display prompts
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts(topPrompts,bottomPrompts,win,message1,message2)
+        BasicPromptTools.RunPrompts(topPrompts,bottomPrompts,win,message1,message2,pages=promptPages)
 
     # ---Sound Check
     # show instructions
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2)
+        BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2,pages=promptPages_sound)
 
     # show blank screen
-    win.logOnFlip(level=logging.EXP, msg='Display Blank')
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display Blank')
     win.flip()
     # wait briefly
     core.wait(0.5)
@@ -591,7 +621,7 @@ if int(expInfo['startAtRun'])==1:
     
     #---reminder prompt
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2)
+        BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2,pages=reminderPages)
 
     # ---Run 1
     DoRun(allImages,allCodes,allNames,dfTiming[0])
@@ -603,7 +633,7 @@ if int(expInfo['startAtRun'])==1:
     # display break prompt
     message1.text = params['BreakMsg']
     # Set up display
-    win.logOnFlip(level=logging.EXP, msg='Display BreakMsg')
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display BreakMsg')
     message1.draw()
     # Wait until it's time to display
     WaitForFlipTime()
@@ -617,10 +647,10 @@ if int(expInfo['startAtRun'])<=2:
     # ---Sound Check
     # show instructions
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2)
+        BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2,pages=promptPages_sound)
 
     # show blank screen
-    win.logOnFlip(level=logging.EXP, msg='Display Blank')
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display Blank')
     win.flip()
     # wait briefly
     core.wait(0.5)
@@ -635,7 +665,7 @@ if int(expInfo['startAtRun'])<=2:
 
     #---reminder prompt 
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2)
+        BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2,pages=reminderPages)
 
     # ---Run 2
     DoRun(allImages,allCodes,allNames,dfTiming[1])
@@ -647,7 +677,7 @@ if int(expInfo['startAtRun'])<=2:
     # display break prompt
     message1.text = params['BreakMsg']
     # Set up display
-    win.logOnFlip(level=logging.EXP, msg='Display BreakMsg')
+    EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display BreakMsg')
     message1.draw()
     # Wait until it's time to display
     WaitForFlipTime()
@@ -660,10 +690,10 @@ if int(expInfo['startAtRun'])<=2:
 # ---Sound Check
 # show instructions
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2)
+    BasicPromptTools.RunPrompts(topPrompts_sound,bottomPrompts_sound,win,message1,message2,pages=promptPages_sound)
 
 # show blank screen
-win.logOnFlip(level=logging.EXP, msg='Display Blank')
+EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display Blank')
 win.flip()
 # wait briefly
 core.wait(0.5)
@@ -678,7 +708,7 @@ RunSoundVas(questions_postsoundcheck,options_postsoundcheck,name='SoundCheck3-')
 
 #---reminder prompt 
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2)
+    BasicPromptTools.RunPrompts([params['BetweenRunsReminderMsg']],["Press any button to continue."],win,message1,message2,pages=reminderPages)
 
 # ---Run 3
 DoRun(allImages,allCodes,allNames,dfTiming[2])
@@ -687,7 +717,7 @@ DoRun(allImages,allCodes,allNames,dfTiming[2])
 WaitForFlipTime()
 # display done prompt
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts([params['PreFinalVasMsg']],["Press any button to continue."],win,message1,message2)
+    BasicPromptTools.RunPrompts([params['PreFinalVasMsg']],["Press any button to continue."],win,message1,message2,pages=preFinalVasPages)
 
 # ---VAS
 RunMoodVas(questions_vas4,options_vas4,name='PostRun3-')
@@ -21,6 +21,7 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import time as ts, numpy as np # for timing and array operations
 import os, glob # for file manipulation
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random # for randomization of trials
 import RatingScales # for VAS sliding scale
 
@@ -185,13 +186,11 @@ else:
 # ===== SET UP STIMULI ===== #
 # ========================== #
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(params['screenRes'], fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -232,6 +231,14 @@ print('%d questions loaded from %s'%(len(questions),params['faceQuestionFile']))
 [questions_vas1,options_vas1,answers_vas1] = BasicPromptTools.ParseQuestionFile(params['moodQuestionFile1'])
 print('%d questions loaded from %s'%(len(questions_vas1),params['moodQuestionFile1']))
 
+# build the text stimuli for each page of the prompts now, before the task starts, so showing a page (or paging
+# back to one) is just a draw and a flip
+promptPages1 = BasicPromptTools.PreparePromptPages(topPrompts1,bottomPrompts1,win,message1,message2)
+promptPages2 = BasicPromptTools.PreparePromptPages(topPrompts2,bottomPrompts2,win,message1,message2)
+promptPages3 = BasicPromptTools.PreparePromptPages(topPrompts3,bottomPrompts3,win,message1,message2)
+promptPages4 = BasicPromptTools.PreparePromptPages(topPrompts4,bottomPrompts4,win,message1,message2)
+preVasPages = BasicPromptTools.PreparePromptPages([params['PreVasMsg']],["Press any button to continue."],win,message1,message2)
+
 # declare order of blocks for later randomization
 blockOrder = list(range(params['nBlocksPerGroup']))
 
@@ -240,16 +247,8 @@ blockOrder = list(range(params['nBlocksPerGroup']))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def WaitForFlipTime():
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         keyList = event.getKeys()
         # Check for escape characters
         for key in keyList:
@@ -349,6 +348,15 @@ def RunVas(questions,options,pos=(0.,-0.25),scaleTextPos=[0.,0.25],questionDur=p
 
 
 
+# Make the rating scales for a set of VAS questions ahead of time, with the same settings RunVas will use
+def PrepareVas(questions,options,pos=(0.,-0.25),scaleTextPos=[0.,0.25]):
+    RatingScales.PrepareRatingScales(questions,options, win, \
+        upKey=params['questionUpKey'], downKey=params['questionDownKey'], selectKey=params['questionSelectKey'],\
+        textColor=params['vasTextColor'], pos=pos,\
+        scaleTextPos=scaleTextPos, labelYPos=pos[1]-params['vasLabelYDist'], markerSize=params['vasMarkerSize'],\
+        tickHeight=1,tickLabelWidth = 0.9)
+
+
 def RunMoodVas(questions,options,name='MoodVas'):
     
     # Wait until it's time
@@ -359,7 +367,7 @@ def RunMoodVas(questions,options,name='MoodVas'):
     
     # display pre-VAS prompt
     if not params['skipPrompts']:
-        BasicPromptTools.RunPrompts([params['PreVasMsg']],["Press any button to continue."],win,message1,message2)
+        BasicPromptTools.RunPrompts([params['PreVasMsg']],["Press any button to continue."],win,message1,message2,pages=preVasPages)
     
     # Display this VAS
     win.callOnFlip(SetPortData,data=params['codeVas'])
@@ -492,6 +500,12 @@ def CoolDown():
     core.quit()
 
 
+# === MAKE RATING SCALES === #
+# make the VAS rating scales now, so the first VAS with each set of options doesn't make its scale while it's timed
+PrepareVas(questions,options)
+PrepareVas(questions_vas1,options_vas1)
+
+
 # === SET UP GLOBAL ESCAPE KEY === #
 event.globalKeys.clear()
 event.globalKeys.add(key='q', modifiers=['ctrl'], func=CoolDown)
@@ -505,7 +519,7 @@ logging.log(level=logging.EXP, msg='---START EXPERIMENT---')
 # ---Instructions
 # display prompts
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts(topPrompts1,bottomPrompts1,win,message1,message2)
+    BasicPromptTools.RunPrompts(topPrompts1,bottomPrompts1,win,message1,message2,pages=promptPages1)
 
 # ---VAS
 RunMoodVas(questions_vas1,options_vas1,name='PreRun1-')
@@ -513,7 +527,7 @@ RunMoodVas(questions_vas1,options_vas1,name='PreRun1-')
 # ---Instructions
 # display prompts
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts(topPrompts2,bottomPrompts2,win,message1,message2)
+    BasicPromptTools.RunPrompts(topPrompts2,bottomPrompts2,win,message1,message2,pages=promptPages2)
 
 # ---Run 1
 DoRun(allImages,allCodes,allNames)
@@ -521,7 +535,7 @@ DoRun(allImages,allCodes,allNames)
 # ---Instructions
 # display prompts
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts(topPrompts3,bottomPrompts3,win,message1,message2)
+    BasicPromptTools.RunPrompts(topPrompts3,bottomPrompts3,win,message1,message2,pages=promptPages3)
 
 # ---Run 2
 DoRun(allImages,allCodes,allNames)
@@ -529,7 +543,7 @@ DoRun(allImages,allCodes,allNames)
 # ---Instructions
 # display prompts
 if not params['skipPrompts']:
-    BasicPromptTools.RunPrompts(topPrompts4,bottomPrompts4,win,message1,message2)
+    BasicPromptTools.RunPrompts(topPrompts4,bottomPrompts4,win,message1,message2,pages=promptPages4)
 
 # ---Run 3
 DoRun(allImages,allCodes,allNames)
@@ -25,9 +25,108 @@ import re             # for splitting strings
 import argparse       # for command-line arguments
 from glob import glob # for finding files
 import os             # for handling paths
-
-# Import full log (including keypresses)
-def ImportExtinctionRecallTaskLog(logFile):
+import multiprocessing # for processing logs in parallel
+import hashlib        # for detecting changed logs
+import json           # for the processed-log manifest
+import sqlite3        # for the cross-subject VAS store
+from ParseCache import ReplaceFile # for replacing the manifest in one step, under python 2 or 3 (in GeneralTools)
+try:
+    import EventSidecar   # for loading the binary event sidecars written by the task (in GeneralTools)
+except ImportError:
+    EventSidecar = None
+
+# Version of the parser and its outputs. Increment this when a change should make already-processed logs be reprocessed.
+parserVersion = 1
+# Name of the file in the output folder that records which logs have been processed
+manifestName = 'ER3-ProcessedManifest.json'
+# Name of the append-only database in the output folder that holds the cross-subject VAS table rows
+vasStoreName = 'ER3-VasStore.sqlite'
+
+# Set a cell in a table stored as a dict of column lists, adding empty (NaN) rows up to index iRow if needed.
+# This mimics df.loc[iRow,col]=value without re-allocating a DataFrame on every write.
+def SetCell(cols,iRow,col,value):
+    while len(cols[col])<=iRow:
+        for colList in cols.values():
+            colList.append(np.nan)
+    cols[col][iRow] = value
+
+# Get a cell from a table stored as a dict of column lists (NaN if the row doesn't exist yet).
+def GetCell(cols,iRow,col):
+    if 0<=iRow<len(cols[col]):
+        return cols[col][iRow]
+    else:
+        return np.nan
+
+# Convert a dict of column lists to a DataFrame in one step (object columns, like tables built with df.loc).
+def ColsToDataFrame(cols):
+    return pd.DataFrame(cols,columns=list(cols.keys()),dtype=object)
+
+# Get the time of the first key (other than excludeKey) pressed after each time in tStarts, using a binary search.
+# keyTimes and keyNames are the times and names of all keypresses in the log. If nKeysLogged is given, only the
+# first nKeysLogged[i] keypresses in the log are searched for tStarts[i] (i.e., keys logged before that VAS ended).
+# Returns an array the same size as tStarts, with NaN where no such key was found.
+def GetFirstKeyTimes(keyTimes,keyNames,tStarts,excludeKey,nKeysLogged=None):
+    # sort keypresses by time and split out the ones we're looking for
+    keyTimes = np.asarray(keyTimes,dtype=float)
+    iSorted = np.argsort(keyTimes,kind='mergesort') # stable, so simultaneous keys stay in log order
+    iKeep = iSorted[np.asarray(keyNames,dtype=object)[iSorted]!=excludeKey] # log indices of non-excluded keys, by time
+    tKeep = keyTimes[iKeep]
+    # find the first one after each start time
+    tStarts = np.asarray(tStarts,dtype=float)
+    iFirst = np.searchsorted(tKeep,tStarts,side='right')
+    isFound = iFirst<len(tKeep)
+    if nKeysLogged is not None:
+        isFound[isFound] = iKeep[iFirst[isFound]]<np.asarray(nKeysLogged)[isFound]
+    tFirst = np.full(len(tStarts),np.nan)
+    tFirst[isFound] = tKeep[iFirst[isFound]]
+    return tFirst
+
+# Read a (possibly very large) log file one line at a time, starting startOffset bytes into the file.
+# Yields (nextOffset, line) tuples, where nextOffset is the byte offset just after the line: pass it back in as
+# startOffset to resume reading after that line. Only one line is held in memory at a time.
+def ReadLogLines(logFile,startOffset=0):
+    with open(logFile,'rb') as f:
+        f.seek(startOffset)
+        offset = startOffset
+        for line in f:
+            offset += len(line)
+            yield offset, line.decode('utf-8',errors='replace')
+
+
+# Read the requested channels of an ER3 log in a single pass.
+# channels is a list containing any of 'params','keys','displays','sync','blocks','vas'.
+# Params are always read (other channels need them). Lines that only matter to channels that weren't requested are
+# skipped after splitting off their first few words. timeToFirstPress is inferred for timed-out VASs from the keys in
+# the log, or if 'keys' isn't requested, from the keys in table dfKey (e.g. from ReadErEventSidecar). If neither is
+# available, it is set to NaN.
+# Returns a dict with key 'params' and, for each requested channel: 'dfKey','dfDisp','dfSync','dfBlock', or
+# 'dfMoodVas','dfSoundVas','dfImageVas'.
+def ReadErLog(logFile,channels=('params','keys','displays','sync','blocks','vas'),dfKey=None):
+
+    # Check inputs
+    allChannels = ['params','keys','displays','sync','blocks','vas']
+    for channel in channels:
+        if channel not in allChannels:
+            raise ValueError('channel %s not recognized. Options are %s.'%(channel,allChannels))
+    isKeys = 'keys' in channels
+    isDisp = 'displays' in channels
+    isSync = 'sync' in channels
+    isBlock = 'blocks' in channels
+    isVas = 'vas' in channels
+    isKeyTable = (dfKey is not None) and not isKeys # infer timeToFirstPress from dfKey instead of the log's keys
+
+    # Get the message words that each requested channel needs
+    tags = set()
+    if isKeys:
+        tags.update(['Keypress:'])
+    if isDisp or isVas:
+        tags.update(['Display'])
+    if isSync:
+        tags.update(['set'])
+    if isBlock or isVas:
+        tags.update(['=====','====','===','bottomMsg:'])
+    if isVas:
+        tags.update(['RatingScale'])
 
     # === Read in PsychoPy log
 
@@ -35,41 +134,41 @@ def ImportExtinctionRecallTaskLog(logFile):
     print('Reading file %s...'%logFile)
     t = time.time()
 
-    # Load file
-    with open(logFile) as f:
-        allLines = f.read().splitlines(True)
-
-    # Set up outputs
-    dfKey = pd.DataFrame(columns=['t','key'])
-    dfDisp = pd.DataFrame(columns=['t','stim','CS'])
-    dfSync = pd.DataFrame(columns=['t','value'])
-    dfBlock = pd.DataFrame(columns=['tStart','tEnd','type','run'])
-    dfVas = pd.DataFrame(columns=['imageFile','CSplusPercent','type','name','rating','timeToFirstPress','RT','run','group','block','trial','tImage','tStart','tEnd'])
+    # Set up outputs (each table is a dict of column lists until all lines are read)
+    keyCols = {'t':[],'key':[]}
+    dispCols = {'t':[],'stim':[],'CS':[]}
+    syncCols = {'t':[],'value':[]}
+    blockCols = {'tStart':[],'tEnd':[],'type':[],'run':[]}
+    vasCols = {col:[] for col in ['imageFile','CSplusPercent','type','name','rating','timeToFirstPress','RT','run','group','block','trial','tImage','tStart','tEnd']}
     params = {}
-    iKey = 0;
-    iDisp = 0;
-    iSync = 0;
     iVas = 0;
     iBlock = -1;
     run = 0; # 1-based numbering
     group = 0
     block = 0
     trial = 0
+    blockType = np.nan # type of current block
+    tLastDisp = np.nan # time of most recent display
+    timedOutVas = [] # (VAS index, start time, end time, # keys logged so far) of timed-out VASs
     isParams = False;
 
-    # Read each line
-    for line in allLines:
-        # split into parts
-        data = line.split()
+    # Read each line (streaming, so the whole file is never in memory)
+    for nextOffset,line in ReadLogLines(logFile):
+        # split off time, level, and first word of message
+        data = line.split(None,3)
+        if len(data)<3:
+            continue
+        tag = data[2]
 
         # Find params
-        if 'START PARAMETERS' in line:
+        if tag=='---START' and 'PARAMETERS' in line:
             isParams = True;
-        elif 'END PARAMETERS' in line:
+        elif tag=='---END' and 'PARAMETERS' in line:
             isParams = False;
 
         # Parse params
         elif isParams: # parse parameter
+            data = line.split()
             key = data[2][:-1] # name of parameter
             if len(data)==4:
                 try:
@@ -81,87 +180,177 @@ def ImportExtinctionRecallTaskLog(logFile):
             else:
                 params[key] = ' '.join(data[3:])
 
-        # Parse data
-        elif len(data)>2:
-            if data[2]=='Keypress:': # time and key pressed
-                dfKey.loc[iKey,'t'] = float(data[0])
-                dfKey.loc[iKey,'key'] = data[3]
-                iKey +=1;
-            elif data[2]=='Display': # time and stim presented
-                dfDisp.loc[iDisp,'t'] = float(data[0])
-                dfDisp.loc[iDisp,'stim'] = data[3]
+        # Parse data (skipping lines no requested channel needs)
+        elif tag in tags:
+            data = line.split()
+            if tag=='Keypress:': # time and key pressed
+                keyCols['t'].append(float(data[0]))
+                keyCols['key'].append(data[3])
+            elif tag=='Display': # time and stim presented
+                tLastDisp = float(data[0])
+                if isDisp:
+                    dispCols['t'].append(tLastDisp)
+                    dispCols['stim'].append(data[3])
+                    dispCols['CS'].append(data[4] if len(data)>4 else np.nan)
                 if len(data)>4: # if a CS level is specified...
                     trial +=1
-                    dfDisp.loc[iDisp,'CS'] = data[4] # log it
                     # set VAS stimulus and type
-                    dfVas.loc[iVas,'tImage'] = dfDisp.loc[iDisp,'t']
-                    dfVas.loc[iVas,'imageFile'] = dfDisp.loc[iDisp,'stim']
-                    dfVas.loc[iVas,'CSplusPercent'] = int(dfDisp.loc[iDisp,'CS'][6:])
-                    dfVas.loc[iVas,'type'] = dfBlock.loc[iBlock,'type']
-                iDisp +=1;
-            elif data[2]=='set': # message time and text
-                dfSync.loc[iSync,'t'] = float(data[0])
-                dfSync.loc[iSync,'value'] = float(data[-1])
-                iSync +=1;
-            elif data[2]=='=====' and data[3]=='START' and data[4]=='RUN':
+                    if isVas:
+                        SetCell(vasCols,iVas,'tImage',tLastDisp)
+                        SetCell(vasCols,iVas,'imageFile',data[3])
+                        SetCell(vasCols,iVas,'CSplusPercent',int(data[4][6:]))
+                        SetCell(vasCols,iVas,'type',blockType)
+            elif tag=='set': # message time and text
+                syncCols['t'].append(float(data[0]))
+                syncCols['value'].append(float(data[-1]))
+            elif tag=='=====' and data[3]=='START' and data[4]=='RUN':
                 run +=1
-            elif data[2]=='====' and data[3]=='START' and data[4]=='GROUP':
+            elif tag=='====' and data[3]=='START' and data[4]=='GROUP':
                 group = int(data[5][0])
-            elif data[2]=='===' and data[3]=='START' and data[4]=='BLOCK': # block start time
+            elif tag=='===' and data[3]=='START' and data[4]=='BLOCK': # block start time
                 block = int(data[5][0])
                 trial = 0
                 iBlock +=1;
-                dfBlock.loc[iBlock,'tStart'] = float(data[0])
-                dfBlock.loc[iBlock,'run'] = run
-            elif data[2]=='===' and data[3]=='END' and data[4]=='BLOCK': # block end time
-                dfBlock.loc[iBlock,'tEnd'] = float(data[0])
-            elif data[2]=='bottomMsg:':
-                if 'AFRAID' in line:
-                    dfBlock.loc[iBlock,'type'] = 'afraid'
-                elif 'SCREAM' in line:
-                    dfBlock.loc[iBlock,'type'] = 'scream'
-            elif data[2]=='RatingScale': # VAS time, rating, RT
+                blockType = np.nan
+                if isBlock:
+                    SetCell(blockCols,iBlock,'tStart',float(data[0]))
+                    SetCell(blockCols,iBlock,'run',run)
+            elif tag=='===' and data[3]=='END' and data[4]=='BLOCK': # block end time
+                if isBlock:
+                    SetCell(blockCols,iBlock,'tEnd',float(data[0]))
+            elif tag=='bottomMsg:':
+                if 'AFRAID' in line or 'SCREAM' in line:
+                    blockType = 'afraid' if 'AFRAID' in line else 'scream'
+                    if isBlock and iBlock>=0:
+                        SetCell(blockCols,iBlock,'type',blockType)
+            elif tag=='RatingScale': # VAS time, rating, RT
                 if "rating=" in line:
-                    dfVas.loc[iVas,'tStart'] = dfDisp.loc[iDisp-1,'t']
-                    dfVas.loc[iVas,'tEnd'] = float(data[0])
-                    dfVas.loc[iVas,'name'] = data[3][:-1]
+                    tStart = tLastDisp
+                    SetCell(vasCols,iVas,'tStart',tStart)
+                    SetCell(vasCols,iVas,'tEnd',float(data[0]))
+                    SetCell(vasCols,iVas,'name',data[3][:-1])
                     value = float(data[-1].split("=")[-1])
-                    dfVas.loc[iVas,'rating'] = value
+                    SetCell(vasCols,iVas,'rating',value)
                     # if it's an image vas, set indices
-                    if dfVas.loc[iVas,'type'] in ['afraid','scream']:
-                        dfVas.loc[iVas,'run'] = run
-                        dfVas.loc[iVas,'group'] = group
-                        dfVas.loc[iVas,'block'] = block
-                        dfVas.loc[iVas,'trial'] = trial
+                    vasType = GetCell(vasCols,iVas,'type')
+                    if vasType in ['afraid','scream']:
+                        SetCell(vasCols,iVas,'run',run)
+                        SetCell(vasCols,iVas,'group',group)
+                        SetCell(vasCols,iVas,'block',block)
+                        SetCell(vasCols,iVas,'trial',trial)
                     # if the response timed out, advance without RT/history
                     if "timed out" in line:
-                        dfVas.loc[iVas,'RT'] = np.nan;
-                        # infer time to first keypress from                         
-                        iKeys = np.where((dfKey.t>dfVas.loc[iVas,'tStart']) & (dfKey.key!=str(params['triggerKey'])[0]))[0]
-                        if len(iKeys)>0:
-                            dfVas.loc[iVas,'timeToFirstPress'] = dfKey.loc[iKeys[0],'t'] - dfVas.loc[iVas,'tStart'];
+                        SetCell(vasCols,iVas,'RT',np.nan);
+                        if isKeys or isKeyTable:
+                            # infer time to first keypress from keys pressed since the VAS started (once all keys are read)
+                            SetCell(vasCols,iVas,'timeToFirstPress',np.nan);
+                            timedOutVas.append((iVas,tStart,float(data[0]),len(keyCols['t'])))
+                            timeoutMsg = 'RT will be set to NaN, timeToFirstPress inferred from key-display interval.'
                         else:
-                            dfVas.loc[iVas,'timeToFirstPress'] = np.nan;
-                        if dfVas.loc[iVas,'type'] in ['afraid','scream']:
-                            print('WARNING: image rating scale at t=%g (run %d group %d block %d trial %d) timed out! RT will be set to NaN, timeToFirstPress inferred from key-display interval.'%(dfVas.loc[iVas,'tStart'],run,group,block,trial))
+                            # NOTE: nan indicates unknown, not lack of keypress!
+                            SetCell(vasCols,iVas,'timeToFirstPress',np.nan);
+                            timeoutMsg = 'RT and timeToFirstPress will be set to NaN.'
+                        if vasType in ['afraid','scream']:
+                            print('WARNING: image rating scale at t=%g (run %d group %d block %d trial %d) timed out! %s'%(tStart,run,group,block,trial,timeoutMsg))
                         else:
-                            print('WARNING: mood rating scale at t=%g timed out! RT will be set to NaN, timeToFirstPress inferred from key-display interval.'%(dfVas.loc[iVas,'tStart']))
+                            print('WARNING: mood rating scale at t=%g timed out! %s'%(tStart,timeoutMsg))
                         # increment VAS index
                         iVas +=1;
                 elif "RT=" in line:
                     value = float(data[-1].split("=")[-1])
-                    dfVas.loc[iVas,'RT'] = value
+                    SetCell(vasCols,iVas,'RT',value)
                 elif "history=" in line:
                     # get time to first button presss
                     if len(re.split('\), |, |\)]',line))>3:
                         timeToPress = float(re.split('\), |, |\)]',line)[3])
                     else:
-                        timeToPress = dfVas.loc[iVas,'RT'] # if no press, default to RT
-                    dfVas.loc[iVas,'timeToFirstPress'] = timeToPress
+                        timeToPress = GetCell(vasCols,iVas,'RT') # if no press, default to RT
+                    SetCell(vasCols,iVas,'timeToFirstPress',timeToPress)
                     # increment VAS index
                     iVas +=1;
+
+    # Infer time to first keypress for all timed-out VASs at once
+    if len(timedOutVas)>0:
+        iTimedOut,tStarts,tEnds,nKeysLogged = zip(*timedOutVas)
+        if isKeyTable:
+            # the table's keys are in the order they were logged, so the ones logged before each VAS ended are found by time
+            keyTimes,keyNames = np.asarray(dfKey['t'],dtype=float),np.asarray(dfKey['key'],dtype=object)
+            nKeysLogged = np.searchsorted(keyTimes,tEnds,side='right')
+        else:
+            keyTimes,keyNames = keyCols['t'],keyCols['key']
+        tFirstKeys = GetFirstKeyTimes(keyTimes,keyNames,tStarts,str(params['triggerKey'])[0],nKeysLogged)
+        for i,iVasOut in enumerate(iTimedOut):
+            SetCell(vasCols,iVasOut,'timeToFirstPress',tFirstKeys[i] - tStarts[i])
     print('Done! Took %.1f seconds.'%(time.time()-t))
 
+    # Convert requested channels to tables
+    results = {'params':params}
+    if isKeys:
+        results['dfKey'] = ColsToDataFrame(keyCols)
+    if isDisp:
+        results['dfDisp'] = ColsToDataFrame(dispCols)
+    if isSync:
+        results['dfSync'] = ColsToDataFrame(syncCols)
+    if isBlock:
+        results['dfBlock'] = ColsToDataFrame(blockCols)
+    if isVas:
+        dfVas = ColsToDataFrame(vasCols)
+        results['dfMoodVas'],results['dfSoundVas'],results['dfImageVas'] = SplitVasTable(params,dfVas,logFile)
+
+    # Return results
+    return results
+
+
+# Get the filename of the binary event sidecar the task writes next to its log.
+def GetEventSidecarFilename(logFile):
+    return logFile + '.events.bin'
+
+
+# Load the keypresses, displays, and port events of a session from the binary event sidecar the task writes next to
+# its log (no text parsing). Returns a dict with keys 'dfKey','dfDisp','dfSync', in the same format as ReadErLog.
+def ReadErEventSidecar(eventFile):
+    events = EventSidecar.ReadEventSidecar(eventFile)
+    results = {}
+    # keys
+    keyEvents = events[events['type']==EventSidecar.eventTypes['key']]
+    results['dfKey'] = ColsToDataFrame({'t': keyEvents['t'].tolist(),
+                                        'key': np.char.decode(keyEvents['key'],'utf-8').tolist()})
+    # displays (stimulus name, then CS level if there is one)
+    dispEvents = events[events['type']==EventSidecar.eventTypes['display']]
+    nCut = np.sum(dispEvents['stimLength']>np.char.str_len(dispEvents['stim']))
+    if nCut>0:
+        print('WARNING: %d display names were too long for event sidecar %s and were cut short!'%(nCut,eventFile))
+    dispWords = [stim.split(None,1) for stim in np.char.decode(dispEvents['stim'],'utf-8').tolist()]
+    results['dfDisp'] = ColsToDataFrame({'t': dispEvents['t'].tolist(),
+                                         'stim': [words[0] for words in dispWords],
+                                         'CS': [words[1] if len(words)>1 else np.nan for words in dispWords]})
+    # port events
+    portEvents = events[events['type']==EventSidecar.eventTypes['port']]
+    results['dfSync'] = ColsToDataFrame({'t': portEvents['t'].tolist(),
+                                         'value': portEvents['code'].astype(float).tolist()})
+    return results
+
+
+# Check that reading a session with its event sidecar (as ProcessERLog does when making BIDS files) gives the same
+# keys, displays, port events and VAS tables as reading everything from its text log (to within the 0.1 ms the text
+# log rounds times to). Prints each table that differs and returns a list of their names.
+def CheckEventSidecar(logFile):
+    textLog = ReadErLog(logFile)
+    sidecarLog = ReadErEventSidecar(GetEventSidecarFilename(logFile))
+    sidecarLog.update(ReadErLog(logFile,['params','vas'],dfKey=sidecarLog['dfKey']))
+    differentTables = []
+    for tableName in ['dfKey','dfDisp','dfSync','dfMoodVas','dfSoundVas','dfImageVas']:
+        try:
+            pd.testing.assert_frame_equal(textLog[tableName],sidecarLog[tableName],check_dtype=False,check_exact=False,atol=1e-4)
+        except AssertionError as e:
+            print('%s differs between text log and event sidecar: %s'%(tableName,e))
+            differentTables.append(tableName)
+    print('Checked %s: %d tables differ.'%(os.path.basename(logFile),len(differentTables)))
+    return differentTables
+
+
+# Split the table of all VAS responses into mood, sound, and image VAS tables.
+def SplitVasTable(params,dfVas,logFile):
 
     print('Extracting VAS data...')
     t = time.time()
@@ -190,162 +379,19 @@ def ImportExtinctionRecallTaskLog(logFile):
 
     print('Done! Took %.1f seconds.'%(time.time()-t))
 
-    # Return results
-    return params, dfMoodVas, dfSoundVas, dfImageVas, dfKey, dfDisp, dfSync, dfBlock
+    return dfMoodVas, dfSoundVas, dfImageVas
+
 
+# Import full log (including keypresses)
+def ImportExtinctionRecallTaskLog(logFile):
+    log = ReadErLog(logFile)
+    return log['params'], log['dfMoodVas'], log['dfSoundVas'], log['dfImageVas'], log['dfKey'], log['dfDisp'], log['dfSync'], log['dfBlock']
 
 
 # Import VAS parts of log (excluding keypresses)
 def ImportExtinctionRecallTaskLog_VasOnly(logFile):
-
-    # === Read in PsychoPy log
-
-    # Log start
-    print('Reading file %s...'%logFile)
-    t = time.time()
-
-    # Load file
-    with open(logFile) as f:
-        allLines = f.read().splitlines(True)
-
-    # Set up outputs
-    dfDisp = pd.DataFrame(columns=['t','stim','CS'])
-    dfBlock = pd.DataFrame(columns=['tStart','tEnd','type'])
-    dfVas = pd.DataFrame(columns=['imageFile','CSplusPercent','type','name','rating','timeToFirstPress','RT','run','group','block','trial','tImage','tStart','tEnd'])
-    params = {}
-    iDisp = 0;
-    iVas = 0;
-    iBlock = -1;
-    run = 0; # 1-based numbering
-    group = 0
-    block = 0
-    trial = 0
-    isParams = False;
-
-    # Read each line
-    for line in allLines:
-        # split into parts
-        data = line.split()
-
-        # Find params
-        if 'START PARAMETERS' in line:
-            isParams = True;
-        elif 'END PARAMETERS' in line:
-            isParams = False;
-
-        # Parse params
-        elif isParams: # parse parameter
-            key = data[2][:-1] # name of parameter
-            if len(data)==4:
-                try:
-                    params[key] = float(data[3]) # if it's a number, convert to a float
-                except ValueError:
-                    params[key] = data[3] # otherwise, record the string
-            elif data[3].startswith("["):
-                params[key] = ast.literal_eval(''.join(data[3:])) # if the parameter is a list, make it a list variable
-            else:
-                params[key] = ' '.join(data[3:])
-
-        # Parse data
-        elif len(data)>2:
-            if data[2]=='Display': # time and stim presented
-                dfDisp.loc[iDisp,'t'] = float(data[0])
-                dfDisp.loc[iDisp,'stim'] = data[3]
-                if len(data)>4: # if a CS level is specified...
-                    trial +=1
-                    dfDisp.loc[iDisp,'CS'] = data[4] # log it
-                    # set VAS stimulus and type
-                    dfVas.loc[iVas,'tImage'] = dfDisp.loc[iDisp,'t']
-                    dfVas.loc[iVas,'imageFile'] = dfDisp.loc[iDisp,'stim']
-                    dfVas.loc[iVas,'CSplusPercent'] = int(dfDisp.loc[iDisp,'CS'][6:])
-                    dfVas.loc[iVas,'type'] = dfBlock.loc[iBlock,'type']
-                iDisp +=1;
-            elif data[2]=='=====' and data[3]=='START' and data[4]=='RUN':
-                run +=1
-            elif data[2]=='====' and data[3]=='START' and data[4]=='GROUP':
-                group = int(data[5][0])
-            elif data[2]=='===' and data[3]=='START' and data[4]=='BLOCK': # block start time
-                block = int(data[5][0])
-                trial = 0
-                iBlock +=1;
-                dfBlock.loc[iBlock,'tStart'] = float(data[0])
-                dfBlock.loc[iBlock,'run'] = run
-            elif data[2]=='===' and data[3]=='END' and data[4]=='BLOCK': # block end time
-                dfBlock.loc[iBlock,'tEnd'] = float(data[0])
-            elif data[2]=='bottomMsg:':
-                if 'AFRAID' in line:
-                    dfBlock.loc[iBlock,'type'] = 'afraid'
-                elif 'SCREAM' in line:
-                    dfBlock.loc[iBlock,'type'] = 'scream'
-            elif data[2]=='RatingScale': # VAS time, rating, RT
-                if "rating=" in line:
-                    dfVas.loc[iVas,'tStart'] = dfDisp.loc[iDisp-1,'t']
-                    dfVas.loc[iVas,'tEnd'] = float(data[0])
-                    dfVas.loc[iVas,'name'] = data[3][:-1]
-                    value = float(data[-1].split("=")[-1])
-                    dfVas.loc[iVas,'rating'] = value
-                    # if it's an image vas, set indices
-                    if dfVas.loc[iVas,'type'] in ['afraid','scream']:
-                        dfVas.loc[iVas,'run'] = run
-                        dfVas.loc[iVas,'group'] = group
-                        dfVas.loc[iVas,'block'] = block
-                        dfVas.loc[iVas,'trial'] = trial
-                    # if the response timed out, advance without RT/history
-                    if "timed out" in line:
-                        dfVas.loc[iVas,'RT'] = np.nan;
-                        # NOTE: nan indicates unknown, not lack of keypress! 
-                        dfVas.loc[iVas,'timeToFirstPress'] = np.nan;
-                        if dfVas.loc[iVas,'type'] in ['afraid','scream']:
-                            print('WARNING: image rating scale at t=%g (run %d group %d block %d trial %d) timed out! RT and timeToFirstPress will be set to NaN.'%(dfVas.loc[iVas,'tStart'],run,group,block,trial))
-                        else:
-                            print('WARNING: mood rating scale at t=%g timed out! RT and timeToFirstPress will be set to NaN.'%(dfVas.loc[iVas,'tStart']))
-                        # increment VAS index
-                        iVas +=1;
-                elif "RT=" in line:
-                    value = float(data[-1].split("=")[-1])
-                    dfVas.loc[iVas,'RT'] = value
-                elif "history=" in line:
-                    # get time to first button presss
-                    if len(re.split('\), |, |\)]',line))>3:
-                        timeToPress = float(re.split('\), |, |\)]',line)[3])
-                    else:
-                        timeToPress = dfVas.loc[iVas,'RT'] # if no press, default to RT
-                    dfVas.loc[iVas,'timeToFirstPress'] = timeToPress
-                    # increment VAS index
-                    iVas +=1;
-
-
-    print('Done! Took %.1f seconds.'%(time.time()-t))
-
-    print('Extracting VAS data...')
-    t = time.time()
-    # Parse out mood and sound VAS results
-    dfMoodVas = dfVas.loc[pd.isnull(dfVas['imageFile']),:]
-    dfMoodVas = dfMoodVas.drop(['imageFile','CSplusPercent','run','group','block','trial','tImage'],1)
-    # split into mood & sound
-    dfSoundVas = dfMoodVas.loc[dfMoodVas.name.str.startswith('SoundCheck'),:]
-    dfMoodVas = dfMoodVas.loc[~dfMoodVas.name.str.startswith('SoundCheck'),:]
-    # reset indices
-    dfSoundVas = dfSoundVas.reset_index(drop=True)
-    dfMoodVas = dfMoodVas.reset_index(drop=True)
-
-    # Parse out image VAS results
-    dfImageVas = dfVas.loc[pd.notnull(dfVas['imageFile']),:]
-    dfImageVas = dfImageVas.drop('name',1)
-
-    # add Mood VAS types
-    isTraining = 'Training' in logFile
-    dfMoodVas = GetVasTypes(params,dfMoodVas,isTraining)
-
-    # add Sound VAS types (assuming only one question per sound!!!)
-    dfSoundVas['group']=np.arange(dfSoundVas.shape[0])
-    dfSoundVas['groupName']=[x.split('-')[0] for x in dfSoundVas.name]
-    dfSoundVas['type']='loud'
-
-    print('Done! Took %.1f seconds.'%(time.time()-t))
-
-    # Return results
-    return params, dfMoodVas, dfSoundVas, dfImageVas
+    log = ReadErLog(logFile,['params','vas'])
+    return log['params'], log['dfMoodVas'], log['dfSoundVas'], log['dfImageVas']
 
 
 # Add accurate group, groupName, and type columns to the dfMoodVas dataframe
@@ -382,10 +428,38 @@ def GetVasTypes(params,dfMoodVas,isTraining=False):
 
     return dfMoodVas # return modified dataframe
 
+# Get the filenames of the figures SaveVasFigures makes, and of the file holding the hash of the tables they show.
+def GetVasFigureFilenames(params,outPrefix='ER3_'):
+    figTypes = ['Mood','Image'] if 'Training' in outPrefix else ['Mood','Sound','Image']
+    figFiles = ['%s%d-%d_%sVasFigure.png'%(outPrefix,params['subject'],params['session'],figType) for figType in figTypes]
+    hashFile = '%s%d-%d_VasFigures.sha1'%(outPrefix,params['subject'],params['session'])
+    return figFiles, hashFile
+
+
+# Get a hash of the VAS tables (and figure titles) that SaveVasFigures plots, to tell whether its figures need redrawing.
+def GetVasFigureHash(params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix='ER3_'):
+    figHash = hashlib.sha1(('%d %s %d %d\n'%(parserVersion,os.path.basename(outPrefix),params['subject'],params['session'])).encode('utf-8'))
+    for df in [dfMoodVas,dfSoundVas,dfImageVas]:
+        figHash.update(df.to_csv(index=False).encode('utf-8'))
+    return figHash.hexdigest()
+
+
 # Save figures of the image and mood VAS responses and RTs.
-def SaveVasFigures(params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix='ER3_'):
+# Returns a list of the files saved.
+# If useCache is True, figures are only drawn if the tables they show have changed since they were last drawn.
+def SaveVasFigures(params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix='ER3_',useCache=True):
+
+    # Skip drawing if the tables haven't changed since the figures were saved
+    figFiles,hashFile = GetVasFigureFilenames(params,outPrefix)
+    figHash = GetVasFigureHash(params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix)
+    if useCache and all(os.path.exists(outFile) for outFile in figFiles+[hashFile]):
+        with open(hashFile) as f:
+            if f.read().strip()==figHash:
+                print('VAS figures %s*VasFigure.png are up to date.'%os.path.basename(outPrefix))
+                return figFiles + [hashFile]
 
     # Set up
+    outFiles = []
     outBase = os.path.basename(outPrefix) # filename without the folder
     print('Plotting VAS data...')
     t = time.time()
@@ -430,6 +504,8 @@ def SaveVasFigures(params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix='ER3_'):
     outFile = '%s%d-%d_MoodVasFigure.png'%(outPrefix,params['subject'],params['session'])
     print("Saving Mood VAS figure as %s..."%outFile)
     moodFig.savefig(outFile)
+    plt.close(moodFig)
+    outFiles.append(outFile)
 
 
 
@@ -472,6 +548,8 @@ def SaveVasFigures(params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix='ER3_'):
         outFile = '%s%d-%d_SoundVasFigure.png'%(outPrefix,params['subject'],params['session'])
         print("Saving Sound VAS figure as %s..."%outFile)
         soundFig.savefig(outFile)
+        plt.close(soundFig)
+        outFiles.append(outFile)
 
     # === IMAGE VAS === #
     # Plot image VAS results
@@ -505,9 +583,18 @@ def SaveVasFigures(params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix='ER3_'):
     outFile = '%s%d-%d_ImageVasFigure.png'%(outPrefix,params['subject'],params['session'])
     print("Saving Image VAS figure as %s..."%outFile)
     imgFig.savefig(outFile)
+    plt.close(imgFig)
+    outFiles.append(outFile)
+
+    # Record the hash of the tables plotted
+    with open(hashFile,'w') as f:
+        f.write(figHash)
+    outFiles.append(hashFile)
 
     print('Done! Took %.1f seconds.'%(time.time()-t))
 
+    return outFiles
+
 
 # Convert mood VAS to a single line for logging to multi-subject spreadsheet
 def GetSingleVasLine(params,dfVas,isTraining=False,isSoundVas=False):
@@ -554,77 +641,93 @@ def GetSingleVasLine(params,dfVas,isTraining=False,isSoundVas=False):
     return dfVas_singleRow
 
 
-# Write events to BIDS-formatted events files
+# Write events to BIDS-formatted events files. Returns a list of the files written.
+# Each table is sorted by time once, so each run's events are found with a binary search and taken as contiguous slices.
 def WriteBidsEventsFiles(dfDisp,dfKey,dfImageVas,dfBlock,subject,outFolder='./',isTraining=False):
 
-    # make sure times are floats, not strings
-    dfDisp['t'] = dfDisp['t'].astype(float)
-    dfKey['t'] = dfKey['t'].astype(float)
-
     # Declare column names (based on BIDS specs)
     colNames=['onset','duration','identifier','trial_type','stim_file','response'];
 
-    # Get stim durations
-    tDisp = dfDisp.t.values;
-    dfDisp['duration'] = 0;
-    dfDisp.duration.iloc[:-1] = tDisp[1:] - tDisp[:-1]
+    # Get display times (making sure they're floats, not strings) and durations
+    tDisp = dfDisp['t'].values.astype(float)
+    durDisp = np.zeros(len(tDisp))
+    durDisp[:-1] = tDisp[1:] - tDisp[:-1]
+    stimDisp = dfDisp['stim'].values.astype(object)
 
     # find times of scan starts
-    tWaitForStarts = dfDisp.loc[dfDisp.stim=='WaitingForScanner','t'].values
+    tWaitForStarts = tDisp[stimDisp=='WaitingForScanner']
     print('Writing BIDS event files for %d runs...'%len(tWaitForStarts))
 
+    # sort displays by time, and get their identifiers & whether they're faces or face ratings
+    iSort = np.argsort(tDisp,kind='mergesort')
+    tDisp,durDisp,stimDisp = tDisp[iSort],durDisp[iSort],stimDisp[iSort]
+    isImageDisp = pd.notna(dfDisp['CS'].values[iSort])
+    isImageRatingDisp = stimDisp=='ImageRating0'
+    idDisp = ('disp_' + pd.Series(stimDisp).astype(str)).values.astype(object)
+    idDisp[isImageDisp] = 'disp_Face'
+    idDisp[isImageRatingDisp] = 'disp_ImageRating'
+
+    # sort keys by time, and get their identifiers & the times of scanner triggers
+    tKey = dfKey['t'].values.astype(float)
+    iSort = np.argsort(tKey,kind='mergesort')
+    tKey = tKey[iSort]
+    keys = dfKey['key'].values.astype(object)[iSort]
+    idKey = ('key-down_' + pd.Series(keys).astype(str)).values.astype(object)
+    tTriggers = tKey[keys=='5']
+
+    # sort image VASs by start time, and get their trial types (e.g. afraid_CS-100)
+    tVas = dfImageVas['tStart'].values.astype(float)
+    iSort = np.argsort(tVas,kind='mergesort')
+    tVas = tVas[iSort]
+    vasTrialTypes = (dfImageVas['type'].astype(str) + '_CS-' + dfImageVas['CSplusPercent'].astype(str)).values.astype(object)[iSort]
+    vasRatings = dfImageVas['rating'].values.astype(float)[iSort]
+
+    # get the end time of each run's last block
+    dfLastBlock = dfBlock.drop_duplicates('run',keep='last')
+    tRunEnds = dict(zip(dfLastBlock['run'].values,dfLastBlock['tEnd'].values.astype(float)))
+
     # create output directory
+    outFiles = []
     fileOutDir = os.path.join(outFolder,'sub-%05d'%subject,'func')
     if not os.path.exists(fileOutDir):
         os.makedirs(fileOutDir)
 
     for iRun,tWait in enumerate(tWaitForStarts):
         # get scan start and end time based on display
-        tStartScan = dfKey.loc[(dfKey.key=='5') & (dfKey.t>tWait),'t'].values[0]
-        tEndScan = dfBlock.loc[(dfBlock.run)==iRun+1,'tEnd'].values[-1]
-
-        # get events & info specifically in this scan
-        isInScan = (dfKey.t>tStartScan) & (dfKey.t<tEndScan)
-        dfKey_scan = dfKey[isInScan]
-        isInScan = (dfDisp.t>tStartScan) & (dfDisp.t<tEndScan)
-        dfDisp_scan = dfDisp[isInScan]
-        isInScan = (dfImageVas.tStart>tStartScan) & (dfImageVas.tStart<tEndScan)
-        dfImageVas_scan = dfImageVas[isInScan]
-        CSnum = dfImageVas_scan.CSplusPercent.values
-        blockType = dfImageVas_scan.type.values
-
-        # make dataframe for keypress events
-        dfEvents1 = pd.DataFrame(columns=colNames);
-        dfEvents1['onset'] = dfKey_scan.t-tStartScan
-        dfEvents1['identifier'] = ['key-down_%s'%x for x in dfKey_scan.key]
-        dfEvents1['duration'] = 0;
-        #dfEvents.loc[isImage,'trial_type'] = ['%s_CS%s'%(blockType[i],CSnum[i]) for i in range(len(CSnum))]
-
-        # make dataframe for display events
-        dfEvents2 = pd.DataFrame(columns=colNames);
-        dfEvents2['onset'] = dfDisp_scan.t-tStartScan
-        dfEvents2['duration'] = dfDisp_scan['duration']
-        dfEvents2['identifier'] = ['disp_%s'%x for x in dfDisp_scan.stim]
-        isImage = pd.notna(dfDisp_scan.CS)
-        isImageRating = dfDisp_scan.stim=='ImageRating0';
-        dfEvents2.loc[isImage,'trial_type'] = ['%s_CS-%s'%(blockType[i],CSnum[i]) for i in range(len(CSnum))]
-        dfEvents2.loc[isImageRating,'trial_type'] = ['%s_CS-%s'%(blockType[i],CSnum[i]) for i in range(len(CSnum))]
-        dfEvents2.loc[isImage,'stim_file'] = dfDisp_scan.loc[isImage,'stim']
-        dfEvents2.loc[isImageRating,'stim_file'] = dfDisp_scan.loc[isImage,'stim'].values
-        dfEvents2.loc[isImage,'identifier'] = 'disp_Face'
-        dfEvents2.loc[isImageRating,'identifier'] = 'disp_ImageRating'
-        dfEvents2.loc[isImageRating,'response'] = dfImageVas_scan.rating.values # rating final value
-        # dfEvents2.loc[isImageRating,'response_time'] = dfImageVas_scan.RT.values # rating final value
-
-        # combine dataframes
-        dfEvents = pd.concat((dfEvents1,dfEvents2))
-        # convert numbers to floats
-        dfEvents['onset'] = dfEvents['onset'].astype(float)
-        dfEvents['duration'] = dfEvents['duration'].astype(float)
-        dfEvents['response'] = dfEvents['response'].astype(float)
-        # sort events chronologically
-        dfEvents = dfEvents.sort_values('onset')
-        dfEvents = dfEvents.reset_index(drop=True)
+        tStartScan = tTriggers[np.searchsorted(tTriggers,tWait,side='right')]
+        tEndScan = tRunEnds[iRun+1]
+
+        # get the slice of each table that's in this scan (tStartScan < t < tEndScan)
+        def GetScanSlice(tSorted):
+            iFirst = np.searchsorted(tSorted,tStartScan,side='right')
+            if np.isnan(tEndScan):
+                return slice(iFirst,iFirst)
+            return slice(iFirst,max(iFirst,np.searchsorted(tSorted,tEndScan,side='left')))
+        keySlice,dispSlice,vasSlice = GetScanSlice(tKey),GetScanSlice(tDisp),GetScanSlice(tVas)
+        nKeys = keySlice.stop-keySlice.start
+        nEvents = nKeys + (dispSlice.stop-dispSlice.start)
+
+        # assemble keypress events followed by display events
+        onset = np.concatenate((tKey[keySlice],tDisp[dispSlice])) - tStartScan
+        duration = np.concatenate((np.zeros(nKeys),durDisp[dispSlice]))
+        identifier = np.concatenate((idKey[keySlice],idDisp[dispSlice]))
+        trialType = np.full(nEvents,np.nan,dtype=object)
+        stimFile = np.full(nEvents,np.nan,dtype=object)
+        response = np.full(nEvents,np.nan)
+        # fill in face and face rating info
+        isImage = np.concatenate((np.zeros(nKeys,dtype=bool),isImageDisp[dispSlice]))
+        isImageRating = np.concatenate((np.zeros(nKeys,dtype=bool),isImageRatingDisp[dispSlice]))
+        trialType[isImage] = vasTrialTypes[vasSlice]
+        trialType[isImageRating] = vasTrialTypes[vasSlice]
+        stimFile[isImage] = stimDisp[dispSlice][isImageDisp[dispSlice]]
+        stimFile[isImageRating] = stimFile[isImage]
+        response[isImageRating] = vasRatings[vasSlice] # rating final value
+
+        # sort events chronologically (with displays before keypresses at the same time)
+        isKeyEvent = np.arange(nEvents)<nKeys
+        iSort = np.lexsort((isKeyEvent,onset))
+        dfEvents = pd.DataFrame({'onset':onset[iSort],'duration':duration[iSort],'identifier':identifier[iSort],
+            'trial_type':trialType[iSort],'stim_file':stimFile[iSort],'response':response[iSort]},columns=colNames)
 
         # write to file
         if isTraining:
@@ -633,63 +736,72 @@ def WriteBidsEventsFiles(dfDisp,dfKey,dfImageVas,dfBlock,subject,outFolder='./',
             fileOut = os.path.join(fileOutDir,'sub-%05d_task-ER3_run-%d_events.tsv'%(subject,iRun+1))
         print('Writing BIDS-formatted events to %s...'%fileOut)
         dfEvents.to_csv(fileOut,index=False,sep='\t',float_format='%.3f',na_rep='n/a')
+        outFiles.append(fileOut)
         print('Done!')
 
+    return outFiles
+
 # Do everything: import the log, produce the figures, and produce the tables.
-def ProcessERLog(logFilename,outFolder,makeBids=False):
+# Returns the cross-subject table rows as a list of (tableName, dfSingleRow, logName) tuples, a list of all files written,
+# and figureResult (see below).
+# If appendTables is False, the rows are not added to the VAS store (so that parallel runs can add them in the main process).
+# If makeFigures is False, no figures are made. If figurePool is a multiprocessing Pool, figures are drawn in it (so this
+# function returns before they're saved) and any errors are printed. Their files are then left out of the list of files
+# written, and figureResult is the pool's AsyncResult: its get() returns the figure files once they're saved, or None
+# if saving them failed. Otherwise figureResult is None.
+def ProcessERLog(logFilename,outFolder,makeBids=False,appendTables=True,makeFigures=True,figurePool=None):
 
     # Get experiment type
     isTraining = ('Training' in logFilename) # is it a training run?
 
-    # import data
+    # import data (reading only the channels we'll use, and getting keys & displays from the event sidecar if there is one)
+    eventFile = GetEventSidecarFilename(logFilename)
+    isSidecarUsed = makeBids and EventSidecar is not None and os.path.exists(eventFile)
+    channels = ['params','vas']
     if makeBids:
-        readParams,dfMoodVas,dfSoundVas,dfImageVas,dfKey,dfDisp,dfSync,dfBlock = ImportExtinctionRecallTaskLog(logFilename)
-        WriteBidsEventsFiles(dfDisp,dfKey,dfImageVas,dfBlock,readParams['subject'],outFolder,isTraining)
+        channels = channels + ['blocks'] + ([] if isSidecarUsed else ['keys','displays'])
+    if isSidecarUsed:
+        print('Reading keys & displays from event sidecar %s...'%eventFile)
+        sidecarLog = ReadErEventSidecar(eventFile)
+        log = ReadErLog(logFilename,channels,dfKey=sidecarLog['dfKey'])
+        log.update(sidecarLog)
     else:
-        readParams,dfMoodVas,dfSoundVas,dfImageVas = ImportExtinctionRecallTaskLog_VasOnly(logFilename)
+        log = ReadErLog(logFilename,channels)
+    readParams,dfMoodVas,dfSoundVas,dfImageVas = log['params'],log['dfMoodVas'],log['dfSoundVas'],log['dfImageVas']
+    outFiles = []
+    if makeBids:
+        outFiles += WriteBidsEventsFiles(log['dfDisp'],log['dfKey'],dfImageVas,log['dfBlock'],readParams['subject'],outFolder,isTraining)
 
     # create output folder if it doesn't exist
     subjOutFolder = os.path.join(outFolder,'%d'%(readParams['subject']))
     if not os.path.exists(subjOutFolder):
         os.makedirs(subjOutFolder)
 
-    # declare cross-subject table filenames
+    # declare cross-subject table names
     if isTraining: # if it's a training run
-        outMoodTable = os.path.join(outFolder,'ER3Training-MoodVasTable.xlsx')
+        outMoodTable = 'ER3Training-MoodVasTable.xlsx'
         subjOutPrefix = os.path.join(subjOutFolder,'ER3Training_')
     else:
-        outMoodTable = os.path.join(outFolder,'ER3-MoodVasTable.xlsx')
-        outSoundTable = os.path.join(outFolder,'ER3-SoundVasTable.xlsx')
+        outMoodTable = 'ER3-MoodVasTable.xlsx'
+        outSoundTable = 'ER3-SoundVasTable.xlsx'
         subjOutPrefix = os.path.join(subjOutFolder,'ER3_')
 
     # make figures
-    SaveVasFigures(readParams,dfMoodVas,dfSoundVas,dfImageVas,subjOutPrefix)
-
-    # convert mood VAS to single line
-    dfMoodVas_singleRow = GetSingleVasLine(readParams,dfMoodVas,isTraining)
-    # Append output table to file
-    print("Appending to Mood VAS table %s..."%os.path.basename(outMoodTable))
-    if os.path.exists(outMoodTable):
-        dfMoodVas_all = pd.read_excel(outMoodTable,index_col=None)
-        dfMoodVas_all = dfMoodVas_all.append(dfMoodVas_singleRow)
-        dfMoodVas_all = dfMoodVas_all.drop_duplicates()
-        dfMoodVas_all.to_excel(outMoodTable,index=False)
-    else:
-        dfMoodVas_singleRow.to_excel(outMoodTable,index=False)
-
+    figureResult = None
+    if makeFigures and figurePool is None:
+        outFiles += SaveVasFigures(readParams,dfMoodVas,dfSoundVas,dfImageVas,subjOutPrefix)
+    elif makeFigures:
+        figureResult = figurePool.apply_async(SaveVasFigures_Worker,((readParams,dfMoodVas,dfSoundVas,dfImageVas,subjOutPrefix),))
+
+    # convert mood & sound VAS to single lines for the cross-subject tables
+    logName = os.path.basename(logFilename)
+    newTableRows = [(outMoodTable,GetSingleVasLine(readParams,dfMoodVas,isTraining),logName)]
     if not isTraining: # if it's not a training run
-        # convert sound VAS to single line
-        dfSoundVas_singleRow = GetSingleVasLine(readParams,dfSoundVas,isTraining,isSoundVas=True)
-        # Append output table to file
-        print("Appending to Sound VAS table %s..."%os.path.basename(outSoundTable))
-        if os.path.exists(outSoundTable):
-            dfSoundVas_all = pd.read_excel(outSoundTable,index_col=None)
-            dfSoundVas_all = dfSoundVas_all.append(dfSoundVas_singleRow)
-            dfSoundVas_all = dfSoundVas_all.drop_duplicates()
-            dfSoundVas_all.to_excel(outSoundTable,index=False)
-        else:
-            dfSoundVas_singleRow.to_excel(outSoundTable,index=False)
-
+        newTableRows.append((outSoundTable,GetSingleVasLine(readParams,dfSoundVas,isTraining,isSoundVas=True),logName))
+    outFiles.append(os.path.join(outFolder,vasStoreName))
+    # Add them to the cross-subject VAS store
+    if appendTables:
+        AppendToVasStore(outFolder,newTableRows)
 
     # Save Image VAS table (one per run)
     runs = dfImageVas.run.unique()
@@ -698,10 +810,218 @@ def ProcessERLog(logFilename,outFolder,makeBids=False):
         outImageTable = '%s%d-%d_run%d-ImageVasTable.xlsx'%(subjOutPrefix,readParams['subject'],readParams['session'],run)
         print("Saving Image VAS table %s..."%os.path.basename(outImageTable))
         dfImageVas_thisrun.to_excel(outImageTable,index=False)
+        outFiles.append(outImageTable)
 
     print('Done!')
 
+    return newTableRows, outFiles, figureResult
+
+
+# Open the cross-subject VAS store in outFolder, creating it if it doesn't exist.
+# A new store is seeded with the rows of any cross-subject Excel tables already in outFolder, so exports keep them.
+def OpenVasStore(outFolder):
+    if not os.path.exists(outFolder):
+        os.makedirs(outFolder)
+    storeFile = os.path.join(outFolder,vasStoreName)
+    isNew = not os.path.exists(storeFile)
+    db = sqlite3.connect(storeFile,timeout=60) # wait for other writers instead of failing
+    db.execute('CREATE TABLE IF NOT EXISTS vasRows (id INTEGER PRIMARY KEY AUTOINCREMENT, tableName TEXT, subject INTEGER, '
+        'session INTEGER, date TEXT, logName TEXT, columns TEXT, vals TEXT)')
+    if isNew:
+        for oldTable in sorted(glob(os.path.join(outFolder,'*VasTable.xlsx'))):
+            print('Adding rows from existing table %s to VAS store...'%os.path.basename(oldTable))
+            dfOld = pd.read_excel(oldTable,index_col=None)
+            InsertVasRows(db,os.path.basename(oldTable),dfOld,'')
+        db.commit()
+    return db
+
+
+# Insert each row of a VAS table into the store (without committing). Values are stored as JSON lists.
+def InsertVasRows(db,tableName,dfRows,logName):
+    columns = json.dumps(dfRows.columns.tolist())
+    for iRow in range(dfRows.shape[0]):
+        row = dfRows.iloc[iRow]
+        vals = json.dumps(row.tolist(),default=lambda x: x.item()) # .item() converts numpy scalars
+        db.execute('INSERT INTO vasRows (tableName,subject,session,date,logName,columns,vals) VALUES (?,?,?,?,?,?,?)',
+            (tableName,int(row['subject']),int(row['session']),str(row['date']),logName,columns,vals))
+
+
+# Append single-row VAS tables to the cross-subject VAS store. Rows are never changed or deleted:
+# if a session is processed again, its newest row is the one that gets exported.
+# tableRows is a list of (tableName, dfSingleRow, logName) tuples, as returned by ProcessERLog.
+def AppendToVasStore(outFolder,tableRows):
+    print("Adding %d rows to VAS store %s..."%(len(tableRows),vasStoreName))
+    db = OpenVasStore(outFolder)
+    try:
+        with db: # commit all rows together
+            for tableName,dfVas_singleRow,logName in tableRows:
+                InsertVasRows(db,tableName,dfVas_singleRow,logName)
+    finally:
+        db.close()
+
+
+# Write the current cross-subject Excel tables (e.g. ER3-MoodVasTable.xlsx) from the VAS store,
+# using the newest row for each subject, session, and date. Returns a list of the files written.
+def ExportVasTables(outFolder):
+    db = OpenVasStore(outFolder)
+    try:
+        allRows = db.execute('SELECT tableName,columns,vals FROM vasRows WHERE id IN '
+            '(SELECT MAX(id) FROM vasRows GROUP BY tableName,subject,session,date) ORDER BY tableName,subject,session,date').fetchall()
+    finally:
+        db.close()
+
+    # group rows by table
+    tableRows = {}
+    for tableName,columns,vals in allRows:
+        if tableName not in tableRows:
+            tableRows[tableName] = []
+        tableRows[tableName].append(pd.DataFrame([json.loads(vals)],columns=json.loads(columns)))
+
+    # write tables
+    outFiles = []
+    for tableName in sorted(tableRows.keys()):
+        outTable = os.path.join(outFolder,tableName)
+        print("Exporting %d rows to VAS table %s..."%(len(tableRows[tableName]),tableName))
+        pd.concat(tableRows[tableName],ignore_index=True).to_excel(outTable,index=False)
+        outFiles.append(outTable)
+    return outFiles
+
+
+# Draw VAS figures in a worker process (used by ProcessERLog's figurePool) without a display, printing any errors.
+# Returns a list of the files saved, or None if saving them failed.
+def SaveVasFigures_Worker(args):
+    params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix = args
+    plt.switch_backend('Agg') # draw figures without a display
+    try:
+        return SaveVasFigures(params,dfMoodVas,dfSoundVas,dfImageVas,outPrefix)
+    except Exception as e:
+        print('WARNING: saving VAS figures %s* failed: %s'%(outPrefix,e))
+
+
+# Process one log in a worker process (used by ProcessERLogs), leaving the VAS store alone.
+# Returns the log filename, ProcessERLog's outputs (None if it failed), and the error (None if it didn't fail).
+def ProcessERLog_Worker(args):
+    logFilename,outFolder,makeBids,makeFigures = args
+    plt.switch_backend('Agg') # draw figures without a display
+    try:
+        return logFilename, ProcessERLog(logFilename,outFolder,makeBids,appendTables=False,makeFigures=makeFigures), None
+    except Exception as e:
+        return logFilename, None, '%s: %s'%(type(e).__name__,e)
+
+
+# Get a hash of a file's contents (to tell whether a log has changed since it was processed).
+def GetFileHash(filename):
+    fileHash = hashlib.sha1()
+    with open(filename,'rb') as f:
+        for chunk in iter(lambda: f.read(1024*1024), b''):
+            fileHash.update(chunk)
+    return fileHash.hexdigest()
+
+
+# Load the manifest of processed logs from the output folder (or an empty one if it doesn't exist yet).
+def LoadManifest(outFolder):
+    manifestFile = os.path.join(outFolder,manifestName)
+    if os.path.exists(manifestFile):
+        with open(manifestFile) as f:
+            return json.load(f)
+    else:
+        return {}
+
+
+# Save the manifest of processed logs to the output folder (writing to a temporary file first so it's never half-written).
+def SaveManifest(manifest,outFolder):
+    if not os.path.exists(outFolder):
+        os.makedirs(outFolder)
+    manifestFile = os.path.join(outFolder,manifestName)
+    with open(manifestFile + '.tmp','w') as f:
+        json.dump(manifest,f,indent=1,sort_keys=True)
+    ReplaceFile(manifestFile + '.tmp',manifestFile)
+
+
+# Record that a log with the given hash was processed into the given output files.
+def AddToManifest(manifest,logFilename,logHash,makeBids,outFiles,outFolder,makeFigures=True):
+    manifest[os.path.basename(logFilename)] = {
+        'hash': logHash,
+        'parserVersion': parserVersion,
+        'makeBids': makeBids,
+        'makeFigures': makeFigures,
+        'outputs': sorted(set(os.path.relpath(outFile,outFolder) for outFile in outFiles))}
+
+
+# Check whether a log is unchanged since it was processed with this parser version and all its outputs still exist.
+def IsLogUpToDate(manifest,logFilename,logHash,makeBids,outFolder,makeFigures=True):
+    entry = manifest.get(os.path.basename(logFilename))
+    if entry is None or entry['hash']!=logHash or entry['parserVersion']!=parserVersion:
+        return False
+    if makeBids and not entry['makeBids']: # BIDS files weren't written last time
+        return False
+    if makeFigures and not entry.get('makeFigures',True): # figures weren't made last time
+        return False
+    return all(os.path.exists(os.path.join(outFolder,outFile)) for outFile in entry['outputs'])
+
+
+# Process many logs, in a pool of nJobs worker processes if nJobs>1.
+# If useCache is True, logs that haven't changed since they were last processed (according to the manifest in
+# outFolder) are skipped. If makeFigures is False, no figures are made (for quickly rebuilding tables).
+def ProcessERLogs(logFilenames,outFolder,makeBids=False,nJobs=1,useCache=True,makeFigures=True):
+
+    # Skip logs that are already up to date
+    manifest = LoadManifest(outFolder)
+    logHashes = {logFile:GetFileHash(logFile) for logFile in logFilenames}
+    if useCache:
+        newLogFilenames = [logFile for logFile in logFilenames if not IsLogUpToDate(manifest,logFile,logHashes[logFile],makeBids,outFolder,makeFigures)]
+        print('Skipping %d unchanged files.'%(len(logFilenames)-len(newLogFilenames)))
+        logFilenames = newLogFilenames
+
+    if nJobs>1:
+        # process logs in parallel, handling each one as soon as it's done (in whatever order they finish).
+        # (If one fails, it isn't recorded in the manifest, so it will be reprocessed next time.)
+        pool = multiprocessing.Pool(nJobs)
+        try:
+            for logFile,results,error in pool.imap_unordered(ProcessERLog_Worker,[(logFile,outFolder,makeBids,makeFigures) for logFile in logFilenames]):
+                if error is not None:
+                    print('WARNING: processing %s failed: %s'%(logFile,error))
+                    continue
+                # add its cross-subject table rows to the VAS store and record it as processed
+                tableRows,outFiles,_ = results
+                AppendToVasStore(outFolder,tableRows)
+                AddToManifest(manifest,logFile,logHashes[logFile],makeBids,outFiles,outFolder,makeFigures)
+                SaveManifest(manifest,outFolder)
+        finally:
+            pool.close()
+            pool.join()
 
+    else:
+        # process logs one at a time, recording each in the manifest as soon as it's done.
+        # Figures are drawn in a separate process while the next log is read, and a log is only recorded once its
+        # figures are saved. (If they fail or are interrupted, the log will be reprocessed next time.)
+        def RecordLog(logFile,outFiles,figureResult):
+            if figureResult is not None:
+                figFiles = figureResult.get() # wait for the figures to be saved
+                if figFiles is None:
+                    print('WARNING: figures for %s were not saved, so it was not recorded as processed.'%logFile)
+                    return
+                outFiles = outFiles + figFiles
+            AddToManifest(manifest,logFile,logHashes[logFile],makeBids,outFiles,outFolder,makeFigures)
+            SaveManifest(manifest,outFolder)
+
+        figurePool = multiprocessing.Pool(1) if makeFigures else None
+        pendingLog = None # (log filename, files written, figureResult) of the last log processed
+        try:
+            for logFile in logFilenames:
+                print('Found file %s...'%logFile)
+                tableRows,outFiles,figureResult = ProcessERLog(logFile,outFolder,makeBids,makeFigures=makeFigures,figurePool=figurePool)
+                # record the previous log (whose figures were drawn while this one was read)
+                if pendingLog is not None:
+                    RecordLog(*pendingLog)
+                pendingLog = (logFile,outFiles,figureResult)
+            if pendingLog is not None:
+                RecordLog(*pendingLog)
+        finally:
+            # wait for the figures to finish
+            if figurePool is not None:
+                figurePool.close()
+                figurePool.join()
 
 
 # %% === Set up argument parser ===
@@ -712,6 +1032,11 @@ parser.add_argument('--subjects', nargs='*', default='', help='SDAN numbers of s
 #parser.add_argument('--logFiles', nargs='*', default='', help='log filename')
 parser.add_argument('--isMac', action='store_true', help='use mac paths instead of PC')
 parser.add_argument('--makeBids', action='store_true', help='Write BIDS events files (slower)')
+parser.add_argument('--jobs', type=int, default=1, help='number of log files to process in parallel')
+parser.add_argument('--force', action='store_true', help='reprocess logs even if they are unchanged since they were last processed')
+parser.add_argument('--no-figures', dest='noFigures', action='store_true', help="don't make VAS figures (faster, for rebuilding tables)")
+parser.add_argument('--exportTables', action='store_true', help='write the cross-subject mood/sound VAS Excel tables from the VAS store')
+parser.add_argument('--checkSidecars', nargs='*', default=[], metavar='LOGFILE', help='check that these logs give the same tables when read with their event sidecars')
 
 
 # ==== Declare main command-line function ==== #
@@ -720,6 +1045,7 @@ if __name__ == '__main__':
 
     # parse inputs
     args = parser.parse_args();
+    plt.switch_backend('Agg') # draw figures without a display (so they can be made in worker processes)
     # Get paths to mood vas and sound tables
     if args.isMac:
         baseDir = '/Volumes/sdan1/Data/conditioning/ExtinctionRecall3/Data'
@@ -728,10 +1054,23 @@ if __name__ == '__main__':
 
     outFolder = os.path.join(baseDir,'Processed')
 
+    # find all files
+    allLogFiles = []
     for subj in args.subjects:
         logFiles = glob(os.path.join(baseDir,'Raw','ER3*_%s-*.log'%subj))
         print('Found %d files for subject %s.'%(len(logFiles),subj))
+        allLogFiles = allLogFiles + logFiles
+
+    # process new or changed files
+    ProcessERLogs(allLogFiles,outFolder,args.makeBids,args.jobs,useCache=not args.force,makeFigures=not args.noFigures)
+
+    # write Excel tables if requested
+    if args.exportTables:
+        ExportVasTables(outFolder)
 
-        for logFile in logFiles:
-            print('Found file %s...'%logFile)
-            ProcessERLog(logFile,outFolder,args.makeBids)
+    # compare event sidecar and text log tables if requested (exiting with an error if any differ)
+    if len(args.checkSidecars)>0:
+        nFailed = sum(len(CheckEventSidecar(logFile))>0 for logFile in args.checkSidecars)
+        print('Checked %d logs, %d failed.'%(len(args.checkSidecars),nFailed))
+        if nFailed>0:
+            raise SystemExit(1)
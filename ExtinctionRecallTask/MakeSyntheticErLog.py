@@ -0,0 +1,277 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+MakeSyntheticErLog.py
+
+Write realistic-looking Extinction Recall 3 log files (for testing and benchmarking ImportExtinctionRecallTaskLog.py)
+without running the task. Events follow the order used by ExtinctionRecallTask_PresetTiming.py, with face & rating
+times taken from a timing file in TimingFiles, scanner triggers every TR, and random button presses and ratings.
+
+With --sidecar, the keypresses, displays, port events and ratings are also written to an event sidecar (as
+EventSidecar.py does in the task), e.g. to check that ImportExtinctionRecallTaskLog.py reads it the same way as the log.
+
+Usage (from the ExtinctionRecallTask folder):
+  python MakeSyntheticErLog.py Logs/ER3_1-1_01-01-2019.log --runs 3 --keyRate 2 --timeoutFraction 0.1
+  python MakeSyntheticErLog.py Logs/ER3_1-1_01-01-2019.log --sidecar
+"""
+
+# Import packages
+import numpy as np    # for random numbers
+import pandas as pd   # for reading timing files
+import argparse       # for command-line arguments
+import os             # for handling paths
+try:
+    import EventSidecar   # for writing event sidecars (in GeneralTools)
+except ImportError:
+    EventSidecar = None
+
+# Write one PsychoPy-style log line
+def WriteLogLine(f,t,level,msg):
+    f.write('%.4f \t%s \t%s\n'%(t,level,msg))
+
+# Record the event the task would log in its event sidecar along with log message msg (if it logs one).
+# (Rating RTs come in a later line and aren't read from the sidecar, so they're left as NaN.)
+def LogSidecarEvent(t,msg):
+    if msg.startswith('Keypress: '):
+        EventSidecar.LogEvent('key',key=msg[10:],t=t)
+    elif msg.startswith('Display '):
+        EventSidecar.LogEvent('display',stim=msg[8:],t=t)
+    elif msg.startswith('set port '):
+        EventSidecar.LogEvent('port',code=int(msg.split()[-1]),t=t)
+    elif msg.startswith('RatingScale ') and 'rating=' in msg:
+        name = msg.split()[1][:-1]
+        rating = float(msg.split('=')[-1])
+        EventSidecar.LogEvent('rating',stim=name,value=rating,code=int('timed out' in msg),t=t)
+
+# Write the lines in a list of (t,level,msg) entries in chronological order, recording their events in the current
+# event sidecar if one is open. Returns the number of lines written.
+def WriteLogEntries(f,entries):
+    entries.sort(key=lambda entry: entry[0]) # stable, so entries with the same time stay in the order they were added
+    for t,level,msg in entries:
+        WriteLogLine(f,t,level,msg)
+        if EventSidecar is not None and EventSidecar.currentSidecar[0] is not None:
+            LogSidecarEvent(t,msg)
+    return len(entries)
+
+# Read the questions from a question file (lines starting with ?)
+def GetQuestionNames(questionFile):
+    with open(questionFile) as f:
+        return [line[1:].strip() for line in f if line.startswith('?')]
+
+# Add the log entries for one rating scale, starting at time tStart. Returns the time it ends.
+# If questionDur is inf, the scale ends when the subject locks in a response with selectKey; otherwise it ends (or times out) after questionDur.
+def AddRatingScale(entries,rng,name,tStart,keyRate,keys,questionDur=float('inf'),isTimedOut=False,selectKey=None):
+    # pick response time
+    if np.isinf(questionDur):
+        tEnd = tStart + rng.uniform(1.5,6.0)
+    else:
+        tEnd = tStart + questionDur
+    # add button presses (keys go up/down, last one locks in response)
+    nPresses = rng.poisson(keyRate*(tEnd-tStart))
+    tPresses = np.sort(rng.uniform(tStart,tEnd,nPresses))
+    for tPress in tPresses:
+        entries.append((tPress,'DATA','Keypress: %s'%keys[rng.randint(len(keys))]))
+    if selectKey is not None:
+        entries.append((tEnd,'DATA','Keypress: %s'%selectKey))
+    # add rating scale outputs
+    rating = rng.randint(0,101)
+    if isTimedOut:
+        entries.append((tEnd,'DATA','RatingScale %s: (timed out) rating=%g'%(name,rating)))
+    else:
+        RT = tEnd-tStart
+        history = [(50,0.0)] + [(rng.randint(0,101),round(tPress-tStart,3)) for tPress in tPresses[:3]] + [(rating,round(RT,3))]
+        entries.append((tEnd,'DATA','RatingScale %s: rating=%g'%(name,rating)))
+        entries.append((tEnd,'DATA','RatingScale %s: rating RT=%.3f'%(name,RT)))
+        entries.append((tEnd,'DATA','RatingScale %s: history=%s'%(name,history)))
+    return tEnd
+
+# Add the log entries for a set of mood VAS questions, starting at time t. Returns the time it ends.
+def AddMoodVas(entries,rng,questionFile,name,t,keyRate,params):
+    entries.append((t,'EXP','Display Instructions1'))
+    t += rng.uniform(1,3)
+    entries.append((t,'DATA','Keypress: %s'%params['questionSelectKey']))
+    entries.append((t,'EXP','set port %s to %d'%(format(params['portAddress'],'#04x'),params['codeVas'])))
+    for iQ in range(len(GetQuestionNames(questionFile))):
+        entries.append((t,'EXP','Display %s%d'%(name,iQ)))
+        t = AddRatingScale(entries,rng,'%s%d'%(name,iQ),t,keyRate,[params['questionUpKey'],params['questionDownKey']],selectKey=params['questionSelectKey'])
+        t += 1.0/60
+    return t
+
+# Add the log entries for one scanner run, starting at time t. Returns the time it ends.
+def AddRun(entries,rng,dfTiming,t,keyRate,timeoutFraction,params,allImages,allNames,TR=2.0):
+    portAddress = format(params['portAddress'],'#04x')
+    faceQuestions = GetQuestionNames(params['faceQuestionFile'])
+    # wait for scanner
+    entries.append((t,'EXP','Display WaitingForPrep'))
+    t += rng.uniform(5,20)
+    entries.append((t,'DATA','Keypress: %s'%params['preppedKey']))
+    entries.append((t,'EXP','Display WaitingForScanner'))
+    t += rng.uniform(2,10)
+    tScan = t
+    entries.append((t,'EXP','===== START RUN ====='))
+
+    # add events from timing file
+    iBlock = 0
+    iBlockType = 0
+    iImage = 0
+    tLast = tScan
+    for iEvent in range(dfTiming.shape[0]):
+        eventType = dfTiming.loc[iEvent,'event_type']
+        tEvent = tScan + dfTiming.loc[iEvent,'onset']/params['speedUp']
+        eventDur = dfTiming.loc[iEvent,'duration']/params['speedUp']
+        # add fixation if there's a gap
+        if tEvent > tLast + 0.01:
+            entries.append((tLast,'EXP','set port %s to 0'%portAddress))
+            entries.append((tLast,'EXP','Display Fixation'))
+        if iEvent==0:
+            entries.append((tEvent,'EXP','Display GetReady'))
+        elif iEvent==1:
+            entries.append((tEvent,'EXP','Display RestInstructions'))
+        elif eventType=='prompt':
+            # get block type from the following question
+            iBlockType = int(dfTiming.loc[min(iEvent+2,dfTiming.shape[0]-1),'event_type'][1])
+            if iBlock>0:
+                entries.append((tEvent,'EXP','=== END BLOCK %d, TYPE %d ==='%(iBlock,iBlockType)))
+            iBlock += 1
+            entries.append((tEvent,'EXP','=== START BLOCK %d, TYPE %d ==='%(iBlock,iBlockType)))
+            entries.append((tEvent,'EXP',"topMsg: text = 'In this block, when you see a face, answer:'"))
+            entries.append((tEvent,'EXP',"bottomMsg: text = '%s'"%faceQuestions[iBlockType].upper()))
+            entries.append((tEvent,'EXP','Display PreBlockPrompt%d'%iBlockType))
+        elif eventType.startswith('face'):
+            iImage = allNames.index('CSplus%d'%int(eventType[-3:]))
+            entries.append((tEvent,'EXP','set port %s to %d'%(portAddress,len(allNames)*iBlockType + iImage + 1)))
+            entries.append((tEvent,'EXP','Display %s %s'%(allImages[iImage],allNames[iImage])))
+        elif eventType.startswith('q'):
+            entries.append((tEvent,'EXP','set port %s to %d'%(portAddress,len(allNames)*(iBlockType+2) + iImage + 1)))
+            entries.append((tEvent,'EXP','Display ImageRating0'))
+            AddRatingScale(entries,rng,'ImageRating0',tEvent,keyRate,[params['questionUpKey'],params['questionDownKey']],
+                questionDur=eventDur,isTimedOut=(rng.rand()<timeoutFraction))
+        tLast = tEvent + eventDur
+
+    # cool down
+    entries.append((tLast,'EXP','=== END BLOCK %d TYPE %d ==='%(iBlock,iBlockType)))
+    entries.append((tLast,'EXP','set port %s to 0'%portAddress))
+    entries.append((tLast,'EXP','Display Fixation'))
+    tEnd = tLast + params['tCoolDown']/params['speedUp']
+    # add scanner triggers
+    for tTrigger in np.arange(tScan,tEnd,TR):
+        entries.append((tTrigger,'DATA','Keypress: %s'%params['triggerKey']))
+    entries.append((tEnd,'EXP','===== END RUN ====='))
+    return tEnd
+
+# Write a synthetic ER3 log with nRuns scanner runs (cycling through the 3 runs of the timing file).
+# keyRate is the mean number of button presses per second during rating scales, and timeoutFraction is the fraction
+# of image rating scales that time out. If writeSidecar is True, an event sidecar is written next to the log too.
+# Returns the number of lines written.
+def MakeSyntheticErLog(logFile,timingIter='0043',nRuns=3,keyRate=2.0,timeoutFraction=0.1,subject=1,session=1,version=1,
+                       timingFileDir='TimingFiles',seed=None,writeSidecar=False):
+
+    # Set up
+    rng = np.random.RandomState(seed)
+    dateStr = '01-01-2019'
+    params = {
+        'speedUp': 1.,
+        'tCoolDown': 20,
+        'tBreak': 60,
+        'timingFileDir': timingFileDir,
+        'preppedKey': 'y',
+        'triggerKey': '5',
+        'imageDir': 'Faces/',
+        'imageNames': ['R0_B100.jpg','R25_B75.jpg','R50_B50.jpg','R75_B25.jpg','R100_B0.jpg'],
+        'skipPrompts': False,
+        'faceQuestionFile': 'Questions/ERFaceRatingScales.txt',
+        'moodQuestionFile1': 'Questions/ERVas1RatingScales.txt',
+        'moodQuestionFile2': 'Questions/ERVasRatingScales.txt',
+        'moodQuestionFile3': 'Questions/ERVasRatingScales.txt',
+        'moodQuestionFile4': 'Questions/ERVas4RatingScales.txt',
+        'PostSoundCheckFile': 'Questions/PostSoundCheckFile.txt',
+        'questionDownKey': '4',
+        'questionUpKey':'2',
+        'questionSelectKey':'3',
+        'questionSelectAdvances': False,
+        'sendPortEvents': True,
+        'portAddress': 0xE050,
+        'codeBaseline': 31,
+        'codeVas': 32,
+        'screenColor':(120,120,120)}
+    # get image names as in task
+    allImages = [params['imageDir'] + name for name in params['imageNames']]
+    if version in [2,4,6,8]:
+        allNames = ['CSplus0','CSplus25','CSplus50','CSplus75','CSplus100']
+    else:
+        allNames = ['CSplus100','CSplus75','CSplus50','CSplus25','CSplus0']
+    # read timing files
+    dfTiming = [pd.read_csv(os.path.join(timingFileDir,'ER3.iter%s.run%d.events.txt'%(timingIter,i+1))) for i in range(3)]
+
+    nLines = 0
+    if writeSidecar:
+        EventSidecar.OpenEventSidecar(logFile + '.events.bin')
+    with open(logFile,'w') as f:
+        # log parameters
+        t = 5.0
+        entries = [(t,'INFO','---START PARAMETERS---'),
+                   (t,'INFO','filename: %s'%logFile),
+                   (t,'INFO','subject: %s'%subject),
+                   (t,'INFO','session: %s'%session),
+                   (t,'INFO','version: %s'%version),
+                   (t,'INFO','startAtRun: 1'),
+                   (t,'INFO','date: %s'%dateStr)]
+        for key in sorted(params.keys()):
+            entries.append((t,'INFO','%s: %s'%(key,params[key])))
+        entries.append((t,'INFO','---END PARAMETERS---'))
+        t += 1.0
+        entries.append((t,'EXP','---START EXPERIMENT---'))
+        # pre-task mood VAS
+        t = AddMoodVas(entries,rng,params['moodQuestionFile1'],'PreSoundCheck-',t,keyRate,params)
+        nLines += WriteLogEntries(f,entries)
+
+        for iRun in range(nRuns):
+            # sound check
+            entries = [(t,'EXP','Display Blank')]
+            t += 2.0
+            entries.append((t,'EXP','set port %s to %d'%(format(params['portAddress'],'#04x'),params['codeVas'])))
+            entries.append((t,'EXP','Display SoundCheck%d-0'%(iRun+1)))
+            t = AddRatingScale(entries,rng,'SoundCheck%d-0'%(iRun+1),t,keyRate,[params['questionUpKey'],params['questionDownKey']],selectKey=params['questionSelectKey'])
+            # run
+            t = AddRun(entries,rng,dfTiming[iRun%3],t,keyRate,timeoutFraction,params,allImages,allNames)
+            # post-run mood VAS
+            iQuestionFile = min(iRun+2,4)
+            t = AddMoodVas(entries,rng,params['moodQuestionFile%d'%iQuestionFile],'PostRun%d-'%(iRun+1),t,keyRate,params)
+            if iRun<nRuns-1:
+                entries.append((t,'EXP','Display BreakMsg'))
+                t += params['tBreak']
+            nLines += WriteLogEntries(f,entries)
+
+        # end
+        entries = [(t,'EXP','--- END EXPERIMENT ---'),(t+1.0,'EXP','Display TheEnd')]
+        nLines += WriteLogEntries(f,entries)
+    if writeSidecar:
+        EventSidecar.CloseEventSidecar()
+
+    return nLines
+
+
+# %% === Set up argument parser ===
+
+parser = argparse.ArgumentParser(description='Write a synthetic ExtinctionRecall3 log file for testing and benchmarking.')
+
+parser.add_argument('logFile', help='log filename to write (e.g. Logs/ER3_1-1_01-01-2019.log)')
+parser.add_argument('--timingIter', default='0043', help='iteration number of timing files in TimingFiles to use')
+parser.add_argument('--runs', type=int, default=3, help='number of scanner runs')
+parser.add_argument('--keyRate', type=float, default=2.0, help='mean button presses per second during rating scales')
+parser.add_argument('--timeoutFraction', type=float, default=0.1, help='fraction of image rating scales that time out')
+parser.add_argument('--subject', type=int, default=1, help='subject number')
+parser.add_argument('--session', type=int, default=1, help='session number')
+parser.add_argument('--seed', type=int, default=None, help='random seed')
+parser.add_argument('--sidecar', action='store_true', help='also write an event sidecar (needs GeneralTools on the python path)')
+
+
+# ==== Declare main command-line function ==== #
+
+if __name__ == '__main__':
+
+    # parse inputs
+    args = parser.parse_args();
+    nLines = MakeSyntheticErLog(args.logFile,args.timingIter,args.runs,args.keyRate,args.timeoutFraction,args.subject,args.session,seed=args.seed,
+                                writeSidecar=args.sidecar)
+    print('Wrote %d lines to %s.'%(nLines,args.logFile))
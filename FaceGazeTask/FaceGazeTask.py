@@ -24,6 +24,7 @@ import os # for file manipulation
 import math # for rounding
 #import AppKit # for monitor size detection (Mac only)
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import tNextFlip, SetUpFlipScheduler, AddToFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random # for randomization of trials
 import io # for reading files with specified newlines
 # EyeLink packages
@@ -171,9 +172,6 @@ thisExp = data.ExperimentHandler(name=scriptName, version='',
 # ===== SET UP STIMULI ===== #
 # ========================== #
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables)
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
@@ -182,6 +180,7 @@ if params['screenRes'] == 'auto':
     params['screenRes'] = (win.size[0],win.size[1])
 else:
     win = visual.Window(params['screenRes'], fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='pix', name='win',color=params['screenColor'])
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 
 # update screen resolution
 scnWidth = params['screenRes'][0]
@@ -369,18 +368,10 @@ else:
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-    
 # Wait until it's time to update the window, logging responses as we go
 def WaitForFlipTime():
     firstResp = ("","")
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         keyList = event.getKeys(params['respKeys']+['q','escape'],timeStamped=globalClock)
         # Check for escape characters
         for key in keyList:
@@ -589,7 +580,7 @@ for iTrial in range(params['nTrialsPerRun']):
     RunTrial(imageFile=params['imageDir'] + allNames[iImg],stimDur=stimDur[iImg],imageCond=conditions[iImg],tIti=tIti)
 
 # Wait until it's time to display
-while (globalClock.getTime()<tNextFlip[0]):
+while (globalClock.getTime()<GetFlipDeadline()):
     pass
 logging.log(level=logging.EXP,msg='===== END RUN %d/%d ====='%(expInfo['run'],params['nRunsPerSession']))
 
@@ -10,86 +10,28 @@
 # Updated 9/13/18 by DJ - added ignoreKeys parameter to RunPrompts function (for trigger keys)
 # Updated 10/11/18 by DJ - prevent RunPrompts from redrawing/logging every time an ignored key is pressed.
 
+# parsing & scoring functions (in a module that doesn't need psychopy), imported here so existing scripts can use them
+from QuestionTools import ParseQuestionFile, ParsePromptFile, GetOptionsText, ScoreQuestions
+# pre-built text stimuli for each page of prompts & questions
+from PromptPages import PreparePromptPages, PrepareQuestionPages, DrawPage
 from psychopy import core, event, logging#, visual
+import EventSidecar # for binary sidecar of task events
 import time
 
 
-# --- PARSE QUESTION FILE INTO QUESTIONS AND OPTIONS --- #
-def ParseQuestionFile(filename,optionsType=None): # optionsType 'Likert' returns the Likert scale for every question's options.
-    # initialize
-    questions_all = []
-    answers_all = []
-    options_all = []
-    if optionsType is None:
-        options_this = []
-    elif optionsType == 'Likert':
-        options_likert = ['Strongly agree','Agree','Neutral','Disagree','Strongly disagree']
-        options_this = options_likert
-        
-    # parse questions & answers
-    with open(filename) as f:
-        for line in f:
-            # remove the newline character at the end of the line
-            line = line.replace('\n','')
-            # replace any newline strings with newline characters
-            line = line.replace('\\n','\n')
-            # pass to proper output
-            if line.startswith("-"): # incorrect answer
-                options_this.append(line[1:]) # omit leading -
-            elif line.startswith("+"): # correct answer
-                options_this.append(line[1:]) # omit leading +
-                answers_all.append(len(options_this))
-            elif line.startswith("?"): # question
-                questions_all.append(line[1:]) # omit leading ?
-                # if it's not the first question, add the options to the list.
-                if options_this:
-                    options_all.append(options_this)
-                    if optionsType is None:
-                        options_this = [] #reset
-                    elif optionsType == 'Likert':
-                        options_this = options_likert
-                        
-    # make sure last set of options is included
-    options_all.append(options_this) 
-    # return results
-    return (questions_all,options_all,answers_all)
-
-# --- PARSE PROMPT FILE INTO TOP AND BOTTOM PROMPTS --- #
-# Each top prompt should be preceded by a +. Each bottom prompt should be preceded by a -. Everything else will be ignored.
-def ParsePromptFile(filename): 
-    # initialize
-    topPrompts = []
-    bottomPrompts = []
-        
-    # parse questions & answers
-    with open(filename) as f:
-        for line in f:
-            # remove the newline character at the end of the line
-            line = line.replace('\n','')
-            # replace any newline strings with newline characters
-            line = line.replace('\\n','\n')
-            # pass to proper output
-            if line.startswith("-"): # bottom prompt
-                bottomPrompts.append(line[1:]) # omit leading -
-            elif line.startswith("+"): # top prompt
-                topPrompts.append(line[1:]) # omit leading +
-                # if it's not the first question, add the options to the list.
-                        
-    # return results
-    return (topPrompts,bottomPrompts)
-
 # Display prompts and let the subject page through them one by one.
-def RunPrompts(topPrompts,bottomPrompts,win,message1,message2,backKey='backspace',backPrompt=0,name='Instructions',ignoreKeys=[]):
+# pages is the output of PreparePromptPages (if None, it's made here before the first prompt is shown).
+# message1 and message2 only set the pages' look: their text isn't changed (they don't end up showing the last page).
+def RunPrompts(topPrompts,bottomPrompts,win,message1,message2,backKey='backspace',backPrompt=0,name='Instructions',ignoreKeys=[],pages=None):
+    if pages is None:
+        pages = PreparePromptPages(topPrompts,bottomPrompts,win,message1,message2)
     iPrompt = 0
     redraw = True # redraw a new prompt?
     while iPrompt < len(topPrompts):
         if redraw:
-            message1.setText(topPrompts[iPrompt])
-            message2.setText(bottomPrompts[iPrompt])
             #display instructions and wait
-            message1.draw()
-            message2.draw()
-            win.logOnFlip(level=logging.EXP, msg='Display %s%d'%(name,iPrompt+1))
+            DrawPage(pages[iPrompt])
+            EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display %s%d'%(name,iPrompt+1))
             win.flip()
         #check for a keypress
         thisKey = event.waitKeys()
@@ -107,32 +49,25 @@ def RunPrompts(topPrompts,bottomPrompts,win,message1,message2,backKey='backspace
 
 
 # Display questions and let user select each one's answer with a single keypress.
-def RunQuestions(question_list,options_list,win,message1,message2, name='Question', questionDur=float('inf'), isEndedByKeypress=True,respKeys=['1','2','3','4']):
+# pages is the output of PrepareQuestionPages (if None, it's made here before the first question is shown).
+# message1 and message2 only set the pages' look: their text isn't changed (they don't end up showing the last page).
+def RunQuestions(question_list,options_list,win,message1,message2, name='Question', questionDur=float('inf'), isEndedByKeypress=True,respKeys=['1','2','3','4'],pages=None):
     # set up
+    if pages is None:
+        pages = PrepareQuestionPages(question_list,options_list,win,message1,message2)
     nQuestions = len(question_list)
     allKeys = ['']*nQuestions
     trialClock = core.Clock()
     iQ = 0
     while iQ < nQuestions:
         print('iQ = %d/%d'%(iQ+1,nQuestions))
-        # get response lists
-        respText = "" # to be displayed to subject
-#        respKeys = [] # allowable responses
-        for iResp in range(0,len(options_list[iQ])):
-            respText += '%d) %s\n'%((iResp+1),options_list[iQ][iResp])
-#            respKeys += str(iResp+1)
-        # set text
-        message1.setText(question_list[iQ])
-        message2.setText(respText)
-        
         # draw question & answers
-        message1.draw()
-        message2.draw()
+        DrawPage(pages[iQ])
         
         #Flush the key buffer and mouse movements
         event.clearEvents()
         #Put the image on the screen
-        win.logOnFlip(level=logging.EXP, msg='Display %s%d'%(name,iQ));
+        EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display %s%d'%(name,iQ));
         win.flip()
         #Reset our clock to zero  - I think this call should take less time than window.flip, so resetting after the flip should be slightly more accurate.
         trialClock.reset()
@@ -197,7 +132,7 @@ def RunQuestions_Move(question_list,options_list, win, name='Question', question
         # Flush the key buffer and mouse movements
         event.clearEvents()
         # Put the image on the screen
-        win.logOnFlip(level=logging.EXP, msg='Display %s%d'%(name,iQ));
+        EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display %s%d'%(name,iQ));
         win.flip()
         # Reset our clock to zero  - I think this call should take less time than window.flip, so resetting after the flip should be slightly more accurate.
         trialClock.reset()
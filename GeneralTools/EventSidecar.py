@@ -0,0 +1,199 @@
+#!/usr/bin/env python2
+"""Write a binary file of typed task events alongside the PsychoPy log, so they can be loaded without text parsing."""
+# EventSidecar.py
+#
+# A task opens a sidecar with OpenEventSidecar (usually right after logging.LogFile), and the shared task tools then
+# record displays (LogOnFlip), keypresses (LogKeysFromWindow), port codes, ratings and run/block markers (LogEvent)
+# in it as well as in the text log. If no sidecar is open, these calls just do the usual text logging.
+#
+# Events are kept in a buffer and written in blocks, as fixed-size records of type eventDtype with no header, so a
+# sidecar can be memory-mapped with ReadEventSidecar (np.memmap) and turned into a table with EventsToDataFrame.
+#
+# RatingScales.ShowVAS also records where each rating scale's marker was on every frame. If a trajectory file is open
+# (OpenTrajectoryFile), each question's frames are appended to it as a header (trajectoryHeaderDtype) followed by that
+# many frame records (trajectoryDtype). Each header holds the question's number in the file and its start time, since
+# a task can show many questions with the same name (e.g. every ER3 image rating is 'ImageRating0'), and
+# ReadTrajectoryFile loads them back as a list in the order they were shown.
+#
+# Created 10/18/26 by DJ.
+
+import numpy as np # for event records
+import atexit      # for writing buffered events when the task quits
+
+# Record format. t is the time on PsychoPy's logging clock (the same as in the text log). code is the port code,
+# rating-scale timeout flag (1 if timed out), or marker number (-1 if unused). value and rt hold rating-scale results.
+# key and stim are utf-8 text, cut to fit their fields; stimLength is the length of the whole stim text (in bytes), so
+# a stim that was cut short has stimLength > len(stim).
+eventDtype = np.dtype([('t','<f8'),('type','u1'),('code','<i4'),('value','<f8'),('rt','<f8'),('key','S16'),('stim','S96'),
+                       ('stimLength','<u2')])
+# Numbers stored in the type field
+eventTypes = {'display':1, 'key':2, 'port':3, 'rating':4, 'marker':5}
+
+# Sidecar that events are currently written to (a dict from OpenEventSidecar, or None)
+currentSidecar = [None]
+
+# Rating-scale trajectory format: one record per frame. t is the flip time on PsychoPy's logging clock, value is the
+# marker position, and keyState is 1 if the up key was held, -1 if the down key was held, and 0 otherwise.
+trajectoryDtype = np.dtype([('t','<f8'),('value','<f4'),('keyState','i1')])
+# Header written before each question's frames: its number in the file (counting from 0), rating scale name, the time
+# of its first frame (on the logging clock), and its number of frames
+trajectoryHeaderDtype = np.dtype([('index','<u4'),('name','S32'),('tStart','<f8'),('nFrames','<u4')])
+# File that trajectories are currently written to (or None), and the number of trajectories written to it
+currentTrajectoryFile = [None]
+nTrajectoriesWritten = [0]
+
+
+# --- WRITING --- #
+
+# Open a sidecar file for writing and make it the current one. Events are written every bufferSize events.
+def OpenEventSidecar(filename,bufferSize=256):
+    CloseEventSidecar() # finish any sidecar that's already open
+    sidecar = {'file': open(filename,'wb'), 'buffer': np.zeros(bufferSize,dtype=eventDtype), 'nBuffered': 0}
+    currentSidecar[0] = sidecar
+    return sidecar
+
+# Write any buffered events to the current sidecar file.
+def FlushEventSidecar():
+    sidecar = currentSidecar[0]
+    if sidecar is None or sidecar['nBuffered']==0:
+        return
+    sidecar['file'].write(sidecar['buffer'][:sidecar['nBuffered']].tobytes())
+    sidecar['file'].flush()
+    sidecar['nBuffered'] = 0
+
+# Write any buffered events and close the current sidecar file.
+def CloseEventSidecar():
+    sidecar = currentSidecar[0]
+    if sidecar is None:
+        return
+    FlushEventSidecar()
+    sidecar['file'].close()
+    currentSidecar[0] = None
+
+# make sure buffered events are written even if the task quits with core.quit()
+atexit.register(CloseEventSidecar)
+
+# Open a file for writing rating-scale trajectories and make it the current one.
+def OpenTrajectoryFile(filename):
+    CloseTrajectoryFile() # finish any file that's already open
+    currentTrajectoryFile[0] = open(filename,'wb')
+    nTrajectoriesWritten[0] = 0
+
+# Close the current trajectory file.
+def CloseTrajectoryFile():
+    if currentTrajectoryFile[0] is not None:
+        currentTrajectoryFile[0].close()
+        currentTrajectoryFile[0] = None
+
+atexit.register(CloseTrajectoryFile)
+
+# Append the trajectory of rating scale name (an array of trajectoryDtype records) to the current trajectory file,
+# if one is open. tStart is the time the question was shown (if None, the time of its first frame).
+def WriteTrajectory(name,frames,tStart=None):
+    trajFile = currentTrajectoryFile[0]
+    if trajFile is None:
+        return
+    frames = np.asarray(frames,dtype=trajectoryDtype)
+    if tStart is None:
+        tStart = frames['t'][0] if len(frames)>0 else np.nan
+    header = np.array([(nTrajectoriesWritten[0],name.encode('utf-8')[:32],tStart,len(frames))],dtype=trajectoryHeaderDtype)
+    trajFile.write(header.tobytes())
+    trajFile.write(frames.tobytes())
+    trajFile.flush()
+    nTrajectoriesWritten[0] += 1
+
+# Encode text as utf-8 bytes, cut to at most maxBytes without splitting a character. Text that's already bytes (e.g.
+# a python 2 str) is assumed to be utf-8. Returns the encoded text and the length of the whole text in bytes.
+def EncodeText(text,maxBytes):
+    if not isinstance(text,bytes):
+        text = text.encode('utf-8')
+    if len(text)<=maxBytes:
+        return text, len(text)
+    return text[:maxBytes].decode('utf-8','ignore').encode('utf-8'), len(text)
+
+# Get the current time on PsychoPy's logging clock.
+def GetLogTime():
+    from psychopy import logging # imported here so reading sidecars doesn't need psychopy
+    return logging.defaultClock.getTime()
+
+# Record an event of type eventType (a key of eventTypes) in the current sidecar, if one is open.
+# If t is None, the current time on the logging clock is used.
+def LogEvent(eventType,stim='',key='',code=-1,value=np.nan,rt=np.nan,t=None):
+    sidecar = currentSidecar[0]
+    if sidecar is None:
+        return
+    if t is None:
+        t = GetLogTime()
+    value = np.nan if value is None else value # e.g. a rating scale's RT when there's no response
+    rt = np.nan if rt is None else rt
+    key,_ = EncodeText(key,eventDtype['key'].itemsize)
+    stim,stimLength = EncodeText(stim,eventDtype['stim'].itemsize)
+    sidecar['buffer'][sidecar['nBuffered']] = (t,eventTypes[eventType],code,value,rt,key,stim,min(stimLength,0xFFFF))
+    sidecar['nBuffered'] += 1
+    if sidecar['nBuffered']==len(sidecar['buffer']):
+        FlushEventSidecar()
+
+# Log a message in the text log when the window next flips (like win.logOnFlip), and if it's a 'Display <stim>'
+# message, record a display event at the flip time in the current sidecar.
+def LogOnFlip(win,msg,level=None):
+    from psychopy import logging
+    if level is None:
+        level = logging.EXP
+    win.logOnFlip(level=level,msg=msg)
+    if currentSidecar[0] is not None and msg.startswith('Display '):
+        # get the flip time on the logging clock (the time logOnFlip uses). Functions are called on flip in the order
+        # they were added, so it's set before the event is recorded.
+        flipTime = {}
+        win.timeOnFlip(flipTime,'t')
+        win.callOnFlip(lambda: LogEvent('display',stim=msg[8:],t=flipTime['t']))
+
+# Record every key pressed in window win as a key event in the current sidecar (using PsychoPy's key names).
+def LogKeysFromWindow(win):
+    from pyglet.window import key
+    def OnKeyPress(symbol,modifiers):
+        keyName = key.symbol_string(symbol).lower()
+        if keyName.startswith('_'): # number keys
+            keyName = keyName[1:]
+        LogEvent('key',key=keyName)
+    win.winHandle.push_handlers(on_key_press=OnKeyPress)
+
+
+# --- READING --- #
+
+# Load the events in a sidecar file as a memory-mapped array of records (see eventDtype).
+def ReadEventSidecar(filename):
+    import os
+    if os.path.getsize(filename)==0: # np.memmap can't map an empty file
+        return np.zeros(0,dtype=eventDtype)
+    return np.memmap(filename,dtype=eventDtype,mode='r')
+
+# Load the rating-scale trajectories in a trajectory file, in the order they were written, as a list of dicts with keys
+# 'index', 'name', 'tStart' (from each header) and 'frames' (an array of trajectoryDtype records).
+def ReadTrajectoryFile(filename):
+    trajectories = []
+    with open(filename,'rb') as f:
+        while True:
+            header = np.fromfile(f,dtype=trajectoryHeaderDtype,count=1)
+            if len(header)==0:
+                break
+            trajectories.append({'index': int(header['index'][0]),
+                                 'name': header['name'][0].decode('utf-8'),
+                                 'tStart': float(header['tStart'][0]),
+                                 'frames': np.fromfile(f,dtype=trajectoryDtype,count=int(header['nFrames'][0]))})
+    return trajectories
+
+# Convert an array of event records to a DataFrame, with type names and text instead of codes and bytes.
+def EventsToDataFrame(events):
+    import pandas as pd
+    typeNames = np.empty(max(eventTypes.values())+1,dtype=object)
+    for name,number in eventTypes.items():
+        typeNames[number] = name
+    return pd.DataFrame({'t': np.array(events['t']),
+                         'type': typeNames[events['type']],
+                         'code': np.array(events['code']),
+                         'value': np.array(events['value']),
+                         'rt': np.array(events['rt']),
+                         'key': np.char.decode(events['key'],'utf-8').astype(object),
+                         'stim': np.char.decode(events['stim'],'utf-8').astype(object),
+                         'stimLength': np.array(events['stimLength'])},
+                        columns=['t','type','code','value','rt','key','stim','stimLength'])
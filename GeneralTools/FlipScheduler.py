@@ -0,0 +1,74 @@
+#!/usr/bin/env python2
+"""Schedule window flips on the screen refresh nearest each onset, for the tasks' tNextFlip timing."""
+# FlipScheduler.py
+#
+# Our tasks keep the time of the next display in tNextFlip[0], add each event's duration to it with AddToFlipTime,
+# and wait until the clock passes it before flipping the window. But a flip only shows up on the next screen refresh,
+# so each display appeared up to a whole frame after its onset.
+#
+# This module holds one copy of those helpers. Once SetUpFlipScheduler(win,clock) has been called, GetFlipDeadline
+# returns the time to stop waiting so that the flip lands on the refresh nearest tNextFlip[0] (half a frame before
+# it), i.e. each onset is rounded to a whole number of the window's measured frame periods. tNextFlip[0] itself keeps
+# the exact onset, so the rounding of one display (never more than half a frame) is taken out of the next duration
+# instead of adding up over a run.
+#
+# Scripts import tNextFlip, AddToFlipTime, SetFlipTime, SetFlipTimeToNow and WaitForFlipTime from here instead of
+# defining them, and wait with 'while (globalClock.getTime()<GetFlipDeadline()):' where they check for keys while
+# waiting. Loops that flip the window on every pass while waiting (e.g. to keep a slider moving) use
+# GetFlippingLoopDeadline or FlipUntilFlipTime instead, since each of their flips takes up to a frame.
+#
+# Created 10/18/26 based on ExtinctionRecallTask/ExtinctionRecallTask_PresetTiming.py
+
+# Time of the next flip on the scheduler's clock (in a list so scripts that import it share the same value)
+tNextFlip = [0.0]
+# Window and clock being scheduled, the window's frame period (s), and the factor durations are divided by
+flipScheduler = {'win': None, 'clock': None, 'framePeriod': None, 'speedUp': 1.0}
+
+
+# Set up the scheduler for window win, with onsets measured on clock (usually the script's globalClock).
+# Durations passed to AddToFlipTime are divided by speedUp (e.g. to run a task faster for testing).
+def SetUpFlipScheduler(win,clock,speedUp=1.0):
+    flipScheduler['win'] = win
+    flipScheduler['clock'] = clock
+    flipScheduler['framePeriod'] = win.monitorFramePeriod # measured when the window was opened (0 or None if unknown)
+    flipScheduler['speedUp'] = speedUp
+
+# increment time of next window flip
+def AddToFlipTime(tIncrement=1.0):
+    tNextFlip[0] += tIncrement/flipScheduler['speedUp']
+
+# set time of next window flip to t (on the scheduler's clock), e.g. the start of the session
+def SetFlipTime(t):
+    tNextFlip[0] = t
+
+# flip window as soon as possible
+def SetFlipTimeToNow():
+    tNextFlip[0] = flipScheduler['clock'].getTime()
+
+# Get the time to stop waiting and flip the window, so the flip lands on the refresh nearest tNextFlip[0].
+# (If the frame period isn't known, this is tNextFlip[0] itself, and the flip lands on the first refresh after it.)
+def GetFlipDeadline():
+    framePeriod = flipScheduler['framePeriod']
+    if not framePeriod:
+        return tNextFlip[0]
+    return tNextFlip[0] - 0.5*framePeriod
+
+# Wait until it's time to flip the window.
+def WaitForFlipTime():
+    tDeadline = GetFlipDeadline()
+    while (flipScheduler['clock'].getTime()<tDeadline):
+        pass
+
+# Get the time to stop a wait loop that flips the window on every pass. The loop's last flip lands on the refresh after
+# the check, so it stops a frame before GetFlipDeadline, and the flip after the loop lands on the refresh nearest
+# tNextFlip[0].
+def GetFlippingLoopDeadline():
+    framePeriod = flipScheduler['framePeriod']
+    if not framePeriod:
+        return tNextFlip[0]
+    return GetFlipDeadline() - framePeriod
+
+# Keep calling flipFunc (a function that flips the window) until it's time to flip the window for the next display.
+def FlipUntilFlipTime(flipFunc):
+    while (flipScheduler['clock'].getTime()<GetFlippingLoopDeadline()):
+        flipFunc()
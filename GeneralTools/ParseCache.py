@@ -0,0 +1,93 @@
+#!/usr/bin/env python2
+"""Cache the results of parsing question & prompt files, so repeat launches don't have to parse them again."""
+# ParseCache.py
+#
+# GetCachedParse(parseFunc,filename,...) returns parseFunc(filename,...), but saves the result (pickled) in a
+# __parsecache__ folder next to the file, keyed by the file's path, modification time and size. Later calls with the
+# same inputs - in this session or a later one - load the result instead of parsing the file, until the file changes.
+# If the cache can't be written (e.g. a read-only folder), results are still kept in memory for this session.
+#
+# Created 10/18/26 by DJ.
+
+import os      # for file info & paths
+import pickle  # for storing parsed results compactly
+import copy    # so callers can't change the cached results
+import sys     # for the python version
+
+# Increment this when a change to the parsing functions should make cached results be ignored.
+cacheVersion = 1
+# Pickle protocol for cache files (2 is the newest python 2 can read)
+pickleProtocol = 2
+# Name of the folder (next to each parsed file) that holds its cache file
+cacheFolderName = '__parsecache__'
+# Results parsed or loaded so far in this session
+memoryCache = {}
+
+
+# Get the filename of the cache file for a parsed file. Python 2 and 3 get separate cache files, since they can parse
+# the same file differently (e.g. python 3 reads '\r\n' line endings as '\n') and don't pickle strings the same way.
+def GetCacheFilename(filename):
+    folder,name = os.path.split(os.path.abspath(filename))
+    return os.path.join(folder,cacheFolderName,'%s.py%d.pickle'%(name,sys.version_info[0]))
+
+# Get the key identifying a version of a file: its path, modification time, and size.
+def GetFileKey(filename):
+    fileStat = os.stat(filename)
+    return (os.path.abspath(filename),fileStat.st_mtime,fileStat.st_size,cacheVersion)
+
+# Load the cache file for a parsed file: a dict with keys 'fileKey' and 'results' (or None if it's missing or stale).
+def LoadCacheFile(filename,fileKey):
+    try:
+        with open(GetCacheFilename(filename),'rb') as f:
+            cache = pickle.load(f)
+    except (IOError,OSError,EnvironmentError,ValueError,EOFError,pickle.UnpicklingError,AttributeError,ImportError):
+        return None # missing, unreadable, or written in a format this python can't read
+    if cache.get('fileKey')!=fileKey:
+        return None
+    return cache
+
+# Replace file dst with file src (os.replace isn't in python 2, where os.rename can't overwrite a file on Windows).
+def ReplaceFile(src,dst):
+    if hasattr(os,'replace'):
+        os.replace(src,dst)
+    else:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src,dst)
+
+# Save the cache file for a parsed file (writing to a temporary file first so it's never half-written).
+def SaveCacheFile(filename,cache):
+    cacheFile = GetCacheFilename(filename)
+    try:
+        if not os.path.exists(os.path.dirname(cacheFile)):
+            os.makedirs(os.path.dirname(cacheFile))
+        with open(cacheFile + '.tmp','wb') as f:
+            pickle.dump(cache,f,protocol=pickleProtocol)
+        ReplaceFile(cacheFile + '.tmp',cacheFile)
+    except (IOError,OSError,EnvironmentError,ValueError):
+        pass # can't write here, so just keep the result in memory
+
+# Return parseFunc(filename,*args), from the cache if the file hasn't changed since it was last parsed with these inputs.
+# The result is a copy, so the caller can modify it without changing the cached version.
+def GetCachedParse(parseFunc,filename,*args):
+    fileKey = GetFileKey(filename)
+    resultKey = (parseFunc.__module__,parseFunc.__name__) + args
+
+    # check this session's results
+    if (fileKey,resultKey) in memoryCache:
+        return copy.deepcopy(memoryCache[(fileKey,resultKey)])
+
+    # check cache file
+    cache = LoadCacheFile(filename,fileKey)
+    if cache is None:
+        cache = {'fileKey':fileKey, 'results':{}}
+    if resultKey in cache['results']:
+        result = cache['results'][resultKey]
+    else:
+        # parse the file and save the result
+        result = parseFunc(filename,*args)
+        cache['results'][resultKey] = result
+        SaveCacheFile(filename,cache)
+
+    memoryCache[(fileKey,resultKey)] = result
+    return copy.deepcopy(result)
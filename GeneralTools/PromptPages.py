@@ -0,0 +1,51 @@
+#!/usr/bin/env python2
+"""Build the text stimuli for every page of a prompt or question sequence before it's shown."""
+# PromptPages.py
+#
+# RunPrompts and RunQuestions (in PromptTools.py and BasicPromptTools.py) used to call setText on the same two text
+# stimuli every time a page was shown, so the text was laid out again while the subject waited (even when paging back).
+# PreparePromptPages and PrepareQuestionPages make a pair of text stimuli for each page up front, copying the look of
+# the script's message1 and message2, so showing any page is just a draw and a flip.
+#
+# The Run functions call these if they aren't given pages, but a script can call them earlier (e.g. while a fixation
+# cross is up before the prompts) and pass the result in as pages=..., so the layout is done before the sequence starts.
+# (The stimuli are built in the main thread, since PsychoPy's OpenGL calls can't be made from another thread.)
+#
+# message1 and message2 are only used as templates for the pages' look, so their text is no longer changed: after
+# RunPrompts or RunQuestions, they still show whatever text they had before (not the last page's text). A script that
+# draws them afterwards should set their text first.
+#
+# Created 10/18/26 based on GeneralTools/BasicPromptTools.py
+
+from QuestionTools import GetOptionsText # for the text listing each question's options
+
+# Properties copied from the template text stimulus to each page's stimulus (if the template has them)
+textStimProps = ['font','pos','color','colorSpace','opacity','contrast','units','ori','height','antialias',
+                 'bold','italic','alignHoriz','alignVert','wrapWidth','flipHoriz','flipVert']
+
+# Make a new text stimulus in window win that looks like textStim but shows the given text.
+def CopyTextStim(win,textStim,text,name):
+    from psychopy import visual # imported here so it doesn't interfere with the parent script's GUI
+    props = {}
+    for prop in textStimProps:
+        if hasattr(textStim,prop):
+            props[prop] = getattr(textStim,prop)
+    return visual.TextStim(win,text=text,name=name,autoLog=False,**props)
+
+# Make a (top, bottom) pair of text stimuli for each page of prompts, styled like message1 and message2.
+def PreparePromptPages(topPrompts,bottomPrompts,win,message1,message2):
+    pages = []
+    for iPrompt in range(0,len(topPrompts)):
+        pages.append((CopyTextStim(win,message1,topPrompts[iPrompt],'%s%d'%(message1.name,iPrompt+1)),
+                      CopyTextStim(win,message2,bottomPrompts[iPrompt],'%s%d'%(message2.name,iPrompt+1))))
+    return pages
+
+# Make a (question, options) pair of text stimuli for each question, styled like message1 and message2.
+def PrepareQuestionPages(question_list,options_list,win,message1,message2):
+    return PreparePromptPages(question_list,[GetOptionsText(options) for options in options_list[:len(question_list)]],
+                              win,message1,message2)
+
+# Draw a page's stimuli (to be shown on the next flip).
+def DrawPage(page):
+    for stim in page:
+        stim.draw()
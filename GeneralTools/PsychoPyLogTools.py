@@ -0,0 +1,289 @@
+#!/usr/bin/env python2
+"""Parse the log files written by PsychoPy tasks into tables of events."""
+# PsychoPyLogTools.py
+#
+# Each line of a PsychoPy log (from logging.LogFile) reads '<time> \t<LEVEL> \t<message>'. ParsePsychoPyLog looks up
+# the first word of each message in a table of handlers and calls the one it finds, which adds a row to one of the
+# event tables. The default handlers cover the messages our tasks share (Display, Keypress:, set port, RatingScale,
+# START/END markers, eyetracker events), so FaceGaze, Distraction, Tapping, SART and ER3 logs can all be read the same
+# way. Tasks with their own messages can add handlers (see AddHandler).
+#
+# ReadLogParams reads just the parameters block, and caches it in a sidecar file next to the log so later calls (and
+# cross-session queries like FindLogsWithParams(logFiles,'speedUp != 1')) don't have to read the log again.
+#
+# Created 10/18/26 based on ExtinctionRecallTask/ImportExtinctionRecallTaskLog.py
+
+import numpy as np   # for typed columns
+import pandas as pd  # for tables
+import ast           # for parameter parsing
+import re            # for marker numbers
+import os            # for sidecar files
+import hashlib       # for telling whether a log has changed
+import json          # for parameter sidecar files
+import io            # for reading logs as utf-8 in python 2 and 3
+import argparse      # for command-line arguments
+
+
+# --- EVENT TABLES --- #
+
+# Make an empty event table: a dict with the type of each column and a list buffer for each column's values.
+# columns is a list of (name, dtype) tuples, e.g. [('t',float),('key',object)].
+def NewEventTable(columns):
+    return {'dtypes': [dtype for name,dtype in columns],
+            'names': [name for name,dtype in columns],
+            'cols': [[] for name,dtype in columns]}
+
+# Add a row to an event table (values in the same order as its columns).
+def AddEvent(table,*values):
+    for col,value in zip(table['cols'],values):
+        col.append(value)
+
+# Convert an event table to a DataFrame, giving each column its declared type.
+def EventTableToDataFrame(table):
+    return pd.DataFrame({name: np.array(col,dtype=dtype) for name,dtype,col in zip(table['names'],table['dtypes'],table['cols'])},
+                        columns=table['names'])
+
+# Get the event tables filled by the default handlers.
+def GetDefaultEventTables():
+    return {'displays': NewEventTable([('t',float),('stim',object),('info',object)]), # info is the rest of the message
+            'keys': NewEventTable([('t',float),('key',object)]),
+            'ports': NewEventTable([('t',float),('port',object),('value',float)]),
+            'ratings': NewEventTable([('t',float),('name',object),('field',object),('value',float),('text',object)]),
+            'markers': NewEventTable([('t',float),('isStart',bool),('type',object),('number',float),('text',object)]),
+            'tracker': NewEventTable([('t',float),('event',object)])}
+
+
+# --- HANDLERS --- #
+# Each handler takes (log, t, tag, rest): the log being built (a dict with keys 'params' and 'tables'),
+# the time of the line, the first word of the message, and the rest of the message.
+
+# 'Display Fixation' or 'Display Faces/R0_B100.jpg CSplus100'
+def HandleDisplay(log,t,tag,rest):
+    words = rest.split(None,1)
+    if len(words)==0:
+        return
+    AddEvent(log['tables']['displays'],t,words[0],words[1] if len(words)>1 else np.nan)
+
+# 'Keypress: 5'
+def HandleKeypress(log,t,tag,rest):
+    AddEvent(log['tables']['keys'],t,rest.strip())
+
+# 'set port 0xe050 to 32'
+def HandleSetPort(log,t,tag,rest):
+    words = rest.split()
+    if len(words)==4 and words[0]=='port':
+        AddEvent(log['tables']['ports'],t,words[1],float(words[3]))
+
+# 'RatingScale Vas0: rating=50', '... rating RT=1.2', '... history=[(50, 0.0), ...]', '... (timed out) rating=50'
+def HandleRatingScale(log,t,tag,rest):
+    name,_,text = rest.partition(': ')
+    if text.startswith('history='):
+        AddEvent(log['tables']['ratings'],t,name,'history',np.nan,text[8:])
+        return
+    if text.startswith('(timed out)'):
+        field = 'timedOutRating'
+    elif 'RT=' in text:
+        field = 'RT'
+    else:
+        field = 'rating'
+    try:
+        value = float(text.rsplit('=',1)[-1])
+    except ValueError: # e.g. a rating scale with text choices
+        value = np.nan
+    AddEvent(log['tables']['ratings'],t,name,field,value,text)
+
+# Match the first number in a marker (like the 2 in 'START BLOCK 2, TYPE 0' or 'START RUN 2/3')
+markerNumberPattern = re.compile(r'\d+')
+
+# '===== START RUN 1/3 =====', '=== END BLOCK 2, TYPE 0 ===', '---START EXPERIMENT---', '--- END EXPERIMENT ---',
+# 'Start Block 3'
+def HandleMarker(log,t,tag,rest):
+    words = (tag.strip('-=') + ' ' + rest).replace('-',' ').replace('=',' ').split()
+    if len(words)<2 or words[0].upper() not in ['START','END']:
+        return
+    match = markerNumberPattern.search(' '.join(words[2:3]))
+    AddEvent(log['tables']['markers'],t,words[0].upper()=='START',words[1].upper(),
+             float(match.group()) if match else np.nan,(tag + ' ' + rest).strip())
+
+# "sent event 'TRIALID' to tracker"
+def HandleTrackerEvent(log,t,tag,rest):
+    if rest.startswith('event '):
+        AddEvent(log['tables']['tracker'],t,rest[6:].rsplit(' to tracker',1)[0].strip("'"))
+
+# Get the default table of handlers: a dict mapping the first word of a message to the function that handles it.
+def GetDefaultHandlers():
+    return {'Display': HandleDisplay,
+            'Keypress:': HandleKeypress,
+            'set': HandleSetPort,
+            'RatingScale': HandleRatingScale,
+            '=====': HandleMarker,
+            '====': HandleMarker,
+            '===': HandleMarker,
+            '---START': HandleMarker,
+            '---END': HandleMarker,
+            '---': HandleMarker,
+            'Start': HandleMarker,
+            'End': HandleMarker,
+            'sent': HandleTrackerEvent}
+
+# Add a handler (and, if it needs one, a new event table) for messages starting with tag.
+# handler(log,t,tag,rest) should add its events with AddEvent(log['tables'][tableName],...).
+def AddHandler(handlers,tables,tag,handler,tableName=None,columns=None):
+    handlers[tag] = handler
+    if tableName is not None and tableName not in tables:
+        tables[tableName] = NewEventTable(columns)
+
+
+# --- PARAMETERS --- #
+
+# Parse one line of the parameters block ('<name>: <value>') into dict params.
+# Numbers become floats, lists become lists, and anything else stays a string.
+def ParseParamLine(params,message):
+    data = message.split()
+    key = data[0][:-1] # name of parameter
+    if len(data)==2:
+        try:
+            params[key] = float(data[1]) # if it's a number, convert to a float
+        except ValueError:
+            params[key] = data[1] # otherwise, record the string
+    elif len(data)>2 and data[1].startswith("["):
+        try:
+            params[key] = ast.literal_eval(''.join(data[1:])) # if the parameter is a list, make it a list variable
+        except (ValueError,SyntaxError):
+            params[key] = ' '.join(data[1:])
+    else:
+        params[key] = ' '.join(data[1:])
+
+
+# Replace file dst with file src (os.replace isn't in python 2, where os.rename can't overwrite a file on Windows).
+def ReplaceFile(src,dst):
+    if hasattr(os,'replace'):
+        os.replace(src,dst)
+    else:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src,dst)
+
+# Get a hash of a file's contents.
+def GetFileHash(filename):
+    fileHash = hashlib.sha1()
+    with open(filename,'rb') as f:
+        for chunk in iter(lambda: f.read(1024*1024), b''):
+            fileHash.update(chunk)
+    return fileHash.hexdigest()
+
+# Get the filename of the sidecar file holding the parameters of logFile (in sidecarFolder, or next to the log if None).
+def GetParamsSidecarFilename(logFile,sidecarFolder=None):
+    if sidecarFolder is None:
+        sidecarFolder = os.path.dirname(logFile)
+    return os.path.join(sidecarFolder,os.path.basename(logFile) + '.params.json')
+
+# Read only the parameters block of a PsychoPy log (stopping at its end).
+def ParseLogParams(logFile):
+    params = {}
+    isParams = False
+    with io.open(logFile,encoding='utf-8',errors='replace') as f:
+        for line in f:
+            data = line.split(None,3)
+            if len(data)<3:
+                continue
+            if isParams:
+                if data[2]=='---END' and 'PARAMETERS' in line:
+                    break
+                ParseParamLine(params,line.split(None,2)[2])
+            elif data[2]=='---START' and 'PARAMETERS' in line:
+                isParams = True
+    return params
+
+# Get the parameters of a PsychoPy log, from its sidecar file if the log hasn't changed since the sidecar was written.
+# The sidecar records the log's size, modification time, and hash: if the size & time match, the log isn't read at all;
+# if only the time differs, the log is hashed to check whether its contents changed.
+# If useCache is False, the parameters are always parsed from the log (and the sidecar is rewritten).
+def ReadLogParams(logFile,useCache=True,sidecarFolder=None):
+    sidecarFile = GetParamsSidecarFilename(logFile,sidecarFolder)
+    logStat = os.stat(logFile)
+    sidecar = None
+    if useCache and os.path.exists(sidecarFile):
+        with open(sidecarFile) as f:
+            sidecar = json.load(f)
+        if sidecar['size']==logStat.st_size and sidecar['mtime']==logStat.st_mtime:
+            return sidecar['params']
+
+    # check the contents, then parse if they've changed
+    logHash = GetFileHash(logFile)
+    if sidecar is not None and sidecar['hash']==logHash:
+        params = sidecar['params']
+    else:
+        params = ParseLogParams(logFile)
+    # save sidecar (writing to a temporary file first so it's never half-written)
+    with open(sidecarFile + '.tmp','w') as f:
+        json.dump({'hash':logHash, 'size':logStat.st_size, 'mtime':logStat.st_mtime, 'params':params},f,indent=1,sort_keys=True)
+    ReplaceFile(sidecarFile + '.tmp',sidecarFile)
+    return params
+
+# Get a table of the parameters of many logs (one row per log, with the log filename in column 'logFile').
+def GetParamsTable(logFiles,useCache=True,sidecarFolder=None):
+    rows = []
+    for logFile in logFiles:
+        params = ReadLogParams(logFile,useCache,sidecarFolder)
+        rows.append(dict(params,logFile=logFile))
+    return pd.DataFrame(rows)
+
+# Get the logs whose parameters match a query (a pandas query string, e.g. 'speedUp != 1').
+def FindLogsWithParams(logFiles,query,useCache=True,sidecarFolder=None):
+    dfParams = GetParamsTable(logFiles,useCache,sidecarFolder)
+    if dfParams.shape[0]==0:
+        return []
+    return list(dfParams.query(query,engine='python').logFile)
+
+
+# --- MAIN PARSER --- #
+
+# Parse a PsychoPy log file into a dict of parameters and a dict of event tables (DataFrames).
+# handlers maps the first word of a message to its handler (default: GetDefaultHandlers()), and tables holds the event
+# tables they fill (default: GetDefaultEventTables()). Lines whose first word has no handler are skipped.
+def ParsePsychoPyLog(logFile,handlers=None,tables=None):
+    # set up
+    if handlers is None:
+        handlers = GetDefaultHandlers()
+    if tables is None:
+        tables = GetDefaultEventTables()
+    log = {'params': {}, 'tables': tables}
+    isParams = False
+
+    # read each line
+    with io.open(logFile,encoding='utf-8',errors='replace') as f:
+        for line in f:
+            # split off time, level, first word of message, and rest of message
+            data = line.split(None,3)
+            if len(data)<3:
+                continue
+            tag = data[2]
+            if isParams:
+                if tag=='---END' and 'PARAMETERS' in line:
+                    isParams = False
+                else:
+                    ParseParamLine(log['params'],line.split(None,2)[2])
+            elif tag=='---START' and 'PARAMETERS' in line:
+                isParams = True
+            else:
+                handler = handlers.get(tag)
+                if handler is not None:
+                    handler(log,float(data[0]),tag,data[3].rstrip('\n') if len(data)>3 else '')
+
+    # convert event tables to DataFrames
+    dfs = {name: EventTableToDataFrame(table) for name,table in tables.items()}
+    return log['params'], dfs
+
+
+# --- COMMAND-LINE PARAMETER QUERIES --- #
+
+parser = argparse.ArgumentParser(description='List the PsychoPy logs whose parameters match a query (using cached parameter sidecars).')
+parser.add_argument('logFiles', nargs='+', help='PsychoPy log files to search')
+parser.add_argument('--query', required=True, help="pandas query on the parameters, e.g. 'speedUp != 1'")
+parser.add_argument('--sidecarFolder', default=None, help='folder for parameter sidecar files (default: next to each log)')
+
+if __name__ == '__main__':
+    args = parser.parse_args();
+    for logFile in FindLogsWithParams(args.logFiles,args.query,sidecarFolder=args.sidecarFolder):
+        print(logFile)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python2
+"""Parse question & prompt files and score responses, without importing PsychoPy."""
+# QuestionTools.py
+#
+# The parsing and scoring functions shared by PromptTools.py and BasicPromptTools.py, in a module that only needs the
+# standard library, so offline scripts (quiz scoring, log analysis, checking question files) can import it quickly.
+# PromptTools and BasicPromptTools import these functions, so existing scripts can keep calling them from there.
+#
+# GetPrompts(experiment,promptType,params) reads each experiment's instruction prompts from its file in the Prompts
+# folder the first time they're needed, then fills in the params when they're looked up.
+#
+# Running it from the command line (python2 QuestionTools.py <files> --prompts) checks that the files (and the
+# experiment prompt files) parse, and that cached results match uncached ones.
+#
+# Created 10/18/26 based on GeneralTools/PromptTools.py
+
+import ParseCache # for skipping parsing of unchanged question & prompt files
+import os         # for finding prompt files
+import string     # for filling in prompt templates
+import argparse   # for command-line arguments
+import sys        # for exit status
+
+
+# --- PARSE QUESTION FILE INTO QUESTIONS AND OPTIONS --- #
+# optionsType 'Likert' returns the Likert scale for every question's options.
+# If returnTimes is True, '#' header lines with PAGE and TIME entries (e.g. '# PAGE 3, TIME 1:30') are also read,
+# and the pages and times (in seconds) of the questions are returned. Otherwise '#' lines are ignored.
+# If useCache is True, the results are loaded from the parse cache if the file hasn't changed since it was last parsed.
+def ParseQuestionFile(filename,optionsType=None,returnTimes=False,useCache=True):
+    if useCache:
+        return ParseCache.GetCachedParse(ParseQuestionFile_Uncached,filename,optionsType,returnTimes)
+    else:
+        return ParseQuestionFile_Uncached(filename,optionsType,returnTimes)
+
+def ParseQuestionFile_Uncached(filename,optionsType=None,returnTimes=False):
+    # initialize
+    questions_all = []
+    answers_all = []
+    options_all = []
+    pages_all = []
+    times_all = []
+    if optionsType is None:
+        options_this = []
+    elif optionsType == 'Likert':
+        options_likert = ['Strongly agree','Agree','Neutral','Disagree','Strongly disagree']
+        options_this = options_likert
+
+    # parse questions & answers
+    with open(filename) as f:
+        for line in f:
+            # remove the newline character at the end of the line
+            line = line.replace('\n','')
+            # replace any newline strings with newline characters
+            line = line.replace('\\n','\n')
+            # pass to proper output
+            if line.startswith("-"): # incorrect answer
+                options_this.append(line[1:]) # omit leading -
+            elif line.startswith("+"): # correct answer
+                options_this.append(line[1:]) # omit leading +
+                answers_all.append(len(options_this))
+            elif line.startswith("?"): # question
+                questions_all.append(line[1:]) # omit leading ?
+                # if it's not the first question, add the options to the list.
+                if options_this:
+                    options_all.append(options_this)
+                    if optionsType is None:
+                        options_this = [] #reset
+                    elif optionsType == 'Likert':
+                        options_this = options_likert
+            elif line.startswith("#") and returnTimes: # question header
+                pieces = line.split(',')
+                for piece in pieces:
+                    nameval = piece.split() # split at space
+                    if len(nameval)<2:
+                        continue
+                    if nameval[0] == 'PAGE':
+                        pages_all.append(nameval[1])
+                    elif nameval[0] == 'TIME':
+                        minsec = nameval[1].split(':')
+                        times_this = int(minsec[0])*60+int(minsec[1])
+                        times_all.append(times_this)
+
+    # make sure last set of options is included
+    options_all.append(options_this)
+    # return results
+    if returnTimes:
+        return (questions_all,options_all,answers_all,pages_all,times_all)
+    else:
+        return (questions_all,options_all,answers_all)
+
+# --- PARSE PROMPT FILE INTO TOP AND BOTTOM PROMPTS --- #
+# Each top prompt should be preceded by a +. Each bottom prompt should be preceded by a -. Everything else will be ignored.
+# If useCache is True, the results are loaded from the parse cache if the file hasn't changed since it was last parsed.
+def ParsePromptFile(filename,useCache=True):
+    if useCache:
+        return ParseCache.GetCachedParse(ParsePromptFile_Uncached,filename)
+    else:
+        return ParsePromptFile_Uncached(filename)
+
+def ParsePromptFile_Uncached(filename):
+    # initialize
+    topPrompts = []
+    bottomPrompts = []
+
+    # parse questions & answers
+    with open(filename) as f:
+        for line in f:
+            # remove the newline character at the end of the line
+            line = line.replace('\n','')
+            # replace any newline strings with newline characters
+            line = line.replace('\\n','\n')
+            # pass to proper output
+            if line.startswith("-"): # bottom prompt
+                bottomPrompts.append(line[1:]) # omit leading -
+            elif line.startswith("+"): # top prompt
+                topPrompts.append(line[1:]) # omit leading +
+
+    # return results
+    return (topPrompts,bottomPrompts)
+
+
+# --- FORMAT & SCORE QUESTIONS --- #
+
+# Get the text listing a question's options, one per line, as shown by RunQuestions ('1) ...\n2) ...\n').
+def GetOptionsText(options):
+    respText = ""
+    for iResp in range(0,len(options)):
+        respText += '%d) %s\n'%((iResp+1),options[iResp])
+    return respText
+
+# Score the responses returned by RunQuestions or RunQuestions_Move against the answers from ParseQuestionFile.
+# Each response is '' (no response) or an (answer number, RT) tuple.
+# Returns lists of whether each question was answered, whether it was answered correctly, and its RT (0 if no response).
+def ScoreQuestions(allKeys,answers):
+    isResponse = [len(allKeys[iKey])>0 for iKey in range(0,len(allKeys))] # was any response given?
+    isCorrect = [False]*len(allKeys) # was the response correct?
+    RT = [0.0]*len(allKeys) # how long did it take them to press a key?
+    for iKey in range(0,len(allKeys)):
+        if isResponse[iKey]:
+            RT[iKey] = allKeys[iKey][1] # keep in seconds
+            isCorrect[iKey] = (iKey<len(answers) and float(allKeys[iKey][0]) == answers[iKey])
+    return isResponse,isCorrect,RT
+
+
+# --- EXPERIMENT PROMPTS --- #
+
+# Folder holding each experiment's prompt file (<experiment>.txt)
+promptFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)),'Prompts')
+# Prompt templates loaded so far: experiment (e.g. 'ReadingTask.py') -> dict of promptType -> (topPrompts,bottomPrompts)
+promptRegistry = {}
+
+# Parse an experiment's prompt file into a dict of promptType -> (topPrompts,bottomPrompts).
+# Each '# TYPE <promptType>' line starts a new promptType, and its top prompts are preceded by a + and bottom prompts
+# by a -, as in ParsePromptFile. A '# USE <name>' line means the experiment uses the prompts in <name>.txt instead.
+# Returns the name of the file to use instead (or None) and the dict of prompts.
+def ParseExperimentPromptFile_Uncached(filename):
+    useName = None
+    prompts = {}
+    topPrompts = bottomPrompts = None
+    with open(filename) as f:
+        for line in f:
+            # remove the newline character at the end of the line
+            line = line.replace('\n','')
+            # replace any newline strings with newline characters
+            line = line.replace('\\n','\n')
+            # pass to proper output
+            words = line.split()
+            if len(words)==3 and words[0]=='#' and words[1]=='TYPE': # new prompt type
+                topPrompts = []
+                bottomPrompts = []
+                prompts[words[2]] = (topPrompts,bottomPrompts)
+            elif len(words)==3 and words[0]=='#' and words[1]=='USE': # use another file's prompts
+                useName = words[2]
+            elif line.startswith("-") and bottomPrompts is not None: # bottom prompt
+                bottomPrompts.append(line[1:]) # omit leading -
+            elif line.startswith("+") and topPrompts is not None: # top prompt
+                topPrompts.append(line[1:]) # omit leading +
+    # return results
+    return (useName,prompts)
+
+def ParseExperimentPromptFile(filename,useCache=True):
+    if useCache:
+        return ParseCache.GetCachedParse(ParseExperimentPromptFile_Uncached,filename)
+    else:
+        return ParseExperimentPromptFile_Uncached(filename)
+
+# Get the prompt templates for an experiment, loading them the first time they're needed.
+# An experiment uses the prompt file with the longest name that it starts with (e.g. 'DistractionTask_serial_d7.py'
+# uses DistractionTask.txt, and 'ReadingTask_questions_d2.py' uses ReadingTask_questions.txt rather than ReadingTask.txt).
+def GetPromptTemplates(experiment):
+    if experiment not in promptRegistry:
+        promptNames = [os.path.splitext(name)[0] for name in os.listdir(promptFolder) if name.endswith('.txt')]
+        matches = [name for name in promptNames if experiment.startswith(name)]
+        if len(matches)==0:
+            raise Exception('Experiment %s not recognized!'%experiment)
+        useName,prompts = ParseExperimentPromptFile(os.path.join(promptFolder,max(matches,key=len) + '.txt'))
+        while useName is not None:
+            useName,prompts = ParseExperimentPromptFile(os.path.join(promptFolder,useName + '.txt'))
+        promptRegistry[experiment] = prompts
+    return promptRegistry[experiment]
+
+# Fills in prompt templates: '{pageKey}' becomes params['pageKey'], '{pageKey!u}' becomes params['pageKey'].upper(),
+# and format specs and indices work as in str.format (e.g. '{maxPageTime:.1f}', '{respKeys[0]}').
+class PromptFormatter(string.Formatter):
+    def convert_field(self,value,conversion):
+        if conversion=='u':
+            return str(value).upper()
+        return string.Formatter.convert_field(self,value,conversion)
+
+promptFormatter = PromptFormatter()
+
+# Get the top and bottom prompts of type promptType for an experiment (usually the script's filename),
+# with params filled in.
+def GetPrompts(experiment,promptType,params):
+    prompts = GetPromptTemplates(experiment)
+    if promptType not in prompts:
+        raise Exception('Prompt Type %s not recognized!'%promptType)
+    topTemplates,bottomTemplates = prompts[promptType]
+    topPrompts = [promptFormatter.vformat(template,(),params) for template in topTemplates]
+    bottomPrompts = [promptFormatter.vformat(template,(),params) for template in bottomTemplates]
+    # return the prompts
+    return (topPrompts,bottomPrompts)
+
+
+# --- COMMAND-LINE CHECK --- #
+
+# Parse each file as a question file and a prompt file, with and without the parse cache, and check the results match.
+# Returns the number of files that failed. (e.g. 'python2 QuestionTools.py ../*/Questions/*.txt' to check that parsing
+# and caching work under the python version the tasks use.)
+def CheckParsing(filenames):
+    nFailed = 0
+    for filename in filenames:
+        try:
+            for parseFunc,args in [(ParseQuestionFile,(None,True)),(ParsePromptFile,())]:
+                uncached = parseFunc(filename,*args,useCache=False)
+                if parseFunc(filename,*args,useCache=True)!=uncached or parseFunc(filename,*args,useCache=True)!=uncached:
+                    raise Exception('cached %s result differs from uncached result'%parseFunc.__name__)
+        except Exception as e:
+            print('FAILED %s: %s'%(filename,e))
+            nFailed += 1
+    print('Parsed %d files, %d failed.'%(len(filenames),nFailed))
+    return nFailed
+
+# Load the prompt templates of every experiment prompt file in the Prompts folder (following USE lines), checking that
+# the parse cache gives the same results as parsing. Returns the number of prompt files that failed.
+def CheckPromptFiles():
+    nFailed = 0
+    promptNames = sorted(os.path.splitext(name)[0] for name in os.listdir(promptFolder) if name.endswith('.txt'))
+    for promptName in promptNames:
+        filename = os.path.join(promptFolder,promptName + '.txt')
+        try:
+            uncached = ParseExperimentPromptFile(filename,useCache=False)
+            if ParseExperimentPromptFile(filename)!=uncached or ParseExperimentPromptFile(filename)!=uncached:
+                raise Exception('cached ParseExperimentPromptFile result differs from uncached result')
+            GetPromptTemplates(promptName + '.py')
+        except Exception as e:
+            print('FAILED %s: %s'%(filename,e))
+            nFailed += 1
+    print('Loaded %d prompt files, %d failed.'%(len(promptNames),nFailed))
+    return nFailed
+
+parser = argparse.ArgumentParser(description='Check that question & prompt files parse the same with and without the parse cache.')
+parser.add_argument('filenames', nargs='*', help='question or prompt files to parse')
+parser.add_argument('--prompts', action='store_true', help="also check every experiment's prompt file in the Prompts folder")
+
+if __name__ == '__main__':
+    args = parser.parse_args();
+    nFailed = CheckParsing(args.filenames)
+    if args.prompts:
+        nFailed += CheckPromptFiles()
+    sys.exit(1 if nFailed>0 else 0)
@@ -13,15 +13,108 @@
 # Updated 2/25/19 by DJ - added tickHeight & tickLabelWidth, changed a couple variable names
 
 from psychopy import core, event, logging#, visual # visual and gui conflict, so don't import it here
+import EventSidecar # for binary sidecar of task events
+import numpy as np # for marker trajectory buffer
 import time
 import string
 
-def ShowVAS(questions_list, options_list, win, name='Question', questionDur=float('inf'), isEndedByKeypress=True, 
-            upKey='up', downKey='down', selectKey='enter',textColor='black',pos=(0.,0.),stepSize=1.,hideMouse=True,
-            repeatDelay=0.5, scaleTextPos=[0.,0.45], labelYPos=-0.27648, markerSize=0.1, tickHeight=0.0, tickLabelWidth=0.0):
+# Number of frames of marker trajectory kept for each question (the most recent ones, if a question runs longer)
+trajectoryBufferSize = 16384
+# Ring buffer that each question's marker trajectory is recorded in (made on first use, then reused)
+trajectoryBuffer = [None]
+
+# Flip the window and return the time of the flip (on PsychoPy's logging clock, like the times win.flip returns).
+def FlipAndGetTime(win):
+    tFlip = win.flip()
+    if tFlip is None: # window doesn't wait for screen refresh
+        tFlip = logging.defaultClock.getTime()
+    return tFlip
+
+# Record frame number iFrame of a marker trajectory in ring buffer trajBuffer, overwriting the oldest frame if it's full.
+def RecordTrajectoryFrame(trajBuffer,iFrame,t,value,keyState):
+    trajBuffer[iFrame % len(trajBuffer)] = (t,value,keyState)
+
+# Get the frames of a marker trajectory from ring buffer trajBuffer, oldest first, after nFrames have been recorded.
+def GetTrajectoryFrames(trajBuffer,nFrames):
+    if nFrames<=len(trajBuffer):
+        return trajBuffer[:nFrames]
+    iOldest = nFrames % len(trajBuffer)
+    return np.concatenate((trajBuffer[iOldest:],trajBuffer[:iOldest]))
+
+# Get the value of a slider whose key has been held since time tPress (on the logging clock) from value valPress,
+# at the time the frame after a flip at tFlip will appear (one frame period later). After the key has been held for
+# holdDur seconds, the value moves at speed (units per second, negative to slide down), staying between low and high.
+def GetHeldKeyValue(valPress,tPress,tFlip,framePeriod,speed,holdDur,low,high):
+    durHeld = max(tFlip + framePeriod - tPress - holdDur, 0.0)
+    return min(max(valPress + durHeld*speed, low), high)
+
+# Rating scales made so far, so ShowVAS can reuse them: (window, settings) -> RatingScale
+ratingScalePool = {}
+
+# Get a rating scale with the given options & settings, made the first time they're used and reused after that
+# (so making the scale, its marker and tick labels isn't done inside each question's timed display).
+# question, name and questionDur are only used when a new scale is made: ShowVAS sets each question's text, name and
+# time limit and resets the scale before showing it.
+def GetRatingScale(win, question, options, name='Question', questionDur=float('inf'), upKey='up', downKey='down', selectKey='enter',
+                   textColor='black', pos=(0.,0.), hideMouse=True, scaleTextPos=[0.,0.45], labelYPos=-0.27648,
+                   markerSize=0.1, tickHeight=0.0, tickLabelWidth=0.0):
+    # check for a rating scale with these settings
+    poolKey = (win, bool(question), repr((options,upKey,downKey,selectKey,textColor,pos,hideMouse,scaleTextPos,labelYPos,
+                          markerSize,tickHeight,tickLabelWidth)))
+    if poolKey in ratingScalePool:
+        return ratingScalePool[poolKey]
+
     # import packages
     from psychopy import visual # for ratingScale
     import numpy as np # for tick locations
+
+    # Make triangle
+    markerStim = visual.ShapeStim(win,lineColor=textColor,fillColor=textColor,vertices=((-markerSize/2.,markerSize*np.sqrt(5./4.)),(markerSize/2.,markerSize*np.sqrt(5./4.)),(0,0)),units='norm',closeShape=True,name='triangle');
+    
+    tickMarks = np.linspace(0,100,len(options)).tolist()
+    if tickLabelWidth==0.0: # if default value, determine automatically to fit all tick mark labels
+        tickWrapWidth = (tickMarks[1]-tickMarks[0])*0.9/100 # *.9 for extra space, /100 for norm units
+    else: # use user-specified value
+        tickWrapWidth = tickLabelWidth;
+    
+    ratingScale = visual.RatingScale(win, scale=question, \
+        low=0., high=100., markerStart=50., precision=1., labels=options, tickMarks=tickMarks, tickHeight=tickHeight, \
+        marker=markerStim, markerColor=textColor, markerExpansion=1, singleClick=False, disappear=False, \
+        textSize=0.8, textColor=textColor, textFont='Helvetica Bold', showValue=False, \
+        showAccept=False, acceptKeys=selectKey, acceptPreText='key, click', acceptText='accept?', acceptSize=1.0, \
+        leftKeys=downKey, rightKeys=upKey, respKeys=(), lineColor=textColor, skipKeys=['q','escape'], \
+        mouseOnly=False, noMouse=hideMouse, size=2.0, stretch=1.0, pos=pos, minTime=0.4, maxTime=questionDur, \
+        flipVert=False, depth=0, name=name, autoLog=True)
+    # Fix text wrapWidth
+    for iLabel in range(len(ratingScale.labels)):
+        ratingScale.labels[iLabel].wrapWidth = tickWrapWidth
+        ratingScale.labels[iLabel].pos  = (ratingScale.labels[iLabel].pos[0],labelYPos)
+        ratingScale.labels[iLabel].alignHoriz = 'center'
+    # Move main text
+    ratingScale.scaleDescription.pos = scaleTextPos
+
+    ratingScalePool[poolKey] = ratingScale
+    return ratingScale
+
+# Make the rating scales that ShowVAS will need for these questions & options (with the same settings as it will be
+# called with), so the first question with each set of options doesn't have to make its scale during its timed display.
+# Call this during a task's setup.
+def PrepareRatingScales(questions_list, options_list, win, upKey='up', downKey='down', selectKey='enter',textColor='black',
+                        pos=(0.,0.), hideMouse=True, scaleTextPos=[0.,0.45], labelYPos=-0.27648, markerSize=0.1,
+                        tickHeight=0.0, tickLabelWidth=0.0):
+    for iQ in range(len(questions_list)):
+        GetRatingScale(win,questions_list[iQ],options_list[iQ],upKey=upKey,downKey=downKey,selectKey=selectKey,
+            textColor=textColor,pos=pos,hideMouse=hideMouse,scaleTextPos=scaleTextPos,labelYPos=labelYPos,
+            markerSize=markerSize,tickHeight=tickHeight,tickLabelWidth=tickLabelWidth)
+
+# Show a visual analog scale for each question and return the ratings, RTs and rating histories.
+# When upKey or downKey is held for repeatDelay seconds, the marker slides at slideSpeed steps (of stepSize) per second.
+# The marker's position and the held key on every frame are written to the trajectory file in EventSidecar, if one is open.
+def ShowVAS(questions_list, options_list, win, name='Question', questionDur=float('inf'), isEndedByKeypress=True, 
+            upKey='up', downKey='down', selectKey='enter',textColor='black',pos=(0.,0.),stepSize=1.,hideMouse=True,
+            repeatDelay=0.5, scaleTextPos=[0.,0.45], labelYPos=-0.27648, markerSize=0.1, tickHeight=0.0, tickLabelWidth=0.0,
+            slideSpeed=60.):
+    # import packages
     from pyglet.window import key # for press-and-hold functionality
 
     # set up
@@ -32,6 +125,12 @@ def ShowVAS(questions_list, options_list, win, name='Question', questionDur=floa
     # Set up pyglet key handler
     keyState=key.KeyStateHandler()
     win.winHandle.push_handlers(keyState)
+    # Get the window's frame period (measured when the window was made) for timing held-key sliding
+    framePeriod = win.monitorFramePeriod
+    # Set up marker trajectory buffer
+    if trajectoryBuffer[0] is None:
+        trajectoryBuffer[0] = np.zeros(trajectoryBufferSize,dtype=EventSidecar.trajectoryDtype)
+    trajBuffer = trajectoryBuffer[0]
     # Get attributes for key handler (put _ in front of numbers)
     if downKey[0].isdigit():
         downKey_attr = '_%s'%downKey
@@ -41,46 +140,37 @@ def ShowVAS(questions_list, options_list, win, name='Question', questionDur=floa
         upKey_attr = '_%s'%upKey
     else:
         upKey_attr = upKey
+    # Get which key is held: 1 for upKey, -1 for downKey, 0 for neither
+    def GetKeyState():
+        return int(keyState[getattr(key,upKey_attr)]) - int(keyState[getattr(key,downKey_attr)])
 
     # Rating Scale Loop
     for iQ in range(nQuestions):
-        # Make triangle
-        markerStim = visual.ShapeStim(win,lineColor=textColor,fillColor=textColor,vertices=((-markerSize/2.,markerSize*np.sqrt(5./4.)),(markerSize/2.,markerSize*np.sqrt(5./4.)),(0,0)),units='norm',closeShape=True,name='triangle');
-        
-        tickMarks = np.linspace(0,100,len(options_list[iQ])).tolist()
-        if tickLabelWidth==0.0: # if default value, determine automatically to fit all tick mark labels
-            tickWrapWidth = (tickMarks[1]-tickMarks[0])*0.9/100 # *.9 for extra space, /100 for norm units
-        else: # use user-specified value
-            tickWrapWidth = tickLabelWidth;
-        
-        ratingScale = visual.RatingScale(win, scale=questions_list[iQ], \
-            low=0., high=100., markerStart=50., precision=1., labels=options_list[iQ], tickMarks=tickMarks, tickHeight=tickHeight, \
-            marker=markerStim, markerColor=textColor, markerExpansion=1, singleClick=False, disappear=False, \
-            textSize=0.8, textColor=textColor, textFont='Helvetica Bold', showValue=False, \
-            showAccept=False, acceptKeys=selectKey, acceptPreText='key, click', acceptText='accept?', acceptSize=1.0, \
-            leftKeys=downKey, rightKeys=upKey, respKeys=(), lineColor=textColor, skipKeys=['q','escape'], \
-            mouseOnly=False, noMouse=hideMouse, size=2.0, stretch=1.0, pos=pos, minTime=0.4, maxTime=questionDur, \
-            flipVert=False, depth=0, name='%s%d'%(name,iQ), autoLog=True)
-        # Fix text wrapWidth
-        for iLabel in range(len(ratingScale.labels)):
-            ratingScale.labels[iLabel].wrapWidth = tickWrapWidth
-            ratingScale.labels[iLabel].pos  = (ratingScale.labels[iLabel].pos[0],labelYPos)
-            ratingScale.labels[iLabel].alignHoriz = 'center'
-        # Move main text
-        ratingScale.scaleDescription.pos = scaleTextPos
+        # Get a rating scale with these options (made the first time they're used, then reused)
+        ratingScale = GetRatingScale(win,questions_list[iQ],options_list[iQ],name='%s%d'%(name,iQ),questionDur=questionDur,
+            upKey=upKey,downKey=downKey,selectKey=selectKey,textColor=textColor,pos=pos,hideMouse=hideMouse,
+            scaleTextPos=scaleTextPos,labelYPos=labelYPos,markerSize=markerSize,tickHeight=tickHeight,tickLabelWidth=tickLabelWidth)
+        # Set it up for this question
+        ratingScale.name = '%s%d'%(name,iQ)
+        if ratingScale.scaleDescription.text != questions_list[iQ]:
+            ratingScale.scaleDescription.setText(questions_list[iQ],log=False)
+        ratingScale.maxTime = float(questionDur)
+        ratingScale.allowTimeOut = (ratingScale.minTime < ratingScale.maxTime)
+        ratingScale.reset(log=False)
+        nFrames = 0
 
         # Display until time runs out (or key is pressed, if specified)
-        win.logOnFlip(level=logging.EXP, msg='Display %s%d'%(name,iQ))
+        EventSidecar.LogOnFlip(win, level=logging.EXP, msg='Display %s%d'%(name,iQ))
         tStart = time.time()
         while (time.time()-tStart)<questionDur:
             # Look for keypresses
             if keyState[getattr(key,downKey_attr)]: #returns True if left key is pressed
-                tPress = time.time()
+                tPress = logging.defaultClock.getTime()
                 valPress = ratingScale.markerPlacedAt
                 keyPressed = downKey_attr
                 step = -stepSize
             elif keyState[getattr(key,upKey_attr)]: #returns True if the right key is pressed
-                tPress = time.time()
+                tPress = logging.defaultClock.getTime()
                 valPress = ratingScale.markerPlacedAt
                 keyPressed = upKey_attr
                 step = stepSize
@@ -89,30 +179,33 @@ def ShowVAS(questions_list, options_list, win, name='Question', questionDur=floa
 
             # Handle sliding for held keys
             while (keyPressed is not None) and ((time.time()-tStart)<questionDur):
-                # update time
-                durPress = time.time()-tPress
                 # update display
                 ratingScale.draw()
-                win.flip()
+                tFlip = FlipAndGetTime(win)
+                RecordTrajectoryFrame(trajBuffer,nFrames,tFlip,ratingScale.markerPlacedAt,GetKeyState())
+                nFrames += 1
                 # check for key release
                 if keyState[getattr(key,keyPressed)]==False:
                     break
-                # Update marker
-                if durPress>repeatDelay:
-                    ratingScale.markerPlacedAt = valPress + (durPress-repeatDelay)*step*60 # *60 for refresh rate
-                    ratingScale.markerPlacedAt = max(ratingScale.markerPlacedAt,ratingScale.low)
-                    ratingScale.markerPlacedAt = min(ratingScale.markerPlacedAt,ratingScale.high)
+                # Update marker to where it should be when the next frame appears (once the key counts as held)
+                if tFlip+framePeriod-tPress > repeatDelay:
+                    ratingScale.markerPlacedAt = GetHeldKeyValue(valPress,tPress,tFlip,framePeriod,step*slideSpeed,
+                                                                 repeatDelay,ratingScale.low,ratingScale.high)
             # Check for response
             if isEndedByKeypress and not ratingScale.noResponse:
                 break
             # Redraw
             ratingScale.draw()
-            win.flip()
+            tFlip = FlipAndGetTime(win)
+            RecordTrajectoryFrame(trajBuffer,nFrames,tFlip,ratingScale.markerPlacedAt,GetKeyState())
+            nFrames += 1
 
         # Log outputs
         rating[iQ] = ratingScale.getRating()
         decisionTime[iQ] = ratingScale.getRT()
         choiceHistory[iQ] = ratingScale.getHistory()
+        EventSidecar.LogEvent('rating',stim=ratingScale.name,value=rating[iQ],rt=decisionTime[iQ],code=int(ratingScale.noResponse))
+        EventSidecar.WriteTrajectory(ratingScale.name,GetTrajectoryFrames(trajBuffer,nFrames))
 
         # if no response, log manually
         if ratingScale.noResponse:
@@ -11,6 +11,7 @@ Set audio library to pygame to avoid hanging at the end of the experiment."""
 # Updated 10/16/18 by DJ - added pre-final-scan prompts
 # Updated 12/4/18 by DJ - added year to datestring
 # Updated 1/29/19 by DJ - added global escape key
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import visual # visual must be called first to prevent a bug where the movie doesn't appear.
 from psychopy import core, gui, data, event, logging, parallel # sound 
@@ -18,6 +19,7 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import time as ts, numpy as np # for timing and array operations
 import os, glob # for monitor size detection, files
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import RatingScales # for VAS sliding scale
 
 # ====================== #
@@ -197,13 +199,11 @@ else:
 # ========================== #
 #from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'])
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -246,14 +246,6 @@ print('%d questions loaded from %s'%(len(questions),params['questionFile']))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 # Send parallel port event
 def SetPortData(data):
     if params['sendPortEvents']:
@@ -379,7 +371,7 @@ if params['doStructurals']:
     AddToFlipTime(params['structuralDur']) # duration of structural/clinical scans
     
     # Wait until it's time to continue
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         if event.getKeys(keyList=['q','escape']):
             CoolDown()
 
@@ -420,7 +412,7 @@ if params['doRest']:
     AddToFlipTime(params['restDur']) # duration of resting state; see above
     
     # Wait until it's time to continue
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         if event.getKeys(keyList=['q','escape']):
             CoolDown()
 
@@ -461,7 +453,7 @@ if params['doMovie']:
     AddToFlipTime(params['tStartup'])
     
     # Wait until it's time to continue
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         if event.getKeys(keyList=['q','escape']):
             CoolDown()
     
@@ -513,7 +505,7 @@ if params['doFinalScan']:
     AddToFlipTime(params['finalScanDur']) # duration of movie + time to reach steady-state
     
     # Wait until it's time to continue
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         if event.getKeys(keyList=['q','escape']):
             CoolDown()
         
@@ -14,49 +14,331 @@ import numpy as np
 import os.path
 import argparse
 import time
+import hashlib # for detecting changed participants
+import json # for the manifest of participants written
+import multiprocessing # for writing files in parallel
+
+# Name of the file in the output folder that records what has been written for each participant
+manifestName = 'PavloviaRecoveryManifest.json'
+# Output formats (and the file extension each one uses)
+outFormats = {'csv':'.csv', 'csv.gz':'.csv.gz', 'parquet':'.parquet'}
+
+
+def LoadManifest(outFolder,readAsText):
+    """ Load the record of what has been written for each participant from a previous run.
+    
+    INPUTS:
+    - outFolder is the folder where individual subject output files go.
+    - readAsText indicates whether this run reads the database as text (in chunks). Digests from a run that read it the
+    other way can't be compared, so they are ignored.
+    
+    OUTPUTS:
+    - participants is a dict with one entry per participant, each a dict with keys 'datetime','outFile','nRows',
+    and 'digest'.
+    """
+    manifestFile = os.path.join(outFolder,manifestName)
+    if not os.path.exists(manifestFile):
+        return {}
+    with open(manifestFile) as f:
+        manifest = json.load(f)
+    if manifest['readAsText']!=readAsText:
+        print('Previous run read the database differently, so all participants will be rewritten.')
+        return {}
+    return manifest['participants']
+
+
+def SaveManifest(participants,outFolder,readAsText):
+    """ Save the record of what has been written for each participant (see LoadManifest). """
+    manifestFile = os.path.join(outFolder,manifestName)
+    with open(manifestFile + '.tmp','w') as f:
+        json.dump({'readAsText':readAsText,'participants':participants},f,indent=1,sort_keys=True)
+    os.replace(manifestFile + '.tmp',manifestFile) # so the manifest is never half-written
+
+
+def StartDigest(dfFirstRows,oldEntry=None):
+    """ Start the digest of one participant's rows, which is built up a chunk at a time with UpdateDigest.
+    
+    INPUTS:
+    - dfFirstRows is a table containing (at least) this participant's first row.
+    - oldEntry is this participant's manifest entry from a previous run (or None if there isn't one).
+    
+    OUTPUTS:
+    - state is a dict with keys 'expName','datetime','nRows' (so far),'nOldRows' (in the previous run),
+    'digest' (a hashlib object), and 'prefixDigest' (hex digest of the first nOldRows rows, once they've been seen).
+    """
+    return {'expName': dfFirstRows['__experimentName'].values[0],
+            'datetime': dfFirstRows['__datetime'].values[0],
+            'nRows': 0,
+            'nOldRows': 0 if oldEntry is None else oldEntry['nRows'],
+            'digest': hashlib.sha1(),
+            'prefixDigest': None}
+
+
+def UpdateDigest(state,dfRows):
+    """ Add the next rows of one participant to their digest (see StartDigest). """
+    rowHashes = pd.util.hash_pandas_object(dfRows,index=False).values
+    iSplit = state['nOldRows'] - state['nRows'] # index of the first row that's new since the previous run
+    if 0<iSplit<=len(rowHashes):
+        state['digest'].update(rowHashes[:iSplit].tobytes())
+        state['prefixDigest'] = state['digest'].hexdigest()
+        state['digest'].update(rowHashes[iSplit:].tobytes())
+    else:
+        state['digest'].update(rowHashes.tobytes())
+    state['nRows'] += len(rowHashes)
+
+
+def GetParticipantAction(subj,state,oldEntry,outFolder,appendOnly=False,outFormat='csv'):
+    """ Decide what to do with one participant's rows, given their digest and their manifest entry from a previous run.
+    Parquet files can't be appended to, so they're always rewritten.
+    
+    OUTPUTS:
+    - action is 'skip' (unchanged since the previous run), 'append' (write only the rows after the first
+    state['nOldRows']), or 'write' (write all rows).
+    - entry is the participant's new manifest entry.
+    """
+    outFile = '%s_%s_%s%s'%(subj,state['expName'],state['datetime'],outFormats[outFormat])
+    entry = {'datetime': state['datetime'], 'outFile': outFile, 'nRows': state['nRows'], 'digest': state['digest'].hexdigest()}
+    if oldEntry is None or oldEntry['outFile']!=outFile or not os.path.exists(os.path.join(outFolder,outFile)):
+        return 'write', entry
+    elif oldEntry['digest']==entry['digest']:
+        return 'skip', entry
+    elif appendOnly and outFormat!='parquet' and oldEntry['digest']==state['prefixDigest']:
+        return 'append', entry
+    else:
+        return 'write', entry
+
+
+def WriteRows(dfRows,outFile,outFormat='csv',isAppend=False):
+    """ Write (or, if isAppend is True, add to the end of) one participant's output file in the given format. """
+    if outFormat=='parquet':
+        dfRows.to_parquet(outFile,index=False)
+    else:
+        compression = 'gzip' if outFormat=='csv.gz' else None
+        dfRows.to_csv(outFile,index=False,header=not isAppend,mode='a' if isAppend else 'w',compression=compression);
+
+
+def WriteRows_Worker(args):
+    """ Call WriteRows in a worker process (args is a tuple of its inputs). """
+    WriteRows(*args)
+
+
+def WriteAllRows(writes,pool=None):
+    """ Call WriteRows for each tuple of inputs in list writes, in parallel if pool is a multiprocessing Pool.
+    Each output file should only appear once in the list, since the writes can happen in any order. """
+    if pool is None:
+        for args in writes:
+            WriteRows(*args)
+    else:
+        pool.map(WriteRows_Worker,writes)
+
 
 # Declare main function
-def RecoverPavloviaCsvsFromDatabase(dbFile,outFolder='.'):
+def RecoverPavloviaCsvsFromDatabase(dbFile,outFolder='.',chunkSize=0,useManifest=True,appendOnly=False,nJobs=1,outFormat='csv'):
     """ Recover the .csv files of individual subjects from a multi-subject pavlovia database.
     
     INPUTS:
     - dbFile is a Pavlovia database file (.csv) containing data from multiple subjects.
     - outFolder is the folder where individual subject output files should go (default: '.').
+    - chunkSize is the number of rows to read at a time. If it's 0, the whole database is read at once (default: 0).
+    Use it for databases too big to fit in memory.
+    - useManifest indicates whether participants whose rows haven't changed since the last run (according to the
+    manifest in outFolder) should be skipped (default: True).
+    - appendOnly indicates whether, for participants whose rows from the last run are unchanged, only the new rows
+    should be added to the end of their file (default: False).
+    - nJobs is the number of processes writing subject files at once (default: 1).
+    - outFormat is the format of the subject files: 'csv', 'csv.gz' (gzipped csv), or 'parquet' (default: 'csv').
+    Parquet files can only be written when reading the whole database at once (chunkSize=0).
     
     OUTPUTS:
-    - A .csv file for each subject will be saved in outFolder, named <subj>_<experimentName>_<datetime>.csv.
+    - A .csv file for each new or changed subject will be saved in outFolder, named <subj>_<experimentName>_<datetime>.csv
+    (or .csv.gz or .parquet, depending on outFormat).
+    - The manifest of participants written is saved in outFolder as PavloviaRecoveryManifest.json.
     """
     
     # Make sure file & folder exist
     assert os.path.exists(dbFile), 'Pavlovia database file %s does not exist!'%dbFile
     assert os.path.exists(outFolder), 'Output folder %s does not exist!'%outFolder
+    assert outFormat in outFormats, 'Output format %s not recognized! Options are %s.'%(outFormat,list(outFormats.keys()))
+    assert not (chunkSize>0 and outFormat=='parquet'), 'Parquet files can only be written when reading the whole database at once!'
     
     # Time processing
     tStart = time.time();
     
+    # Set up parallel writers
+    pool = multiprocessing.Pool(nJobs) if nJobs>1 else None
+    try:
+        # Stream large files
+        if chunkSize>0:
+            StreamPavloviaCsvsFromDatabase(dbFile,outFolder,chunkSize,useManifest,appendOnly,pool,outFormat)
+        else:
+            SplitPavloviaCsvsFromDatabase(dbFile,outFolder,useManifest,appendOnly,pool,outFormat)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    print('==== Done! Took %.1f seconds.'%(time.time()-tStart))    
+
+
+def SplitPavloviaCsvsFromDatabase(dbFile,outFolder='.',useManifest=True,appendOnly=False,pool=None,outFormat='csv'):
+    """ Recover the .csv files of individual subjects from a multi-subject pavlovia database, reading it all at once.
+    
+    INPUTS:
+    - dbFile is a Pavlovia database file (.csv) containing data from multiple subjects.
+    - outFolder is the folder where individual subject output files should go (default: '.').
+    - useManifest, appendOnly, and outFormat are as in RecoverPavloviaCsvsFromDatabase.
+    - pool is a multiprocessing Pool in which to write the subject files (or None to write them in this process).
+    
+    OUTPUTS:
+    - A file for each new or changed subject will be saved in outFolder, named <subj>_<experimentName>_<datetime>.csv.
+    - The manifest of participants written is saved in outFolder as PavloviaRecoveryManifest.json.
+    """
+    
     # Import file
     print('===== Reading Pavlovia database file %s...'%dbFile)
     dfAll = pd.read_csv(dbFile);
+    oldParticipants = LoadManifest(outFolder,readAsText=False) if useManifest else {}
+    participants = {}
     
     # Separate data
-    subjs = np.unique(dfAll.participant)
-    nSubj = np.size(subjs)
-    print('===== Separating data from %d subjects...'%nSubj)
-    for subj in subjs:
+    subjGroups = dfAll.groupby('participant')
+    print('===== Separating data from %d subjects...'%subjGroups.ngroups)
+    writes = [] # inputs to WriteRows for each subject file
+    nSkipped = 0
+    for subj,dfThis in subjGroups:
+        dfThis = dfThis.reset_index(drop=True);
+        oldEntry = oldParticipants.get(str(subj))
+        state = StartDigest(dfThis,oldEntry)
+        UpdateDigest(state,dfThis)
+        action,participants[str(subj)] = GetParticipantAction(subj,state,oldEntry,outFolder,appendOnly,outFormat)
+        outFile = participants[str(subj)]['outFile']
+        if action=='skip':
+            nSkipped += 1
+            continue
         print('-- Subject %s'%subj)
-        dfThis = dfAll.loc[dfAll.participant==subj,:].reset_index(drop=True);
-        expName = dfThis['__experimentName'].values[0]
-        datetime = dfThis['__datetime'].values[0]
-        outFile = '%s_%s_%s.csv'%(subj,expName,datetime)
-        print('   Saving %s...'%outFile)
-        dfThis.to_csv('%s/%s'%(outFolder,outFile),index=False);
-    print('==== Done! Took %.1f seconds.'%(time.time()-tStart))    
+        if action=='append':
+            print('   Adding %d rows to %s...'%(state['nRows']-state['nOldRows'],outFile))
+            writes.append((dfThis.iloc[state['nOldRows']:],'%s/%s'%(outFolder,outFile),outFormat,True))
+        else:
+            print('   Saving %s...'%outFile)
+            writes.append((dfThis,'%s/%s'%(outFolder,outFile),outFormat,False))
+    print('===== Skipped %d unchanged subjects.'%nSkipped)
+    WriteAllRows(writes,pool)
+    SaveManifest(participants,outFolder,readAsText=False)
+
+
+def ReadDatabaseChunks(dbFile,chunkSize):
+    """ Read a Pavlovia database file a chunk at a time, as text (so every chunk's columns have the same type).
+    Rows with no participant are dropped with a warning. """
+    for dfChunk in pd.read_csv(dbFile,chunksize=chunkSize,dtype=str,keep_default_na=False):
+        isMissing = dfChunk.participant==''
+        if isMissing.any():
+            print('WARNING: skipping %d rows with no participant.'%isMissing.sum())
+            dfChunk = dfChunk.loc[~isMissing,:]
+        yield dfChunk
+
+
+def StreamPavloviaCsvsFromDatabase(dbFile,outFolder='.',chunkSize=100000,useManifest=True,appendOnly=False,pool=None,outFormat='csv'):
+    """ Recover the .csv files of individual subjects from a multi-subject pavlovia database, reading it in chunks.
+    
+    Only one chunk of the database is in memory at a time. Each chunk's rows are split by participant in one pass and
+    appended to that participant's file. Values are copied as text, exactly as they appear in the database.
+    If useManifest is True, the database is read twice: once to find which participants are new or changed, and
+    (if any are) again to write them.
+    
+    INPUTS:
+    - dbFile is a Pavlovia database file (.csv) containing data from multiple subjects.
+    - outFolder is the folder where individual subject output files should go (default: '.').
+    - chunkSize is the number of rows to read at a time (default: 100000).
+    - useManifest, appendOnly, and outFormat ('csv' or 'csv.gz') are as in RecoverPavloviaCsvsFromDatabase.
+    - pool is a multiprocessing Pool in which to write the subject files (or None to write them in this process).
+    Each chunk's files are written in parallel, and finished before the next chunk is read.
+    
+    OUTPUTS:
+    - A file for each new or changed subject will be saved in outFolder, named <subj>_<experimentName>_<datetime>.csv.
+    - The manifest of participants written is saved in outFolder as PavloviaRecoveryManifest.json.
+    """
+    
+    # Find new & changed participants
+    oldParticipants = LoadManifest(outFolder,readAsText=True) if useManifest else {}
+    states = {} # digest of each subject's rows
+    if useManifest:
+        print('===== Checking Pavlovia database file %s for changes...'%dbFile)
+        for dfChunk in ReadDatabaseChunks(dbFile,chunkSize):
+            for subj,dfThis in dfChunk.groupby('participant',sort=False):
+                if subj not in states:
+                    states[subj] = StartDigest(dfThis,oldParticipants.get(subj))
+                UpdateDigest(states[subj],dfThis)
+        actions = {}
+        participants = {}
+        for subj,state in states.items():
+            actions[subj],participants[subj] = GetParticipantAction(subj,state,oldParticipants.get(subj),outFolder,appendOnly,outFormat)
+        nSkipped = list(actions.values()).count('skip')
+        print('===== Skipping %d unchanged subjects.'%nSkipped)
+        if nSkipped==len(actions):
+            SaveManifest(participants,outFolder,readAsText=True)
+            return
+    
+    # Import file in chunks
+    print('===== Streaming Pavlovia database file %s in chunks of %d rows...'%(dbFile,chunkSize))
+    outFiles = {} # output file for each subject being written
+    nRowsSeen = {} # rows of each subject being written seen so far
+    nRows = 0
+    for dfChunk in ReadDatabaseChunks(dbFile,chunkSize):
+        nRows += dfChunk.shape[0]
+        # Separate data
+        writes = [] # inputs to WriteRows for each subject in this chunk
+        for subj,dfThis in dfChunk.groupby('participant',sort=False):
+            if useManifest:
+                action = actions[subj]
+                if action=='skip':
+                    continue
+            else:
+                # digest the rows as we go
+                action = 'write'
+                if subj not in states:
+                    states[subj] = StartDigest(dfThis)
+                UpdateDigest(states[subj],dfThis)
+            isAppend = True
+            if subj not in outFiles:
+                print('-- Subject %s'%subj)
+                expName = dfThis['__experimentName'].values[0]
+                datetime = dfThis['__datetime'].values[0]
+                outFiles[subj] = '%s/%s_%s_%s%s'%(outFolder,subj,expName,datetime,outFormats[outFormat])
+                nRowsSeen[subj] = 0
+                if action=='write':
+                    # first rows from this subject: start a new file
+                    print('   Saving %s...'%os.path.basename(outFiles[subj]))
+                    isAppend = False
+                else:
+                    print('   Adding %d rows to %s...'%(states[subj]['nRows']-states[subj]['nOldRows'],os.path.basename(outFiles[subj])))
+            if action=='append':
+                # add only the rows that are new since the last run
+                iFirstNew = max(states[subj]['nOldRows']-nRowsSeen[subj],0)
+                if iFirstNew<dfThis.shape[0]:
+                    writes.append((dfThis.iloc[iFirstNew:],outFiles[subj],outFormat,True))
+            else:
+                # add rows to this subject's file
+                writes.append((dfThis,outFiles[subj],outFormat,isAppend))
+            nRowsSeen[subj] += dfThis.shape[0]
+        WriteAllRows(writes,pool)
+        print('   Read %d rows.'%nRows)
+    print('===== Wrote data from %d subjects.'%len(outFiles))
+    
+    # Record what was written
+    if not useManifest:
+        participants = {subj:GetParticipantAction(subj,state,None,outFolder,outFormat=outFormat)[1] for subj,state in states.items()}
+    SaveManifest(participants,outFolder,readAsText=True)
 
 # %% Make command-line argument parser
 parser = argparse.ArgumentParser(description='Recover the .csv files of individual subjects from a multi-subject pavlovia database.')
 # Add arguments
 parser.add_argument('--dbFile', required=True, help='Pavlovia database file (.csv)')
 parser.add_argument('--outFolder', default='.', help='folder where individual subject output files should go')
+parser.add_argument('--force', action='store_true', help='rewrite every participant, even if their rows are unchanged since the last run')
+parser.add_argument('--appendOnly', action='store_true', help="for participants whose earlier rows are unchanged, add only the new rows to the end of their file")
+parser.add_argument('--chunkSize', type=int, default=0, help='number of rows to read at a time (for databases too big to fit in memory; default: read all at once)')
+parser.add_argument('--jobs', type=int, default=1, help='number of subject files to write in parallel')
+parser.add_argument('--format', default='csv', choices=list(outFormats.keys()), help='format of subject files (default: csv)')
 
 # %% ==== COMMAND-LINE MAIN FUNCTION ==== 
 
@@ -66,4 +348,5 @@ if __name__ == '__main__':
     args = parser.parse_args();
  
     # Import data
-    RecoverPavloviaCsvsFromDatabase(args.dbFile,args.outFolder)
\ No newline at end of file
+    RecoverPavloviaCsvsFromDatabase(args.dbFile,args.outFolder,args.chunkSize,useManifest=not args.force,appendOnly=args.appendOnly,
+                                    nJobs=args.jobs,outFormat=args.format)
\ No newline at end of file
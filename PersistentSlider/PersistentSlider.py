@@ -2,6 +2,7 @@
 """Display images from a specified folder and present them to the subject."""
 # PersistentSlider.py
 # Created 10/26/20 by DJ based on SampleExperiment_d1
+# Updated 10/18/26 by DJ - recorded the slider's position on each flip in a trajectory file
 
 from psychopy import core, gui, data, event, sound, logging 
 # from psychopy import visual # visual causes a bug in the guis, so it's declared after all GUIs run.
@@ -9,6 +10,9 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import numpy as np # for timing and array operations
 import AppKit, os, glob # for monitor size detection, files
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, SetFlipTimeToNow, GetFlipDeadline, GetFlippingLoopDeadline, FlipUntilFlipTime # for flipping on the refresh nearest each onset
+import RatingScales # for held-key slider timing and trajectory recording
+import EventSidecar # for the slider trajectory file
 import random # for randomization of trials
 import time
 
@@ -116,6 +120,8 @@ for key in sorted(params.keys()): # in alphabetical order
     logging.log(level=logging.INFO, msg='%s: %s'%(key,params[key])) # log each parameter
 
 logging.log(level=logging.INFO, msg='---END PARAMETERS---')
+# save the slider's position on each frame in a binary file next to the log
+EventSidecar.OpenTrajectoryFile(filename+'.vas.bin')
 
 
 # ========================== #
@@ -140,13 +146,11 @@ print "screenRes = [%d,%d]"%screenRes
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='height', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -196,13 +200,20 @@ holdDur = 0.050; # s before considered "held"
 releaseDur = 0.100; # s before considered "released"
 speed = 0.2; # distance per s
 
-# Initialize variables
-tPressed = 0;
-tLast = 0;
-keyLast = 0;
-startPoint = 0.5;
+# Initialize slider state: the key being held (None if no key is held), when it was pressed (on the logging clock,
+# like flip times), the slider value when it was pressed, and the direction it moves the slider (1 or -1)
+sliderState = {'keyPressed': None, 'tPress': 0.0, 'startPoint': 0.5, 'direction': 0}
 currentSlider = None;
 
+# Get the window's frame period (measured when the window was made) for timing held-key sliding
+framePeriod = win.monitorFramePeriod
+
+# Set up the slider trajectory: its position and held key on each flip are kept in a ring buffer (as in
+# RatingScales.ShowVAS) and written to the trajectory file after each trial. The window only flips every frame while
+# the slider moves, so the slider stays where it was last recorded until the next recorded frame.
+trajBuffer = np.zeros(RatingScales.trajectoryBufferSize,dtype=EventSidecar.trajectoryDtype)
+sliderTrajectory = {'nFrames': 0}
+
 # Set up pyglet key handler
 keyState=key.KeyStateHandler()
 win.winHandle.push_handlers(keyState)
@@ -217,68 +228,54 @@ if upKey[0].isdigit():
 else:
     upKey_attr = upKey.upper()
 
-# Declare function for key-press-and-hold
-def KeyHold():
-    # print('Keypress detected.')
+# Update the current slider once per frame (after each flip at time tFlip), so it moves while a key is held
+# without holding up the rest of the task.
+def UpdateSlider(tFlip):
     # if currentSlider is inactive, do not continue
     if (currentSlider is None) or (currentSlider.autoDraw == False):
-        return;
+        return
     
-    # Look for keypresses
-    if keyState[getattr(key,downKey_attr)]: #returns True if left key is pressed
-        tPress = time.time()
-        startPoint = currentSlider.markerPlacedAt
-        keyPressed = downKey_attr
-    elif keyState[getattr(key,upKey_attr)]: #returns True if the right key is pressed
-        tPress = time.time()
-        startPoint = currentSlider.markerPlacedAt
-        keyPressed = upKey_attr
+    if sliderState['keyPressed'] is None:
+        # Look for keypresses (the marker starts moving on the next frame if the key is still held)
+        if keyState[getattr(key,downKey_attr)]: #returns True if left key is pressed
+            sliderState.update(keyPressed=downKey_attr, tPress=logging.defaultClock.getTime(), startPoint=currentSlider.markerPlacedAt, direction=-1)
+        elif keyState[getattr(key,upKey_attr)]: #returns True if the right key is pressed
+            sliderState.update(keyPressed=upKey_attr, tPress=logging.defaultClock.getTime(), startPoint=currentSlider.markerPlacedAt, direction=1)
+    elif keyState[getattr(key,sliderState['keyPressed'])]==False:
+        # key was released
+        sliderState['keyPressed'] = None
     else:
-        keyPressed = None
-    
-    # print key & time
-    print('keyPressed = %s, tPress = %s'%(keyPressed,tPress))
-    
-    # Handle sliding for held keys
-    while (keyPressed is not None) and ((time.time()-tStart)<questionDur):
-        # update time
-        pressDur = max(time.time()-tPress-holdDur, 0)
-        # update display
-        #currentSlider.draw()
-        win.flip()
-        # check for key release
-        if keyState[getattr(key,keyPressed)]==False:
-            break
-        # Update marker
-        if (keyPressed==downKey_attr):
-            currentSlider.markerPlacedAt = startPoint - step - pressDur*speed
-        if (keyPressed==upKey_attr):
-            currentSlider.markerPlacedAt = startPoint + step + pressDur*speed
-        # enforce limits on rating
-        currentSlider.markerPlacedAt = max(currentSlider.markerPlacedAt,0.0)
-        currentSlider.markerPlacedAt = min(currentSlider.markerPlacedAt,1.0)
-
-
-# Create global event keys that call above function
-event.globalKeys.add(key=downKey, func=KeyHold)
-event.globalKeys.add(key=upKey, func=KeyHold)
-
-
+        # Update marker to where it should be when the next frame appears (staying within limits on rating)
+        currentSlider.markerPlacedAt = RatingScales.GetHeldKeyValue(sliderState['startPoint']+sliderState['direction']*step,
+            sliderState['tPress'],tFlip,framePeriod,sliderState['direction']*speed,holdDur,0.0,1.0)
 
+# Check whether the current slider is moving (or about to), i.e. whether it needs the window flipped on the next frame
+def SliderIsMoving():
+    if (currentSlider is None) or (currentSlider.autoDraw == False):
+        return False
+    return (sliderState['keyPressed'] is not None) or keyState[getattr(key,downKey_attr)] or keyState[getattr(key,upKey_attr)]
+
+# Flip the window, then record the slider's position and update it for the next frame. Returns the time of the flip.
+def Flip():
+    tFlip = RatingScales.FlipAndGetTime(win)
+    if (currentSlider is not None) and currentSlider.autoDraw:
+        heldKey = int(keyState[getattr(key,upKey_attr)]) - int(keyState[getattr(key,downKey_attr)]) # 1 if up, -1 if down
+        RatingScales.RecordTrajectoryFrame(trajBuffer,sliderTrajectory['nFrames'],tFlip,currentSlider.markerPlacedAt,heldKey)
+        sliderTrajectory['nFrames'] += 1
+    UpdateSlider(tFlip)
+    return tFlip
+
+# Write the slider frames recorded since the last call to the trajectory file.
+def WriteSliderTrajectory():
+    if sliderTrajectory['nFrames']>0:
+        EventSidecar.WriteTrajectory(currentSlider.name,RatingScales.GetTrajectoryFrames(trajBuffer,sliderTrajectory['nFrames']))
+        sliderTrajectory['nFrames'] = 0
 
 
 # ============================ #
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def ShowImage(imageName, stimDur=float('Inf')):
     # display info to experimenter
     print('Showing Stimulus %s'%imageName) 
@@ -286,15 +283,14 @@ def ShowImage(imageName, stimDur=float('Inf')):
     # Draw image
     stimImage.setImage(imageName)
     # stimImage.draw()
-    # Wait until it's time to display
-    while (globalClock.getTime()<tNextFlip[0]):
-        win.flip()
+    # Wait until it's time to display (keeping the slider moving)
+    FlipUntilFlipTime(Flip)
     # switch from fixation cross to image
     fixation.autoDraw = False # stop drawing cross every frame
     stimImage.setAutoDraw(True) # start drawing image every frame
     # log & flip window to display image
     win.logOnFlip(level=logging.EXP, msg='Display %s'%imageName)
-    win.flip()
+    Flip()
     tStimStart = globalClock.getTime() # record time when window flipped
     # set up next win flip time after this one
     AddToFlipTime(stimDur) # add to tNextFlip[0]
@@ -303,7 +299,10 @@ def ShowImage(imageName, stimDur=float('Inf')):
     event.clearEvents()
     # Wait for relevant key press or 'stimDur' seconds
     respKey = None
-    while (globalClock.getTime()<tNextFlip[0]): # until it's time for the next frame
+    while (globalClock.getTime()<GetFlipDeadline()): # until it's time for the next frame
+        # keep the slider moving while a slider key is down (otherwise keep checking keys without waiting for a flip)
+        if SliderIsMoving() and (globalClock.getTime()<GetFlippingLoopDeadline()):
+            Flip()
         # get new keys
         newKeys = event.getKeys(keyList=params['respKeys']+['q','escape'],timeStamped=globalClock)
         # check each keypress for escape or response keys
@@ -327,15 +326,19 @@ def ShowImage(imageName, stimDur=float('Inf')):
         fixation.autoDraw = True # start drawing cross every frame
         # fixation.draw() # draw it
         win.logOnFlip(level=logging.EXP, msg='Display Fixation')
-        win.flip()
+        Flip()
+    # save the slider's trajectory during this trial
+    WriteSliderTrajectory()
         
     return (respKey, tStimStart)
 
 # Handle end of a session
 def CoolDown():
     
-    # Stop auto-drawing things
-    currentSlider.setAutoDraw(False)
+    # Save the rest of the slider's trajectory and stop auto-drawing things
+    if currentSlider is not None:
+        WriteSliderTrajectory()
+        currentSlider.setAutoDraw(False)
     fixation.autoDraw = False
     stimImage.setAutoDraw(False)
     
@@ -369,7 +372,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 # fixation.draw()
@@ -392,9 +396,7 @@ rtVec[:]=np.nan
 
 # Set up persistent slider
 happySlider.setAutoDraw(True)
-currentSlider = happySlider; # Make KeyHold function apply to this slider
-tStart = time.time(); # start time is now
-questionDur = np.inf; # slider has no max RT
+currentSlider = happySlider; # Make UpdateSlider function apply to this slider
 
 # display images
 for iStim in range(0,params['nTrials']):
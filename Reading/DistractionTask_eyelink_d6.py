@@ -27,6 +27,7 @@ from psychopy.tools.filetools import fromFile, toFile
 import time as ts, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import tNextFlip, SetUpFlipScheduler, AddToFlipTime, SetFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random
 """
 # Import SMI libraries
@@ -348,9 +349,6 @@ if (eyelinktracker is not None and (not getEYELINK().isConnected() or getEYELINK
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
@@ -361,6 +359,7 @@ win = myTracker.win # SMI version
 #"""
 win = genv.win # eyelink version
 #"""
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create stimuli
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -396,14 +395,6 @@ whiteNoiseSound = sound.Sound(value='%s%s'%(params['soundDir'], params['whiteNoi
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def SendMessage(message):
     """
     # send message preceded by SMI code ET_REM (generic remark) and surround multi-word remarks by quotes(?)
@@ -433,7 +424,7 @@ def ShowPage(iPage, maxPageTime=float('Inf'), pageFadeDur=0, soundToPlay=None):
     textImage.setImage(imageName)
     textImage.opacity = 1
     textImage.draw()
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
 #        win.flip(clearBuffer=False)
     # draw & flip
@@ -463,7 +454,7 @@ def ShowPage(iPage, maxPageTime=float('Inf'), pageFadeDur=0, soundToPlay=None):
     # Wait for relevant key press or 'maxPageTime' seconds
     fadeTime = tNextFlip[0]-pageFadeDur
     respKey = None
-    while (globalClock.getTime()<tNextFlip[0]) and respKey==None:
+    while (globalClock.getTime()<GetFlipDeadline()) and respKey==None:
         newKeys = event.getKeys(keyList=[params['pageKey'],params['wanderKey'],'q','escape'],timeStamped=globalClock)
         if len(newKeys)>0:
             for thisKey in newKeys:
@@ -593,7 +584,8 @@ win.callOnFlip(SendMessage,'DisplayWaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 """
 # START SMI RECORDING via serial port
@@ -19,6 +19,7 @@ from psychopy.tools.filetools import fromFile, toFile
 import time as ts, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import tNextFlip, SetUpFlipScheduler, AddToFlipTime, SetFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random
 
 # ====================== #
@@ -170,13 +171,11 @@ print "screenRes = [%d,%d]"%screenRes
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create stimuli
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -210,14 +209,6 @@ fullSound = sound.Sound(value='%s%s'%(params['soundDir'], params['soundFile']),
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def SendMessage(message):
     pass
 
@@ -230,7 +221,7 @@ def ShowPage(iPage, maxPageTime=float('Inf'), pageFadeDur=0):
     textImage.setImage(imageName)
     textImage.opacity = 1
     textImage.draw()
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
 #        win.flip(clearBuffer=False)
     # draw & flip
@@ -250,7 +241,7 @@ def ShowPage(iPage, maxPageTime=float('Inf'), pageFadeDur=0):
     # Wait for relevant key press or 'maxPageTime' seconds
     fadeTime = tNextFlip[0]-pageFadeDur
     respKey = None
-    while (globalClock.getTime()<tNextFlip[0]) and respKey==None:
+    while (globalClock.getTime()<GetFlipDeadline()) and respKey==None:
         newKeys = event.getKeys(keyList=[params['pageKey'],params['wanderKey'],'q','escape'],timeStamped=globalClock)
         if len(newKeys)>0:
             for thisKey in newKeys:
@@ -322,7 +313,8 @@ win.callOnFlip(SendMessage,'Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
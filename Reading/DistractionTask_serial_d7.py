@@ -30,6 +30,7 @@ from psychopy.tools.filetools import fromFile, toFile
 import time as ts, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import tNextFlip, SetUpFlipScheduler, AddToFlipTime, SetFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random
 import serial 
 from LibSmi_PsychoPy import LibSmi_PsychoPy
@@ -254,9 +255,6 @@ print "Port %s isOpen = %d"%(myTracker.tracker.name,myTracker.tracker.isOpen())
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
@@ -265,6 +263,7 @@ win = myTracker.win
 """
 win = genv.win # eyelink version
 """
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create stimuli
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -305,14 +304,6 @@ switchSound = sound.Sound(value='%s%s'%(params['soundDir'], params['switchSoundF
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def SendMessage(message):
     # send message preceded by SMI code ET_REM (generic remark) and surround multi-word remarks by quotes(?)
     myTracker.log(message)
@@ -339,7 +330,7 @@ def ShowPage(iPage, maxPageTime=float('Inf'), pageFadeDur=0, soundToPlay=None):
     textImage.setImage(imageName)
     textImage.opacity = 1
     textImage.draw()
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         pass
 #        win.flip(clearBuffer=False)
     # draw & flip
@@ -365,7 +356,7 @@ def ShowPage(iPage, maxPageTime=float('Inf'), pageFadeDur=0, soundToPlay=None):
     # Wait for relevant key press or 'maxPageTime' seconds
     fadeTime = tNextFlip[0]-pageFadeDur
     respKey = None
-    while (globalClock.getTime()<tNextFlip[0]) and respKey==None:
+    while (globalClock.getTime()<GetFlipDeadline()) and respKey==None:
         newKeys = event.getKeys(keyList=[params['pageKey'],params['wanderKey'],'q','escape'],timeStamped=globalClock)
         if len(newKeys)>0:
             for thisKey in newKeys:
@@ -395,7 +386,7 @@ def ShowFixation(duration=0):
         fixation.draw()
         win.logOnFlip(level=logging.EXP, msg='Display Fixation')
         win.callOnFlip(SendMessage,'Display Fixation')
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             core.wait(.01)
             pass
         if params['usePhotodiode']:
@@ -513,7 +504,8 @@ win.callOnFlip(SendMessage,'Display Fixation')
 event.waitKeys(keyList=params['triggerKey'])
 # display
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 win.flip()
 
 # start recording via serial port
@@ -569,7 +561,7 @@ for iBlock in range(0,nBlocks): # for each block of pages
         if iPage==switchPage-1:
             message1.setText(topSwitchPrompts[0])
             message1.draw()
-            while (globalClock.getTime()<tNextFlip[0]):
+            while (globalClock.getTime()<GetFlipDeadline()):
                 pass
             win.logOnFlip(level=logging.EXP, msg='Display Switch')
             win.callOnFlip(SendMessage,'Display Switch')
@@ -6,6 +6,7 @@
 # Created 6/4/18 by DJ based on AuditorySpeedReadingTask_d1.py.
 # Updated 12/31/18 by DJ - modified to allow each block's speeds to be specified separately.
 # Updated 7/9/19 by DJ - response from participant ends a block. Added endDelay and respKeys parameters.
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging #, visual # visual causes a bug in the guis, so I moved it down.
 from psychopy.tools.filetools import fromFile, toFile
@@ -13,6 +14,7 @@ import random
 import time, numpy as np
 import AppKit, os # for monitor size detection, files
 import PromptTools
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTime, GetFlipDeadline # for flipping on the refresh nearest each onset
 import numpy as np # for frame time calculations
 
 # ====================== #
@@ -126,13 +128,11 @@ if params['fullScreen'] and params['screenToShow']>0:
 else:
     screenRes = [800,600]
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable? 
-
 #create window and stimuli
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 #fixation = visual.GratingStim(win, color='black', tex=None, mask='circle',size=0.2)
 fCS = params['fixCrossSize'] # rename for brevity
 fcX = params['fixCrossPos'][0] # rename for brevity
@@ -179,11 +179,6 @@ for i in range(0,nTrials):
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-#    print("%1.3f --> %1.3f"%(globalClock.getTime(),tNextFlip[0]))
-
 def RunTrial(frames,tIFIs,tISI):
     
     # ===TEXT=== #
@@ -198,7 +193,7 @@ def RunTrial(frames,tIFIs,tISI):
         win.logOnFlip(level=logging.EXP, msg='Display frame-%03d'%i)
         
         # wait until it's time
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             # check for escape keys
             thisKey = event.getKeys()
             if thisKey!=None and len(thisKey)>0 and thisKey[0] in ['q','escape']:
@@ -225,7 +220,7 @@ def RunTrial(frames,tIFIs,tISI):
     win.logOnFlip(level=logging.EXP, msg='Display fixation')
     
     # wait for ISI
-    while (globalClock.getTime()<tNextFlip[0]):
+    while (globalClock.getTime()<GetFlipDeadline()):
         # check for escape keys
         thisKey = event.getKeys()
         if thisKey!=None and len(thisKey)>0 and thisKey[0] in ['q','escape']:
@@ -256,7 +251,8 @@ win.logOnFlip(level=logging.EXP, msg='Display WaitingForScanner')
 win.flip()
 event.waitKeys(keyList=params['triggerKey'])
 tStartSession = globalClock.getTime()
-AddToFlipTime(tStartSession+params['tStartup'])
+SetFlipTime(tStartSession) # time the first display from the start of the session
+AddToFlipTime(params['tStartup'])
 
 # wait before first stimulus
 fixation.draw()
@@ -297,7 +293,7 @@ win.logOnFlip(level=logging.EXP, msg='Display TheEnd')
 message1.draw()
 message2.draw()
 # wait until it's time
-while (globalClock.getTime()<tNextFlip[0]):
+while (globalClock.getTime()<GetFlipDeadline()):
     core.wait(0.0001)
 #        pass
 # change the screen
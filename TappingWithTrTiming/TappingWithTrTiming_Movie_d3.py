@@ -5,6 +5,7 @@
 # Updated 12/4/15 by DJ - made movie version
 # Updated 12/7/15 by DJ - updated prompts, general cleanup
 # Updated 1/12/16 by DJ - moved from movie to frame-by-frame display, single repeated condition
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging 
 # from psychopy import visual # visual causes a bug in the guis, so it's declared after all GUIs run.
@@ -12,6 +13,7 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import time as ts, numpy as np # for timing and array operations
 import AppKit, os, glob # for monitor size detection, files
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random # for randomization of trials
 
 # ====================== #
@@ -154,13 +156,11 @@ print "screenRes = [%d,%d]"%screenRes
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -184,14 +184,6 @@ print('%d prompts loaded from %s'%(len(topPrompts),stimList['promptFileList'][iC
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def CheckForTriggers():
     # get new keys
     newKeys = event.getKeys(keyList=[params['triggerKey'], 'q','escape'],timeStamped=globalClock)
@@ -221,7 +213,7 @@ def PlayTappingMovie(tapImages, tapText, dt, blockDur_TRs):
             iFrame=0 # rewind to beginning
         
         # Only flip when a new frame should be displayed.
-        if globalClock.getTime()>=tNextFlip[0]:
+        if globalClock.getTime()>=GetFlipDeadline():
             # draw movie frame, draw text stim, and flip
             tapImages[iFrame].draw()
             tapText.draw()
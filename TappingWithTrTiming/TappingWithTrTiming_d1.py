@@ -2,6 +2,7 @@
 """Display multi-page text with a quiz at the end."""
 # TappingWithTrTiming_d1.py
 # Created 11/09/15 by DJ based on DistractionTask_practice_d3.py
+# Updated 10/18/26 by DJ - switched to FlipScheduler for flip timing
 
 from psychopy import core, gui, data, event, sound, logging 
 # from psychopy import visual # visual causes a bug in the guis, so it's declared after all GUIs run.
@@ -9,6 +10,7 @@ from psychopy.tools.filetools import fromFile, toFile # saving and loading param
 import time as ts, numpy as np # for timing and array operations
 import AppKit, os, glob # for monitor size detection, files
 import BasicPromptTools # for loading/presenting prompts and questions
+from FlipScheduler import SetUpFlipScheduler, AddToFlipTime, SetFlipTimeToNow, GetFlipDeadline # for flipping on the refresh nearest each onset
 import random # for randomization of trials
 
 # ====================== ##!/usr/bin/env python2
@@ -150,13 +152,11 @@ print "screenRes = [%d,%d]"%screenRes
 # ========================== #
 from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
 win = visual.Window(screenRes, fullscr=params['fullScreen'], allowGUI=False, monitor='testMonitor', screen=params['screenToShow'], units='deg', name='win',color=params['screenColor'],colorSpace='rgb255')
+SetUpFlipScheduler(win,globalClock) # schedule flips using the window's frame period
 # create fixation cross
 fCS = params['fixCrossSize'] # size (for brevity)
 fCP = params['fixCrossPos'] # position (for brevity)
@@ -176,14 +176,6 @@ print('%d prompts loaded from %s'%(len(topPrompts),params['promptFile']))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def CheckForTriggers():
     # get new keys
     newKeys = event.getKeys(keyList=[params['triggerKey'], 'q','escape'],timeStamped=globalClock)
@@ -209,7 +201,7 @@ def FlashDot(stimDur, ISI, blockDur_TRs):
         stimDot.draw()
         win.logOnFlip(level=logging.EXP, msg='Display dot')
         # Wait until it's time to display
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             # Check for triggers and increment trigger count
             nNew = CheckForTriggers()
             nTriggers = nTriggers + nNew
@@ -227,7 +219,7 @@ def FlashDot(stimDur, ISI, blockDur_TRs):
         # prepare stim
         win.logOnFlip(level=logging.EXP, msg='Display fixation')
         # Wait until it's time to display
-        while (globalClock.getTime()<tNextFlip[0]):
+        while (globalClock.getTime()<GetFlipDeadline()):
             # Check for triggers and increment trigger count
             nNew = CheckForTriggers()
             nTriggers = nTriggers + nNew
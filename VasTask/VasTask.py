@@ -4,6 +4,7 @@
 # Created 8/20/18 by DJ.
 # Updated 8/22/18 by DJ - added vasStepSize param to control slider speed
 # Updated 9/5/18 by DJ - removed AppKit calls, updated GUI filters (|-->;;), removed parallel import
+# Updated 10/18/26 by DJ - removed unused flip-time helpers
 
 from psychopy import visual # visual must be called first to prevent a bug where a movie won't appear.
 from psychopy import core, gui, data, event, logging # experiment
@@ -129,9 +130,6 @@ print "screenRes = [%d,%d]"%screenRes
 # ========================== #
 #from psychopy import visual
 
-# Initialize deadline for displaying next frame
-tNextFlip = [0.0] # put in a list to make it mutable (weird quirk of python variables) 
-
 #create clocks and window
 globalClock = core.Clock()#to keep track of time
 trialClock = core.Clock()#to keep track of time
@@ -148,14 +146,6 @@ print('%d questions loaded from %s'%(len(questions),params['questionFile']))
 # ======= SUBFUNCTIONS ======= #
 # ============================ #
 
-# increment time of next window flip
-def AddToFlipTime(tIncrement=1.0):
-    tNextFlip[0] += tIncrement
-
-# flip window as soon as possible
-def SetFlipTimeToNow():
-    tNextFlip[0] = globalClock.getTime()
-
 def RunVas(questions,options):
     
     # Show questions and options